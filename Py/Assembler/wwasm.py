@@ -4,6 +4,13 @@ import re
 import math
 import traceback
 import argparse
+import io
+import copy
+import time
+import hashlib
+import shlex
+import contextlib
+import concurrent.futures
 import wwinfra
 from enum import Enum
 from wwasmparser import AsmExprValue, AsmExprValueType, AsmExprEnv, AsmExpr, AsmExprType, AsmParsedLine
@@ -329,6 +336,13 @@ class AsmInst:
             self.fatalError (msg)
     def addrRangeError (self, addr: int):
         self.error ("Address 0o%o out of range" % addr)
+    # In an object module, a value stored somewhere wwlink doesn't fix up must
+    # not depend on where the module is loaded or on an imported label
+    def checkNotRelocated (self, val: AsmExprValue):
+        if val.extern is not None:
+            self.error ("Imported label %s can't be used here" % val.extern)
+        elif val.reloc != 0 and self.prog.relocatable:
+            self.error ("Relocatable address can't be used here")
     # Return a string for the prefix address, perhaps with decimal addresses
     # and perhaps with content. Services the variants of prefxAddrStr()
     # Private
@@ -444,14 +458,15 @@ class AsmWwOpInst (AsmInst):
         # that only if necessary.
         #
         if val.type == AsmExprValueType.Integer:
-            if val.value < 0 or val.value >= self.prog.coreSize:
-                self.addrRangeError (val.value)
+            operand = self.prog.linkFixup (self, val, "A", self.address)
+            if operand < 0 or operand >= self.prog.coreSize:
+                self.addrRangeError (operand)
             else:
-                self.operand = val.value
+                self.operand = operand
                 self.instruction = self.opcode | self.operand      # mask not needed because we've checked range
                 self.checkAddressError (self.address)
                 self.prog.coreMem[self.address] = self.instruction
-                self.addXref (val.value)
+                self.addXref (operand)
         else:
             self.operandTypeError (val)
     def addXref (self, operand: int):
@@ -632,6 +647,7 @@ class AsmDotOrgInst (AsmPseudoOpInst):
         if nextAddr.type == AsmExprValueType.Integer:
             if nextAddr.value >= 0 and nextAddr.value < self.prog.coreSize:
                 self.prog.nextCoreAddress = nextAddr.value
+                self.prog.sawOrg = True
                 self.prog.currentRelativeBase = nextAddr   # <--- This is an important assumption!! [Guy]
             else:
                 self.addrRangeError (nextAddr.value)
@@ -675,6 +691,8 @@ class AsmDotWordInst (AsmPseudoOpInst):
         self.prog.nextCoreAddress += 1
     def passTwoOp (self):
         val: AsmExprValue = self.parsedLine.operand.evalMain (self.prog.env, self.parsedLine)
+        if val.type == AsmExprValueType.Integer:
+            val = AsmExprValue (AsmExprValueType.Integer, self.prog.linkFixup (self, val, "W", self.address))
         self.instruction = self.wwWord (val)
         self.checkAddressError (self.address)
         self.prog.coreMem[self.address] = self.instruction
@@ -684,6 +702,7 @@ class AsmDotWordsInst (AsmDotWordInst):
         super().__init__ (*args)
         self.block = {}
         self.fillInst = 0
+        self.fillVal: AsmExprValue = None
     def listingString (self,
                        minimalListing: bool = False,
                        **kwargs) -> str:
@@ -707,6 +726,7 @@ class AsmDotWordsInst (AsmDotWordInst):
                 fillLen = lenVal.value
                 fillVal = valList[1]
                 self.fillInst = self.wwWord (fillVal)
+                self.fillVal = fillVal
                 for i in range (0, fillLen):
                     self.block[i] = self.fillInst
                 self.prog.nextCoreAddress += fillLen
@@ -715,6 +735,8 @@ class AsmDotWordsInst (AsmDotWordInst):
         else:
             self.error ("Incorrect number of operands")
     def passTwoOp (self):
+        if self.fillVal is not None:
+            self.checkNotRelocated (self.fillVal)
         self.instruction = self.fillInst
         for i in range (0, len (self.block)):
             self.checkAddressError (self.address+i)
@@ -733,6 +755,8 @@ class AsmDotFloatInst (AsmDotWordsInst):
             if len (val.value) == 2:
                 val1: AsmExprValue = val.value[0]
                 val2: AsmExprValue = val.value[1]
+                self.checkNotRelocated (val1)
+                self.checkNotRelocated (val2)
                 if val1.type == AsmExprValueType.Fraction:
                     decMant = val.value[0].value  
                 elif val1.type == AsmExprValueType.Integer:
@@ -847,11 +871,12 @@ class AsmDotJumpToInst (AsmPseudoOpInst):
     def passTwoOp (self):
         val: AsmExprValue = self.parsedLine.operand.evalMain (self.prog.env, self.parsedLine)
         if val.type == AsmExprValueType.Integer:
-            if val.value >= 0 and val.value < self.prog.coreSize:
-                self.instruction = val.value                # Address to which to jump
-                self.prog.wwJumpToAddress = val.value       # Also set the program-level starting jump address
+            addr = self.prog.linkFixup (self, val, "J", 0)
+            if addr >= 0 and addr < self.prog.coreSize:
+                self.instruction = addr                     # Address to which to jump
+                self.prog.wwJumpToAddress = addr            # Also set the program-level starting jump address
             else:
-                self.addrRangeError (val.value)
+                self.addrRangeError (addr)
         else:
             self.operandTypeError (val)
 
@@ -939,7 +964,7 @@ class AsmDotDbwgtInst (AsmPseudoOpInst):
             return
         if n >= 1:
             if o[0].type == AsmExprValueType.Integer:
-                addr = o[0].value
+                addr = self.prog.linkFixup (self, o[0], "D", 0, index = len (self.prog.dbwgtTab))
             elif o[0].type == AsmExprValueType.String:
                 paramName = o[0].value
             else:
@@ -960,6 +985,8 @@ class AsmDotDbwgtInst (AsmPseudoOpInst):
                 self.keywordToValue[kw] = val
             else:
                 self.operandTypeError (val)
+        for kw in ["incr", "min", "max"]:
+            self.checkNotRelocated (self.keywordToValue[kw])
         self.prog.dbwgtTab.append (DebugWidgetClass (self.parsedLine.lineNo, addr, paramName,
                                                      self.keywordToValue["incr"].value, self.keywordToValue["fmt"].value,
                                                      self.keywordToValue["min"].value, self.keywordToValue["max"].value))
@@ -1005,6 +1032,7 @@ class AsmSimParamInst (AsmPseudoOpInst):
                     self.operandTypeError (v)
                     return
                 else:
+                    self.checkNotRelocated (v)
                     self.prog.simParamKeyToValue[key] = v.value
         pass
         
@@ -1067,15 +1095,21 @@ class AsmDotPrintInst (AsmPseudoOpInst):
             self.operandTypeError (fmtVal)
         else:
             execCmd += "\"" + fmtVal.value + "\""
+            # An address fixed up by wwlink is found by its offset in the exec string
+            if self.address in self.prog.execTab:
+                execBase = len (self.prog.execTab[self.address] + " \n ")
+            else:
+                execBase = 0
             operandsLen = len (operands)
             for i in range (1, operandsLen):
                 val = operands[i]
                 # Each value after the fmt string must be an integer and valid address
                 if val.type == AsmExprValueType.Integer:
-                    if val.value < 0 or val.value > self.prog.coreSize:
-                        self.addrRangeError (val.value)
+                    addr = self.prog.linkFixup (self, val, "E", self.address, index = execBase + len (execCmd) + 2)
+                    if addr < 0 or addr > self.prog.coreSize:
+                        self.addrRangeError (addr)
                     else:
-                        execCmd += ", 0o%06o" % val.value
+                        execCmd += ", 0o%06o" % addr
                 else:
                     self.operandTypeError (val)
             if self.address in self.prog.execTab:
@@ -1234,6 +1268,7 @@ class AsmDotSwitchInst (AsmPseudoOpInst):
                 for i in range (0, len (settingsValList)):
                     val = settingsValList[i]
                     if val.type == AsmExprValueType.Integer:
+                        self.checkNotRelocated (val)
                         if val.value >= 0:
                             argStr += sep + " 0o%06o" % val.value
                             sep = ","
@@ -1296,13 +1331,160 @@ class AsmLabelTab:
     def labels (self) -> [str]:
         return list (self.labelToInst)
 
+# Parsed lines of each source and .include file, so that re-assembling after an
+# edit, as --Watch does, only parses the files that changed. Entries are keyed
+# by file name and checked against a hash of the contents, so there's one per
+# file however often it changes. A file with syntax errors isn't kept, so its
+# errors are reported again next time.
+
+class AsmParseCache:
+    def __init__ (self):
+        self.files = {}                 # File name: str -> (content hash, [AsmParsedLine])
+        self.hits = 0
+        self.misses = 0
+    def digest (self, text: str) -> bytes:
+        return hashlib.blake2b (text.encode ("utf-8"), digest_size = 16).digest()
+    def lookup (self, inFilename: str, text: str) -> [AsmParsedLine]:
+        entry = self.files.get (inFilename)
+        if entry is not None and entry[0] == self.digest (text):
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+    def store (self, inFilename: str, text: str, lines: [AsmParsedLine]):
+        self.files[inFilename] = (self.digest (text), lines)
+
+# One source or .include file being read by passOne, a parsed line at a time.
+# The lines come from the parse cache if the file hasn't changed. They're
+# copied since passOne numbers lines across all the files it reads, so the same
+# file can get different line numbers from one assembly to the next.
+
+class AsmSourceReader:
+    def __init__ (self, prog, inStream, inFilename: str):   # prog: AsmProgram
+        self.prog = prog
+        self.inFilename = inFilename
+        self.text = inStream.read()
+        inStream.close()
+        self.lines = io.StringIO (self.text).readlines()
+        self.pos = 0
+        self.cachedLines = None
+        if prog.parseCache is not None:
+            self.cachedLines = prog.parseCache.lookup (inFilename, self.text)
+        self.parsedLines = []
+        self.parsedOk = True
+    def nextLine (self, lineNo: int) -> AsmParsedLine:
+        if self.pos == len (self.lines):
+            if self.cachedLines is None and self.parsedOk and self.prog.parseCache is not None:
+                self.prog.parseCache.store (self.inFilename, self.text, self.parsedLines)
+            return None
+        if self.cachedLines is not None:
+            line = copy.copy (self.cachedLines[self.pos])
+            line.lineNo = lineNo
+        else:
+            line = AsmParsedLine (self.lines[self.pos], lineNo, verbose = self.prog.verbose)
+            if not line.parseLine():
+                self.parsedOk = False
+            self.parsedLines.append (line)
+        self.pos += 1
+        return line
+
+# The contents of a core file. AsmProgram.writeCore() fills one in from the
+# assembled program and wwlink fills one in from the object modules it links,
+# so the two write exactly the same format.
+
+class AsmCoreImage:
+    def __init__ (self, coreSize: int):
+        self.isa1950: bool = False
+        self.wwFilename: str = ""
+        self.wwTapeId: str = ""
+        self.simParamKeyToValue: dict = {}
+        self.wwJumpToAddress: int = None
+        self.switchTab = {}                 # Switch name: str -> validated value string
+        self.dbwgtTab = []                  # [DebugWidgetClass]
+        self.coreMem = [None]*coreSize
+        self.symbols = []                   # [(address or value: int, name: str)], labels then presets
+        self.execTab = {}
+        self.commentTab = [""]*coreSize
+
+    # simple helper function to convert numbers to signed octal, like "-0o12"
+    def format_signed_octal(self, number):
+        if number < 0:
+            oct = "-0o%02o" % -number
+        else:
+            oct = "0o%02o" % number
+        return oct
+
+    def writeHeader (self, fout):
+        if self.isa1950:  # default in the sim is the 1958 instruction set; this directive changes it to 1950
+            fout.write("%%ISA: %s\n" % "isa1950")
+        fout.write("%%File: %s\n" % self.wwFilename)
+        fout.write("%%TapeID: %s\n" % self.wwTapeId)
+        if len (self.simParamKeyToValue) != 0:
+            fout.write("%%SimParam: %s\n" % wwinfra.SimParam().dictToStr (self.simParamKeyToValue))
+        if self.wwJumpToAddress is not None:
+            fout.write('%%JumpTo 0o%o\n' % self.wwJumpToAddress)
+        for s in self.switchTab:  # switch tab is indexed by name, contains a validated string for the value
+            fout.write("%%Switch: %s %s\n" % (s, self.switchTab[s]))
+        for w in self.dbwgtTab:
+            addrStr = w.paramName if w.paramName != "" else "0o%03o" % w.addr
+            # changed by guy to output negative numbers in octal that are parsable by int(str)
+            # fout.write("%%DbWgt:  %s  0o%02o %s 0o%02o 0o%02o\n" % (addrStr, w.incr, w.format, w.min, w.max))
+            fout.write("%%DbWgt:  %s  %s %s %s %s\n" % (addrStr,
+                self.format_signed_octal(w.incr), w.format,
+                self.format_signed_octal(w.min), self.format_signed_octal(w.max)))
+
+    def writeMemory (self, fout):
+        columns = 8
+        addr = 0
+        coreSize = len (self.coreMem)
+        while addr < coreSize:
+            i = 0
+            non_null = 0
+            row = ""
+            while i < columns:
+                if self.coreMem[addr+i] is not None:
+                    row += "%07o " % self.coreMem[addr+i]
+                    non_null += 1
+                else:
+                    row += " None   "
+                i += 1
+            if non_null:
+                fout.write('@C%04o: %s\n' % (addr, row))
+            addr += columns
+
+    def writeSymbols (self, fout):
+        for (addr, s) in self.symbols:
+            fout.write("@S%04o: %s\n" % (addr, s))
+
+    def writeTables (self, fout):
+        for addr in self.execTab:
+            fout.write("@E%04o: %s\n" % (addr, self.execTab[addr]))
+        for addr in range(0, len(self.commentTab)):
+            if self.commentTab[addr] is not None and len(self.commentTab[addr]) > 0:
+                fout.write("@N%04o: %s\n" % (addr, self.commentTab[addr]))
+
+    def write (self, cb, coreOutFilename: str):
+        # a binary core image is made from the text, so it reads exactly the same
+        binary = coreOutFilename.endswith (".bcore")
+        fout = io.StringIO() if binary else open (coreOutFilename, 'wt')
+        fout.write("\n; *** Core Image ***\n")
+        self.writeHeader (fout)
+        self.writeMemory (fout)
+        self.writeSymbols (fout)
+        self.writeTables (fout)
+        if binary:
+            image = wwinfra.BinaryCoreImageClass.from_text (cb, fout.getvalue().split ('\n'), coreOutFilename)
+            image.write (coreOutFilename)
+        fout.close()
+
 class AsmProgram:
     def __init__ (self,
                   inFilename, inStream,
                   coreOutFilename, listingOutFilename, flowgraphOutFilename,
                   verbose, debug, minimalListing, isa1950,
                   reformat, omitUnrefedLabels,
-                  commentColumn, commentWidth, omitAutoComment):
+                  commentColumn, commentWidth, omitAutoComment,
+                  objectOut = False, parseCache: AsmParseCache = None):
         #
         # The "fundamental constants" of the machine. Masks, which can hide
         # bugs, are not used. Ranges of fields are checked.
@@ -1366,15 +1548,29 @@ class AsmProgram:
         self.coreToInst = [None]*self.coreSize        # An array mapping an address to an AsmInst -- for xref. Type ([AsmInst]*self.coreSize)[Address: int]
         self.labelRef = {}                            # Map Label: str -> True. Just need to know label has been ref'd
 
+        # With --Object we write a module for wwlink rather than a core file. A
+        # module with no .org is relocatable: it's assembled as if loaded at
+        # 0o40 and wwlink moves it. Either kind may use labels it doesn't
+        # define, which wwlink finds in the other modules.
+        self.objectOut = objectOut
+        self.sawOrg = False
+        self.relocatable = False                      # Known once pass one is done
+        self.inPassTwo = False
+        self.relocTab = []                            # [(address, kind, index)] of values to move with the module
+        self.externTab = []                           # [(address, kind, index, label, offset)] of values using imported labels
+
         self.inFilename = inFilename
         self.wwFilename = self.inFilename             # wwFilename will be overwritten if there's a directive in the source
-        self.inStream = inStream
         self.coreOutFilename = coreOutFilename
-        self.listingOutFilename = listingOutFilename
-        self.flowgraphOutFilename = flowgraphOutFilename
+        self.listingOutFilename = listingOutFilename        # None for no listing
+        self.flowgraphOutFilename = flowgraphOutFilename    # None for no flow graph
+        self.basicBlocksMarked = False
 
+        self.parseCache = parseCache
+        self.sourceFilenames: [str] = [inFilename]    # Every file read, for --Watch
+        self.source = AsmSourceReader (self, inStream, inFilename)
         self.inFilenameStack: [str] = []
-        self.inStreamStack: [] = []
+        self.sourceStack: [AsmSourceReader] = []
 
         self.progInfo = AsmProgramInfo (self)
 
@@ -1411,26 +1607,52 @@ class AsmProgram:
         inst = self.labelTab.lookup (var)
         if inst is not None:
             self.labelRef[var] = True
-            return AsmExprValue (AsmExprValueType.Integer, inst.address)
+            return AsmExprValue (AsmExprValueType.Integer, inst.address, reloc = 1 if self.objectOut else 0)
         elif var in self.presetTab:
             return self.presetTab[var]
+        elif self.objectOut and self.inPassTwo:
+            # Anything still unbound in pass two of an object module is imported
+            return AsmExprValue (AsmExprValueType.Integer, 0, extern = var)
         else:
             return None
 
+    #
+    # Record what wwlink will have to do to a value stored by inst, and return
+    # what to store for now. kind says where the value went: "A" the address
+    # field of the instruction at address, "W" the whole word at address, "E"
+    # the address at offset index in the exec string at address, "D" the
+    # address of debug widget index, and "J" the .jumpto address. An imported
+    # label's address is added at link time, so the offset is kept here and
+    # zero is stored.
+    #
+    def linkFixup (self, inst: AsmInst, val: AsmExprValue, kind: str, address: int, index: int = 0) -> int:
+        if val.extern is not None:
+            if val.reloc != 0:
+                inst.error ("Only a constant can be added to or subtracted from imported label %s" % val.extern)
+            else:
+                self.externTab.append ((address, kind, index, val.extern, val.value))
+            return 0
+        if val.reloc != 0 and self.relocatable:
+            if val.reloc == 1:
+                self.relocTab.append ((address, kind, index))
+            else:
+                inst.error ("Address expression can't be relocated")
+        return val.value
+
     # Support for .include
 
     def pushStream (self, inStream, inFilename):
-        self.inStreamStack.append (self.inStream)
+        self.sourceStack.append (self.source)
         self.inFilenameStack.append (self.inFilename)
-        self.inStream = inStream
+        self.source = AsmSourceReader (self, inStream, inFilename)
         self.inFilename = inFilename
+        self.sourceFilenames.append (inFilename)
 
     def popStream (self) -> bool:
-        if self.inStreamStack == []:
+        if self.sourceStack == []:
             return False
         else:
-            self.inStream.close()
-            self.inStream = self.inStreamStack.pop()
+            self.source = self.sourceStack.pop()
             self.inFilename = self.inFilenameStack.pop()
             return True
 
@@ -1456,20 +1678,17 @@ class AsmProgram:
         #
         lineNo = 0
         while True:
-            lineStr = self.inStream.readline()
             lineNo += 1
-            if lineStr == "":
+            line = self.source.nextLine (lineNo)
+            if line is None:
                 curInfile = self.inFilename
                 if self.popStream():
                     inst = AsmEndDotIncludeInst (curInfile, self)
                     self.insts.append (inst)
                     continue
                 else:
-                    self.inStream.close()
                     break
             else:
-                line = AsmParsedLine (lineStr, lineNo, verbose = self.verbose)
-                line.parseLine()
                 self.parsedLine = line      # Current line available for error messages
                 # All lines result in an instruction class instance of some kind
                 dotIf = self.evalDotIf()
@@ -1492,66 +1711,65 @@ class AsmProgram:
 
     def passTwo (self):
         # Evaluate operands and resolve full instructions as needed.
+        self.relocatable = self.objectOut and not self.sawOrg
+        self.inPassTwo = True
         for inst in self.insts:
             inst.passTwoOp()
 
-    # simple helper function to convert numbers to signed octal, like "-0o12"
-    def format_signed_octal(self, number):
-        if number < 0:
-            oct = "-0o%02o" % -number
-        else:
-            oct = "0o%02o" % number
-        return oct
+    def coreImage (self) -> AsmCoreImage:
+        image = AsmCoreImage (self.coreSize)
+        image.isa1950 = self.curOpcodeTab == self.opCodeTables.op_code_1950
+        image.wwFilename = self.wwFilename
+        image.wwTapeId = self.wwTapeId
+        image.simParamKeyToValue = self.simParamKeyToValue
+        image.wwJumpToAddress = self.wwJumpToAddress
+        image.switchTab = self.switchTab
+        image.dbwgtTab = self.dbwgtTab
+        image.coreMem = self.coreMem
+        image.symbols = [(self.labelTab.lookup (s).address, s) for s in self.labelTab.labels()]
+        image.symbols += [(self.presetTab[s].value, s) for s in self.presetTab]
+        image.execTab = self.execTab
+        image.commentTab = self.commentTab
+        return image
 
 
     def writeCore (self):
         print ("Corefile output to file %s" % self.coreOutFilename)
+        self.coreImage().write (self.cb, self.coreOutFilename)
+
+    #
+    # An object module is a core file with a few more record types for wwlink:
+    #
+    #   %Object: relocatable|absolute
+    #   @Pvvvv: name [reloc]                   A preset and its value
+    #   @Raaaa: kind index                     A value to move with the module
+    #   @Xaaaa: kind index label offset        A value using an imported label
+    #
+    # Labels are written as @S records as usual; see linkFixup() for kind and
+    # index.
+    #
+    def writeObject (self):
+        print ("Object output to file %s" % self.coreOutFilename)
+        image = self.coreImage()
         fout = open (self.coreOutFilename, 'wt')
-        fout.write("\n; *** Core Image ***\n")
-        if self.curOpcodeTab == self.opCodeTables.op_code_1950:  # default in the sim is the 1958 instruction set; this directive changes it to 1950
-            fout.write("%%ISA: %s\n" % "isa1950")
-        fout.write("%%File: %s\n" % self.wwFilename)
-        fout.write("%%TapeID: %s\n" % self.wwTapeId)
-        if len (self.simParamKeyToValue) != 0:
-            fout.write("%%SimParam: %s\n" % wwinfra.SimParam().dictToStr (self.simParamKeyToValue))
-        if self.wwJumpToAddress is not None:
-            fout.write('%%JumpTo 0o%o\n' % self.wwJumpToAddress)
-        for s in self.switchTab:  # switch tab is indexed by name, contains a validated string for the value
-            fout.write("%%Switch: %s %s\n" % (s, self.switchTab[s]))
-        for w in self.dbwgtTab:
-            addrStr = w.paramName if w.paramName != "" else "0o%03o" % w.addr
-            # changed by guy to output negative numbers in octal that are parsable by int(str)
-            # fout.write("%%DbWgt:  %s  0o%02o %s 0o%02o 0o%02o\n" % (addrStr, w.incr, w.format, w.min, w.max))
-            fout.write("%%DbWgt:  %s  %s %s %s %s\n" % (addrStr,
-                self.format_signed_octal(w.incr), w.format,
-                self.format_signed_octal(w.min), self.format_signed_octal(w.max)))
-        columns = 8
-        addr = 0
-        while addr < self.coreSize:
-            i = 0
-            non_null = 0
-            row = ""
-            while i < columns:
-                if self.coreMem[addr+i] is not None:
-                    row += "%07o " % self.coreMem[addr+i]
-                    non_null += 1
-                else:
-                    row += " None   "
-                i += 1
-            if non_null:
-                fout.write('@C%04o: %s\n' % (addr, row))
-            addr += columns
+        fout.write("\n; *** Object Module ***\n")
+        fout.write("%%Object: %s\n" % ("relocatable" if self.relocatable else "absolute"))
+        image.writeHeader (fout)
+        image.writeMemory (fout)
         for s in self.labelTab.labels():
-            addr = self.labelTab.lookup(s).address
-            fout.write("@S%04o: %s\n" % (addr, s))
+            fout.write("@S%04o: %s\n" % (self.labelTab.lookup(s).address, s))
         for s in self.presetTab:
-            value = self.presetTab[s].value
-            fout.write("@S%04o: %s\n" % (value, s))
-        for addr in self.execTab:
-            fout.write("@E%04o: %s\n" % (addr, self.execTab[addr]))
-        for addr in range(0, len(self.commentTab)):
-            if self.commentTab[addr] is not None and len(self.commentTab[addr]) > 0:
-                fout.write("@N%04o: %s\n" % (addr, self.commentTab[addr]))
+            val = self.presetTab[s]
+            # A preset that can't be relocated isn't exported
+            if val.reloc == 0 or not self.relocatable:
+                fout.write("@P%04o: %s\n" % (val.value, s))
+            elif val.reloc == 1:
+                fout.write("@P%04o: %s reloc\n" % (val.value, s))
+        for (address, kind, index) in self.relocTab:
+            fout.write("@R%04o: %s %d\n" % (address, kind, index))
+        for (address, kind, index, label, offset) in self.externTab:
+            fout.write("@X%04o: %s %d %s %d\n" % (address, kind, index, label, offset))
+        image.writeTables (fout)
         fout.close()
 
     def writeListing (self):
@@ -1564,12 +1782,15 @@ class AsmProgram:
         pass
     
     #
-    # This is intended for use with the flowgraph, but it's currently called
-    # during assemble(), since it may prove useful for other analysis or
-    # transform work. We need to see be sure we don't get too much perf hit,
-    # since it does make three more passes.
+    # This is intended for use with the flowgraph, and since it makes three
+    # more passes it's left until the flowgraph is written, rather than done
+    # by assemble() for every program. Other analysis or transform work that
+    # wants the basic blocks can call it too; the work is only done once.
     #
     def markBasicBlocks (self):
+        if self.basicBlocksMarked:
+            return
+        self.basicBlocksMarked = True
         branchTargets = {}  # Set of branch target addrs
         for inst in self.insts:
             targetAddr = inst.getBranchTarget()
@@ -1610,6 +1831,7 @@ class AsmProgram:
 
     def writeFlowgraph (self):
         if self.flowgraphOutFilename is not None:
+            self.markBasicBlocks()
             print ("Flowgraph output to file %s" % self.flowgraphOutFilename)
             fout = open (self.flowgraphOutFilename, 'wt')
             fout.write ("digraph flowchart {\n")
@@ -1643,7 +1865,6 @@ class AsmProgram:
         try:
             self.passOne()
             self.passTwo()
-            self.markBasicBlocks()  # Can be moved to flowgraph if desired
         except AsmFatalError:
             pass
         errorCount = self.cb.log.error_count
@@ -1660,14 +1881,46 @@ class AsmProgram:
                 else:
                     error()
             else:
-                self.writeCore()
-                print ("Listing output to file %s" % self.listingOutFilename)
-                self.writeListing()
+                if self.objectOut:
+                    self.writeObject()
+                else:
+                    self.writeCore()
+                if self.listingOutFilename is not None:
+                    print ("Listing output to file %s" % self.listingOutFilename)
+                    self.writeListing()
                 self.writeFlowgraph()
 
+# Make the AsmProgram for one source file, with the output files and options
+# given by the command line
+def newAsmProgram (inFilename: str, args, parseCache = None) -> AsmProgram:
+    debug = False # args.Debug
+    verbose = False # args.Verbose
+    minimalListing = args.MinimalListing
+    reformat = args.Reformat
+    if reformat:
+        minimalListing = True
+    outFileBaseName = re.sub("\\.ww$", '', inFilename)
+    if args.outputfilebase is not None:
+        outFileBaseName = args.outputfilebase
+    # cb.CoreFileName = os.path.basename (outFileBaseName)  # There does not seem to be a reason store this in cb in the assembler
+    if args.Object:
+        coreOutFilename = outFileBaseName + ".wwo"
+    else:
+        coreOutFilename = outFileBaseName + (".bcore" if args.BinaryCore else ".acore")
+    listingOutFilename = outFileBaseName + ".lst" if not args.NoListing else None
+    flowgraphOutFilename =  outFileBaseName + ".flow.static.gv" if args.FlowGraph else None
+    inStream = open (inFilename, "r")
+    return AsmProgram (
+        inFilename, inStream,
+        coreOutFilename, listingOutFilename, flowgraphOutFilename,
+        verbose, debug, minimalListing, args.ISA_1950,
+        reformat, args.OmitUnrefedLabels,
+        args.CommentColumn, args.CommentWidth, args.OmitAutoComment,
+        objectOut = args.Object, parseCache = parseCache)
+
 def main():
     parser = wwinfra.StdArgs().getParser ("Assemble a Whirlwind Program.")
-    parser.add_argument("inputfile", help="File name of ww asm source file")
+    parser.add_argument("inputfile", nargs="*", help="File name of ww asm source file; more than one, or a directory of them, assembles them all as a batch")
     parser.add_argument('--outputfilebase', '-o', type=str, help='Base name for output file')
     # These two are not currently used but the flags remain in the code and can
     # be reactivated by enabling these statements and picking up their values below.
@@ -1679,10 +1932,16 @@ def main():
     parser.add_argument("--Reformat", help="Prettify the source .ww file and move the original to .ww.bak", action="store_true")
     parser.add_argument("--OmitUnrefedLabels", help="Don't put unreferenced labels in the listing", action="store_true")
     parser.add_argument("-f", "--FlowGraph", help="Generate a static flow graph. Output file <output-file-base-name.flow.static.gv", action="store_true")
+    parser.add_argument("--NoListing", help="Don't write the listing; with no --FlowGraph, the core file is all that's made", action="store_true")
     # Suggested for comment columns is "--CommentColumn 25 --CommentWidth 50"
     parser.add_argument("--CommentColumn", type=int, help="Column after labels for comments in listing. Default 25")
     parser.add_argument("--CommentWidth", type=int, help="Space to allocate to each comment field in listing. If not specified or zero, no field detection")
     parser.add_argument("--OmitAutoComment", help="Omit the auto-comment xref in listing", action="store_true")
+    parser.add_argument("--BinaryCore", help="Write a binary core image (.bcore) instead of a text .acore file", action="store_true")
+    parser.add_argument("--Object", help="Write an object module (.wwo) for wwlink instead of a core file", action="store_true")
+    parser.add_argument("--Watch", help="Stay running and re-assemble whenever the source or an included file changes", action="store_true")
+    parser.add_argument("--Manifest", type=str, help="Assemble the batch of source files listed in this file, one per line, each with its own options")
+    parser.add_argument("--Jobs", "-j", type=int, help="Number of batch assemblies to run at once. Default is one per CPU")
     # We decided to keep this always-on
     # parser.add_argument("--Annotate_IO_Names", help="Auto-add comments to identify SI device names", action="store_true")
     
@@ -1694,33 +1953,166 @@ def main():
     wwinfra.theConstWWbitClass = cb
     cb.decimal_addresses = args.DecimalAddresses  # if set, trace output is expressed in Decimal to suit 1950's chic
     cb.log = wwinfra.LogFactory().getLog (isAsmLog = True)
-    
-    debug = False # args.Debug
-    verbose = False # args.Verbose
-    minimalListing = args.MinimalListing
-    isa1950 = args.ISA_1950
-    reformat = args.Reformat
-    if reformat:
-        minimalListing = True
-    omitUnrefedLabels = args.OmitUnrefedLabels
-    commentColumn = args.CommentColumn
-    commentWidth = args.CommentWidth
-    omitAutoComment = args.OmitAutoComment
-    inFilename = args.inputfile
-    outFileBaseName = re.sub("\\.ww$", '', inFilename)
-    if args.outputfilebase is not None:
-        outFileBaseName = args.outputfilebase
-    # cb.CoreFileName = os.path.basename (outFileBaseName)  # There does not seem to be a reason store this in cb in the assembler
-    coreOutFilename = outFileBaseName + ".acore"
-    listingOutFilename = outFileBaseName + ".lst"
-    flowgraphOutFilename =  outFileBaseName + ".flow.static.gv" if args.FlowGraph else None
-    inStream = open (inFilename, "r")
-    prog = AsmProgram (
-        inFilename, inStream,
-        coreOutFilename, listingOutFilename, flowgraphOutFilename,
-        verbose, debug, minimalListing, isa1950,
-        reformat, omitUnrefedLabels,
-        commentColumn, commentWidth, omitAutoComment)
-    prog.assemble()
 
-main()
+    if args.Manifest is not None or len (args.inputfile) != 1 or os.path.isdir (args.inputfile[0]):
+        if args.Watch:
+            cb.log.fatal ("--Watch can't be used with a batch of files")
+        if args.Jobs is not None and args.Jobs < 1:
+            cb.log.fatal ("--Jobs must be at least 1")
+        jobs = batchJobs (cb, parser, args)
+        sys.exit (0 if assembleBatch (jobs, args.Jobs) else 1)
+    inFilename = args.inputfile[0]
+    if args.Watch and args.Reformat:
+        cb.log.fatal ("--Watch can't be used with --Reformat")
+    parseCache = AsmParseCache()
+    def assembleOnce () -> AsmProgram:
+        prog = newAsmProgram (inFilename, args, parseCache = parseCache)
+        prog.assemble()
+        return prog
+    prog = assembleOnce()
+    if args.Watch:
+        watch (cb, prog, assembleOnce)
+
+#
+# Batch assembly: many source files, each assembled in a process of its own
+# from a pool, as though by "cd <its directory>; wwasm <file> <options>" so
+# that .include finds the same files it would for a single assembly.  The
+# sources come from the command line, where a directory stands for all the
+# .ww files under it, and from a --Manifest file, in which each line is a
+# source file and its options, relative to the manifest's directory, e.g.
+#
+#   # Blank lines and comments are ignored
+#   Code-Samples/Bounce/r-196-bounce-example/bounce1954.ww -o bounce
+#   Code-Samples/Laning-and-Zierler-Interpreter/l-and-z.ww -D
+#
+# A job's output goes to the terminal in one piece as soon as it's finished,
+# and at the end comes a line for each file, in the order given, with its
+# error count and time, and a note if it crashed or stopped on a fatal error.
+#
+def batchJobs (cb, parser, args) -> [(str, argparse.Namespace)]:
+    jobs = []
+    def addJob (inFilename: str, jobArgs):
+        if jobArgs.outputfilebase is not None:
+            jobArgs.outputfilebase = os.path.abspath (jobArgs.outputfilebase)
+        jobs.append ((os.path.abspath (inFilename), jobArgs))
+    for inFilename in args.inputfile:
+        if os.path.isdir (inFilename):
+            for (dirpath, dirnames, filenames) in sorted (os.walk (inFilename)):
+                dirnames.sort()
+                for f in sorted (filenames):
+                    if f.endswith (".ww"):
+                        addJob (os.path.join (dirpath, f), args)
+        else:
+            addJob (inFilename, args)
+    if len (jobs) > 1 and args.outputfilebase is not None:
+        cb.log.fatal ("--outputfilebase can't be used with more than one source file")
+    if args.Manifest is not None:
+        manifestDir = os.path.dirname (os.path.abspath (args.Manifest))
+        try:
+            with open (args.Manifest, "r") as f:
+                lines = f.readlines()
+        except OSError:
+            cb.log.fatal ("Can't read manifest %s" % args.Manifest)
+        for line in lines:
+            argv = shlex.split (line, comments = True)
+            if argv == []:
+                continue
+            jobArgs = parser.parse_args (argv, namespace = copy.copy (args))
+            if len (jobArgs.inputfile) != 1:
+                cb.log.fatal ("Need one source file per line in manifest %s: %s" % (args.Manifest, line.strip()))
+            cwd = os.getcwd()
+            os.chdir (manifestDir)
+            addJob (jobArgs.inputfile[0], jobArgs)
+            os.chdir (cwd)
+    if jobs == []:
+        cb.log.fatal ("No source files to assemble")
+    return jobs
+
+# Returns (inFilename, errorCount, stopped, seconds, output), where stopped says why
+# the job didn't run to the end, e.g. "crashed", or is "" if it did
+def assembleJob (job: (str, argparse.Namespace)) -> (str, int, str, float, str):
+    (inFilename, args) = job
+    start = time.perf_counter()
+    output = io.StringIO()
+    cb = None
+    stopped = ""
+    with contextlib.redirect_stdout (output), contextlib.redirect_stderr (output):
+        try:
+            os.chdir (os.path.dirname (inFilename))
+            cb = wwinfra.ConstWWbitClass (args = args)
+            wwinfra.theConstWWbitClass = cb
+            cb.decimal_addresses = args.DecimalAddresses
+            wwinfra.LogFactory.stdAsmLog.stdAsmLog = None       # A fresh log, and error count, for each job
+            cb.log = wwinfra.LogFactory().getLog (isAsmLog = True)
+            prog = newAsmProgram (os.path.basename (inFilename), args)
+            prog.assemble()
+        except OSError as e:
+            print ("Can't read %s" % e.filename)
+            stopped = "unreadable"
+        except SystemExit:
+            stopped = "fatal"           # log.fatal; the message is in the output
+        except Exception:
+            traceback.print_exc (file = output)
+            stopped = "crashed"
+    errorCount = cb.log.error_count if cb is not None and cb.log is not None else 0
+    return (inFilename, errorCount, stopped, time.perf_counter() - start, output.getvalue())
+
+def assembleBatch (jobs: [(str, argparse.Namespace)], nProcesses: int = None) -> bool:
+    start = time.perf_counter()
+    cwd = os.getcwd()
+    results = []
+    with concurrent.futures.ProcessPoolExecutor (max_workers = nProcesses) as pool:
+        futures = {pool.submit (assembleJob, job): i for (i, job) in enumerate (jobs)}
+        for future in concurrent.futures.as_completed (futures):
+            result = future.result()
+            (inFilename, errorCount, stopped, seconds, output) = result
+            print ("*** %s" % os.path.relpath (inFilename, cwd))
+            sys.stdout.write (output)
+            sys.stdout.flush()
+            results.append ((futures[future], result))
+    # The table is in the order the jobs were given, whatever order they finished in
+    results = [result for (i, result) in sorted (results)]
+    print ("")
+    for (inFilename, errorCount, stopped, seconds, output) in results:
+        print (("%-60s %4d error%s %8.0f ms %s" % (os.path.relpath (inFilename, cwd), errorCount,
+                                                " " if errorCount == 1 else "s", seconds * 1000, stopped)).rstrip())
+    nFailed = len ([r for r in results if r[1] != 0 or r[2] != ""])
+    print ("%d files assembled, %d with errors, in %.1f s (%.1f s of assembly)" %
+           (len (results), nFailed, time.perf_counter() - start, sum (r[3] for r in results)))
+    return nFailed == 0
+
+#
+# --Watch: poll the files the last assembly read, and re-assemble when any of
+# them changes. Only changed files are parsed again; see AsmParseCache.
+#
+def watch (cb, prog: AsmProgram, assembleOnce):
+    def mtimes (filenames: [str]) -> dict:
+        r = {}
+        for f in filenames:
+            try:
+                r[f] = os.stat (f).st_mtime_ns
+            except OSError:
+                r[f] = None             # Perhaps being replaced by an editor; it'll change again
+        return r
+    print ("Watching %s for changes; ^C to stop" % ", ".join (prog.sourceFilenames))
+    lastMtimes = mtimes (prog.sourceFilenames)
+    try:
+        while True:
+            time.sleep (0.02)
+            if mtimes (lastMtimes) == lastMtimes:
+                continue
+            cb.log.error_count = 0
+            start = time.perf_counter()
+            try:
+                prog = assembleOnce()
+            except OSError as e:
+                print ("Can't read %s" % e.filename)
+            except Exception:
+                traceback.print_exc()   # An assembler bug shouldn't end the watch; fix the source and save again
+            print ("Re-assembled in %.0f ms" % ((time.perf_counter() - start) * 1000))
+            lastMtimes = mtimes (prog.sourceFilenames)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
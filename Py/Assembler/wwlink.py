@@ -0,0 +1,290 @@
+import re
+import wwinfra
+from wwasm import AsmCoreImage, DebugWidgetClass
+
+# LAS-style linker for object modules written by wwasm --Object.
+#
+# A library such as float-lib.ww can be assembled once into a .wwo and linked
+# into each program that uses it, rather than being re-assembled through
+# .include every time. A module with no .org is relocatable: wwasm assembles
+# it as if it were loaded at 0o40, and wwlink loads the relocatable modules one
+# after another, in command-line order, following the last word of the
+# absolute ones (or at --Org), which is where .include at the end of the main
+# program would have put them. Labels used but not defined in a module are
+# looked up among the labels and presets of all the others.
+#
+# The core file is written by wwasm's AsmCoreImage, so linking a program's
+# modules in the order it would have included them gives the same core file
+# as assembling it whole, apart from the %File name.
+
+class LinkModule:
+    relocBase = 0o40        # Where wwasm assembles a relocatable module
+    def __init__ (self, filename: str, coreSize: int):
+        self.filename = filename
+        self.relocatable = False
+        self.image = AsmCoreImage (coreSize)    # The module's header, memory and tables, as assembled
+        self.labels = []                        # [(address, label)]
+        self.presets = []                       # [(value, name, reloc: bool)]
+        self.relocTab = []                      # [(address, kind, index)]
+        self.externTab = []                     # [(address, kind, index, label, offset)]
+        self.delta = 0                          # Added to every address when loaded
+    # First and one past the last word of the module, as assembled
+    def extent (self) -> (int, int):
+        used = [addr for addr in range (len (self.image.coreMem)) if self.image.coreMem[addr] is not None]
+        return (used[0], used[-1] + 1) if used != [] else (self.relocBase, self.relocBase)
+
+class Linker:
+    def __init__ (self, cb, org: int):
+        self.cb = cb
+        self.wordWidth = 16
+        self.maxUnsignedWord = 2**self.wordWidth - 1
+        self.maxSignedWordMag = 2**(self.wordWidth - 1) - 1
+        self.coreSize = cb.CORE_SIZE
+        self.addressMask = 2**11 - 1
+        self.org = org
+        self.modules: [LinkModule] = []
+        self.symTab = {}                        # Label or preset: str -> (value: int, LinkModule)
+
+    def error (self, msg: str):
+        self.cb.log.error (msg)
+
+    # Octal field of an object module record, e.g. the aaaa in @Caaaa: or @Paaaa:
+    def recordNumber (self, m: LinkModule, line: str) -> (int, str):
+        (num, sep, rest) = line[2:].partition (": ")
+        try:
+            return (int (num, 8), rest)
+        except ValueError:
+            self.error ("%s: can't read record %s" % (m.filename, line))
+            return (0, rest)
+
+    def readModule (self, filename: str) -> LinkModule:
+        m = LinkModule (filename, self.coreSize)
+        image = m.image
+        try:
+            with open (filename, "r") as f:
+                lines = f.read().split ("\n")
+        except IOError:
+            self.cb.log.fatal ("Can't read object module %s" % filename)
+        if "%Object: relocatable" in lines:
+            m.relocatable = True
+        elif "%Object: absolute" not in lines:
+            self.cb.log.fatal ("%s is not an object module from wwasm --Object" % filename)
+        for line in lines:
+            tag = line[0:2]
+            if line == "" or line[0] == ";" or line.startswith ("%Object:"):
+                pass
+            elif line.startswith ("%ISA:"):
+                image.isa1950 = line.split()[1] == "isa1950"
+            elif line.startswith ("%File:"):
+                image.wwFilename = line[len ("%File: "):]
+            elif line.startswith ("%TapeID:"):
+                image.wwTapeId = line[len ("%TapeID: "):]
+            elif line.startswith ("%SimParam:"):
+                simParam = wwinfra.SimParam (self.cb)
+                simParam.sim_param_dict = {}
+                image.simParamKeyToValue = simParam.strToDict (line)
+            elif line.startswith ("%JumpTo"):
+                image.wwJumpToAddress = int (line.split()[1], 8)
+            elif line.startswith ("%Switch:"):
+                (name, sep, value) = line[len ("%Switch: "):].partition (" ")
+                image.switchTab[name] = value
+            elif line.startswith ("%DbWgt:"):
+                fields = line.split()
+                (addrStr, incr, fmt, min, max) = (fields[1], fields[2], " ".join (fields[3:-2]), fields[-2], fields[-1])
+                (addr, paramName) = (int (addrStr, 8), "") if addrStr.startswith ("0o") else (0, addrStr)
+                image.dbwgtTab.append (DebugWidgetClass (0, addr, paramName, int (incr, 8), fmt, int (min, 8), int (max, 8)))
+            elif tag == "@C":
+                (addr, rest) = self.recordNumber (m, line)
+                for word in rest.split():
+                    image.coreMem[addr] = None if word == "None" else int (word, 8)
+                    addr += 1
+            elif tag == "@S":
+                (addr, label) = self.recordNumber (m, line)
+                m.labels.append ((addr, label))
+            elif tag == "@P":
+                (value, rest) = self.recordNumber (m, line)
+                f = rest.split()
+                m.presets.append ((value, f[0], len (f) > 1 and f[1] == "reloc"))
+            elif tag == "@R":
+                (addr, rest) = self.recordNumber (m, line)
+                (kind, index) = rest.split()
+                m.relocTab.append ((addr, kind, int (index)))
+            elif tag == "@X":
+                (addr, rest) = self.recordNumber (m, line)
+                (kind, index, label, offset) = rest.split()
+                m.externTab.append ((addr, kind, int (index), label, int (offset)))
+            elif tag == "@E":
+                (addr, execStr) = self.recordNumber (m, line)
+                image.execTab[addr] = execStr
+            elif tag == "@N":
+                (addr, comment) = self.recordNumber (m, line)
+                image.commentTab[addr] = comment
+            else:
+                self.error ("%s: unrecognized line %s" % (filename, line))
+        return m
+
+    # Absolute modules stay where they were assembled; relocatable ones follow
+    # them, or start at --Org
+    def placeModules (self):
+        nextAddr = self.org
+        if nextAddr is None:
+            nextAddr = LinkModule.relocBase
+            for m in self.modules:
+                if not m.relocatable:
+                    nextAddr = max (nextAddr, m.extent()[1])
+        for m in self.modules:
+            if m.relocatable:
+                m.delta = nextAddr - LinkModule.relocBase
+                nextAddr += m.extent()[1] - LinkModule.relocBase
+        if nextAddr > self.coreSize:
+            self.error ("Modules run to 0o%o, past the end of core" % (nextAddr - 1))
+
+    def defineSymbol (self, name: str, value: int, m: LinkModule):
+        if name in self.symTab:
+            self.error ("%s is defined in both %s and %s" % (name, self.symTab[name][1].filename, m.filename))
+        else:
+            self.symTab[name] = (value, m)
+
+    def buildSymTab (self):
+        for m in self.modules:
+            for (addr, label) in m.labels:
+                self.defineSymbol (label, addr + m.delta, m)
+            for (value, name, reloc) in m.presets:
+                self.defineSymbol (name, value + m.delta if reloc else value, m)
+
+    # Add n to the value a module stored for wwlink to fix up; see
+    # AsmProgram.linkFixup() in wwasm for kind and index
+    def fixup (self, m: LinkModule, address: int, kind: str, index: int, n: int):
+        image = m.image
+        where = "%s at 0o%o" % (m.filename, address)
+        if kind == "A":
+            word = image.coreMem[address]
+            addr = (word & self.addressMask) + n
+            if addr < 0 or addr >= self.coreSize:
+                self.error ("Address 0o%o out of range in %s" % (addr, where))
+            else:
+                image.coreMem[address] = (word & ~self.addressMask) | addr
+        elif kind == "W":
+            # The word is stored as wwasm's AsmInst.wwWord wrote it, negative values
+            # in one's complement, so it has to be read back as signed to add to
+            word = image.coreMem[address]
+            value = (word if word <= self.maxSignedWordMag else word - self.maxUnsignedWord) + n
+            if value < -self.maxSignedWordMag or value > self.maxUnsignedWord:
+                self.error ("Value %d out of range in %s" % (value, where))
+            else:
+                image.coreMem[address] = value if value >= 0 else self.maxUnsignedWord + value
+        elif kind == "E":
+            execStr = image.execTab[address]
+            addr = int (execStr[index:index + 8], 8) + n
+            if addr < 0 or addr > self.coreSize:
+                self.error ("Address 0o%o out of range in %s" % (addr, where))
+            else:
+                image.execTab[address] = execStr[:index] + "0o%06o" % addr + execStr[index + 8:]
+        elif kind == "D":
+            image.dbwgtTab[index].addr += n
+        elif kind == "J":
+            image.wwJumpToAddress += n
+        else:
+            self.error ("Unknown fixup %s in %s" % (kind, where))
+
+    def resolve (self):
+        for m in self.modules:
+            for (address, kind, index) in m.relocTab:
+                self.fixup (m, address, kind, index, m.delta)
+            for (address, kind, index, label, offset) in m.externTab:
+                if label not in self.symTab:
+                    self.error ("Undefined label %s used in %s at 0o%o" % (label, m.filename, address))
+                else:
+                    self.fixup (m, address, kind, index, self.symTab[label][0] + offset)
+
+    # Combine the fixed-up modules into one core image, in module order, as
+    # assembling them together would have
+    def combine (self) -> AsmCoreImage:
+        image = AsmCoreImage (self.coreSize)
+        first = self.modules[0].image
+        image.isa1950 = first.isa1950
+        image.wwFilename = first.wwFilename
+        image.wwTapeId = first.wwTapeId
+        jumpToModule: LinkModule = None
+        for m in self.modules:
+            mi = m.image
+            d = m.delta
+            if mi.isa1950 != image.isa1950:
+                self.error ("%s and %s use different instruction sets" % (self.modules[0].filename, m.filename))
+            if image.wwTapeId == "":
+                image.wwTapeId = mi.wwTapeId
+            image.simParamKeyToValue.update (mi.simParamKeyToValue)
+            if mi.wwJumpToAddress is not None:
+                if jumpToModule is not None:
+                    self.error ("Both %s and %s have a .jumpto" % (jumpToModule.filename, m.filename))
+                jumpToModule = m
+                image.wwJumpToAddress = mi.wwJumpToAddress
+            image.switchTab.update (mi.switchTab)
+            image.dbwgtTab += mi.dbwgtTab
+            for addr in range (0, self.coreSize):
+                if mi.coreMem[addr] is not None:
+                    if addr + d >= self.coreSize:
+                        self.error ("%s doesn't fit in core" % m.filename)
+                        break
+                    if image.coreMem[addr + d] is not None:
+                        self.error ("%s overlaps another module at 0o%o" % (m.filename, addr + d))
+                    image.coreMem[addr + d] = mi.coreMem[addr]
+            for addr in mi.execTab:
+                if addr + d in image.execTab:
+                    image.execTab[addr + d] += " \n " + mi.execTab[addr]
+                else:
+                    image.execTab[addr + d] = mi.execTab[addr]
+            for addr in range (0, self.coreSize - d):
+                if mi.commentTab[addr] is not None and len (mi.commentTab[addr]) > 0:
+                    image.commentTab[addr + d] = mi.commentTab[addr]
+        for m in self.modules:
+            image.symbols += [(addr + m.delta, label) for (addr, label) in m.labels]
+        for m in self.modules:
+            image.symbols += [(value + m.delta if reloc else value, name) for (value, name, reloc) in m.presets]
+        return image
+
+    def link (self, filenames: [str], coreOutFilename: str, showMap: bool):
+        for filename in filenames:
+            self.modules.append (self.readModule (filename))
+        self.placeModules()
+        self.buildSymTab()
+        self.resolve()
+        image = self.combine()
+        if showMap:
+            for m in self.modules:
+                (start, end) = m.extent()
+                print ("%s: %s, %d words at 0o%o" % (m.filename, "relocatable" if m.relocatable else "absolute",
+                                                     end - start, start + m.delta))
+        errorCount = self.cb.log.error_count
+        if errorCount != 0:     # Don't write files if picked up errors
+            print ("Error Count = %d; output files suppressed" % errorCount)
+        else:
+            print ("Corefile output to file %s" % coreOutFilename)
+            image.write (self.cb, coreOutFilename)
+
+def main():
+    parser = wwinfra.StdArgs().getParser ("Link Whirlwind object modules from wwasm --Object into a core file.")
+    parser.add_argument("objectfiles", nargs="+", help="Object modules (.wwo), loaded in the order given")
+    parser.add_argument('--outputfilebase', '-o', type=str, help='Base name for output file; default is that of the first module')
+    parser.add_argument("--Org", type=str, help="Load relocatable modules starting at this address, e.g. 0o1000. "
+                        "Default is after the last word of the absolute modules")
+    parser.add_argument("--BinaryCore", help="Write a binary core image (.bcore) instead of a text .acore file", action="store_true")
+    parser.add_argument("--Map", help="Print where each module was loaded", action="store_true")
+    args = parser.parse_args()
+    cb = wwinfra.ConstWWbitClass (args = args)
+    wwinfra.theConstWWbitClass = cb
+    cb.log = wwinfra.LogFactory().getLog()
+
+    org = None
+    if args.Org is not None:
+        try:
+            org = int (args.Org, 0)
+        except ValueError:
+            cb.log.fatal ("--Org %s is not a number" % args.Org)
+    outFileBaseName = re.sub ("\\.wwo$", '', args.objectfiles[0])
+    if args.outputfilebase is not None:
+        outFileBaseName = args.outputfilebase
+    coreOutFilename = outFileBaseName + (".bcore" if args.BinaryCore else ".acore")
+    Linker (cb, org).link (args.objectfiles, coreOutFilename, args.Map)
+
+main()
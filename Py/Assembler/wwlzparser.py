@@ -19,14 +19,27 @@ class AsmToken:
     def print (self):
         print ("AsmToken ", self.tokenType, self.tokenStr)
 
+# Tokens are matched by a wwinfra.RegexLexer, as in wwasmparser; here a tab is
+# a record separator rather than whitespace, and there are no strings.
+
 class AsmTokenizer:
     endOfString = "<end-of-string>"
+    alpha = "A-Za-z_\u212a"
+    lexer = wwinfra.RegexLexer ([("RecordSep", r"\t"),
+                                 ("Whitespace", r"[ \n\r]+"),
+                                 ("Comment", r";"),
+                                 ("AutoComment", r"@@"),
+                                 ("Operator", r"[-+@:.*()/|]"),
+                                 ("ZeroOh", r"0o"),
+                                 ("Identifier", r"[0-9]*[%s][0-9%s]*" % (alpha, alpha)),
+                                 ("DigitString", r"[0-9]+")])
+    octalLexer = wwinfra.RegexLexer ([("Identifier", r"[0-9]*[%s][0-9%s]*" % (alpha, alpha)),
+                                      ("DigitString", r"[0-9]*")])
     def __init__ (self, str):
         self.pos = 0
         self.state = 0
         self.str = str
         self.slen = len (str)
-        self.buffer = ""
         self.tokenBuf: AsmToken = None
         self.cb = wwinfra.theConstWWbitClass
     def isWhitespace (self, c) -> bool:
@@ -36,19 +49,6 @@ class AsmTokenizer:
         return ":\n" + str + "\n" + s + "^\n"
     def isSingleCharOper (self, c) -> bool:
         return c in ['+', '-', '@', ':', '.', ';', '*', '(', ')', '/', '|']
-    def isDigit (self, c) -> bool:
-        return ord (c) >= ord ('0') and ord (c) <= ord ('9')
-    def isExtAlphaChar (self, c) -> bool:
-        c = c.lower()
-        return ord (c) >= ord ('a') and ord (c) <= ord ('z') or c == '_'
-    def isExtAlphaNumChar (self, c) -> bool:
-        return self.isExtAlphaChar (c) or self.isDigit (c)
-    def push (self, c):
-        self.buffer += c
-    def pop (self):
-        buf = self.buffer
-        self.buffer = ""
-        return buf
     def illegalChar (self, c, pos, str, state):
         self.cb.log.error (0, "State %d: Illegal char \'%c\' at pos %d in %s" % (state, c, pos, str) +
                            self.caratString (str, pos))
@@ -65,166 +65,70 @@ class AsmTokenizer:
         for token in tokens:
             print (token.tokenType, token.tokenStr)
     def getCommentToken (self) -> AsmToken:
-        while self.pos <= self.slen:
-            if self.pos < self.slen:
-                c = self.str[self.pos]
-                if c == '\t':
-                    return AsmToken (AsmTokenType.Comment, self.pop())
-                else:
-                    self.push (c)
-                    self.pos += 1
-            else:
-                return AsmToken (AsmTokenType.Comment, self.pop())
-    # public            
+        tab = self.str.find ('\t', self.pos)
+        if tab < 0:
+            tab = self.slen
+        tokenStr = self.str[self.pos:tab]
+        self.pos = tab
+        return AsmToken (AsmTokenType.Comment, tokenStr)
+    def restOfLine (self, tokenType: AsmTokenType) -> AsmToken:
+        tokenStr = self.str[self.pos:]
+        self.pos = self.slen
+        return AsmToken (tokenType, tokenStr)
+    def wordToken (self, tokenType: AsmTokenType, m, state: int) -> AsmToken:
+        self.pos = m.end()
+        if self.pos < self.slen:
+            c = self.str[self.pos]
+            if self.isWhitespace (c):
+                self.pos += 1
+            elif not self.isSingleCharOper (c) and c != '\t':
+                self.illegalChar (c, self.pos, self.str, state)
+        return AsmToken (tokenType, m.group())
+    # public
     def getToken (self) -> AsmToken:
-        while self.pos <= self.slen:
-            if self.pos < self.slen:
-                c = self.str[self.pos]
-            else:
-                c = self.endOfString
-            match self.state:
-                case 0:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return AsmToken (AsmTokenType.EndOfString, "")
-                    if c == '\t':
-                        self.state = 0
-                        self.pos += 1
-                        return AsmToken (AsmTokenType.RecordSep, "")
-                    if self.isWhitespace (c):
-                        self.state = 0
-                        self.pos += 1
-                    elif c == ';':
-                        self.state = 5
-                        self.pos += 1                        
-                    elif c == '@':
-                        self.state = 1
-                        self.pos += 1
-                    elif self.isSingleCharOper (c):
-                        self.state = 0
-                        self.pos += 1
-                        return AsmToken (AsmTokenType.Operator, c)
-                    elif c == '0':
-                        self.state = 8
-                        self.pos += 1
-                        self.push (c)
-                    elif self.isDigit (c):
-                        self.state = 3
-                        self.pos += 1
-                        self.push (c)
-                    elif self.isExtAlphaChar (c):
-                        self.state = 4
-                        self.pos += 1
-                        self.push (c)
-                    else:
-                        self.illegalChar (c, self.pos, self.str, self.state)
-                case 1:
-                    if c == '@':
-                        self.state = 2
-                        self.pos += 1
-                    else:
-                        self.state = 0
-                        return AsmToken (AsmTokenType.Operator, "@")
-                case 2:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return AsmToken (AsmTokenType.AutoCommment, self.pop())
-                    else:
-                        self.state = 2
-                        self.pos += 1
-                        self.push (c)
-                case 3:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return AsmToken (AsmTokenType.DigitString, self.pop())
-                    if self.isDigit (c):
-                        self.state = 3
-                        self.pos += 1
-                        self.push (c)
-                    elif self.isSingleCharOper (c) or c == '\t':
-                        self.state = 0
-                        return AsmToken (AsmTokenType.DigitString, self.pop())
-                    elif self.isWhitespace (c):
-                        self.state = 0
-                        self.pos += 1
-                        return AsmToken (AsmTokenType.DigitString, self.pop())
-                    elif self.isExtAlphaChar (c):
-                        self.state = 4
-                        self.pos += 1
-                        self.push (c)
-                    else:
-                        self.illegalChar (c, self.pos, self.str, self.state)
-                case 4:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return AsmToken (AsmTokenType.Identifier, self.pop())
-                    elif self.isExtAlphaNumChar (c):
-                        self.state = 4
-                        self.pos += 1
-                        self.push (c)
-                    elif self.isSingleCharOper (c) or c == '\t':
-                        self.state = 0
-                        return AsmToken (AsmTokenType.Identifier, self.pop())
-                    elif self.isWhitespace (c):
-                        self.state = 0
-                        self.pos += 1
-                        return AsmToken (AsmTokenType.Identifier, self.pop())
-                    else:
-                        self.illegalChar (c, self.pos, self.str, self.state)
-                case 5:
-                    if c == '@':
-                        self.state = 6
-                        self.pos += 1
-                    elif c == self.endOfString:
-                        self.state = 0
-                        return AsmToken (AsmTokenType.Comment, self.pop())
-                    else:
-                        self.state = 5
-                        self.pos += 1
-                        self.push (c)
-                case 6:
-                    if c == '@':
-                        self.state = 7
-                        self.pos += 1
-                        return AsmToken (AsmTokenType.Comment, self.pop())
-                    else:
-                        self.state = 5
-                case 7:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return AsmToken (AsmTokenType.AutoComment, self.pop())
-                    else:
-                        self.state = 7
-                        self.pos += 1
-                        self.push (c)
-                case 8:
-                    if c == 'o':
-                        self.state = 3
-                        self.pos += 1
-                        self.pop()
-                        return AsmToken (AsmTokenType.Operator, "0o")
-                    elif c == self.endOfString:
-                        self.state = 0
-                        self.pop()
-                        return AsmToken (AsmTokenType.DigitString, "0")
-                    elif self.isDigit (c):
-                        self.state = 3
-                        self.pos += 1
-                        self.push (c)
-                    elif self.isWhitespace (c):
-                        self.state = 0
-                        self.pos += 1
-                        self.pop()
-                        return AsmToken (AsmTokenType.DigitString, "0")
-                    elif self.isSingleCharOper (c) or c == '\t':
-                        self.state = 0
-                        self.pop()
-                        return AsmToken (AsmTokenType.DigitString, "0")
-                    elif self.isExtAlphaNumChar (c):
-                        self.state = 4
-                    else:
-                        self.illegalChar (c, self.pos, self.str, self.state)
-        return AsmToken()
+        if self.state == 7:
+            # What follows the @@ in a comment
+            self.state = 0
+            return self.restOfLine (AsmTokenType.AutoComment)
+        if self.state == 3:
+            # Just past a 0o
+            self.state = 0
+            (kind, m) = self.octalLexer.match (self.str, self.pos)
+            if kind == "Identifier":
+                return self.wordToken (AsmTokenType.Identifier, m, 4)
+            return self.wordToken (AsmTokenType.DigitString, m, 3)
+        (kind, m) = self.lexer.match (self.str, self.pos)
+        if kind == "Whitespace":
+            self.pos = m.end()
+            (kind, m) = self.lexer.match (self.str, self.pos)
+        if kind is None:
+            if self.pos == self.slen:
+                return AsmToken (AsmTokenType.EndOfString, "")
+            self.illegalChar (self.str[self.pos], self.pos, self.str, 0)
+        self.pos = m.end()
+        match kind:
+            case "RecordSep":
+                return AsmToken (AsmTokenType.RecordSep, "")
+            case "Operator":
+                return AsmToken (AsmTokenType.Operator, m.group())
+            case "Comment":
+                # A lone @ in the comment is dropped
+                atAt = self.str.find ("@@", self.pos)
+                if atAt < 0:
+                    self.pos = self.slen
+                    return AsmToken (AsmTokenType.Comment, self.str[m.end():].replace ("@", ""))
+                self.state = 7
+                self.pos = atAt + 2
+                return AsmToken (AsmTokenType.Comment, self.str[m.end():atAt].replace ("@", ""))
+            case "AutoComment":
+                return self.restOfLine (AsmTokenType.AutoComment)
+            case "ZeroOh":
+                self.state = 3
+                return AsmToken (AsmTokenType.Operator, "0o")
+            case "Identifier":
+                return self.wordToken (AsmTokenType.Identifier, m, 4)
+            case "DigitString":
+                return self.wordToken (AsmTokenType.DigitString, m, 8 if m.group() == "0" else 3)
 
 AsmExprType = Enum ("AsmExprType", ["BinaryPlus", "BinaryMinus",
                                     "UnaryPlus", "UnaryMinus", "UnaryZeroOh",
@@ -41,13 +41,96 @@ UseGun2 = False
 import time
 import math
 import os
+import ww_glyphs
 try:
     import RPi.GPIO as gpio
     import spidev
 except ImportError:
+    # use the stand-ins, which can record what would have gone to the hardware
+    import gpio_replacement
+    import spidev_replacement as spidev
+    gpio = gpio_replacement.gpioClass()
     RasPi = False
 
 
+# The display list collects a whole frame of scope commands and sends them to the
+# hardware in one go when the display is refreshed, instead of one at a time as the
+# simulated program issues them.
+# The D/A converter words for every possible coordinate are worked out ahead of time,
+# and so are the strobe hold times, so playing the list out does no arithmetic at all.
+# A D/A word is only sent if the converter isn't already holding it, and the Z-axis
+# enables are only changed when the scope selection changes.
+# The D/A converter latches a word on each rising edge of chip select, and the move
+# and draw strobes are GPIO lines, so each converter word still takes one SPI transfer.
+class AnaScopeDisplayList:
+    def __init__(self, ana_scope):
+        self.ana_scope = ana_scope
+        # [converter][val + 1023] -> two-byte SPI word
+        self.da_words = ([], [])
+        for n in (0, 1):
+            for val in range(-1023, 1024):
+                self.da_words[n].append(bytes(ana_scope._daWord(n, val)))
+        self.move_ns = int(ana_scope.move_delay * 1e9)
+        self.draw_ns = int(ana_scope.draw_delay * 1e9)
+        # each entry is (strobe pin, strobe hold ns, x word, y word, (enZ1, enZ2) or None)
+        self.commands = []
+        self.frames = 0
+        self.spi_transfers = 0
+
+    def _word(self, n, val):
+        val = int(val)
+        if val > 1023:
+            val = 1023
+        if val < -1023:
+            val = -1023
+        return self.da_words[n][val + 1023]
+
+    def move(self, posx, posy):
+        self.commands.append((self.ana_scope.pin_doMove, self.move_ns,
+                              self._word(0, posx), self._word(1, posy), None))
+
+    def draw(self, speedx, speedy, z_enables):
+        self.commands.append((self.ana_scope.pin_doDraw, self.draw_ns,
+                              self._word(0, speedx), self._word(1, speedy), z_enables))
+
+    # how long the strobes in the list will take, not counting the transfers
+    def strobe_time_ns(self):
+        return sum([cmd[1] for cmd in self.commands])
+
+    # send the list to the hardware and start a new one
+    def play(self, spi):
+        write = spi.writebytes2 if hasattr(spi, "writebytes2") else spi.writebytes
+        output = gpio.output
+        clock = time.perf_counter_ns
+        pin_enZ1 = self.ana_scope.pin_enZ1
+        pin_enZ2 = self.ana_scope.pin_enZ2
+        last_x = None
+        last_y = None
+        last_z = None
+        transfers = 0
+        for (pin, hold_ns, x_word, y_word, z_enables) in self.commands:
+            if x_word is not last_x:
+                write(x_word)
+                last_x = x_word
+                transfers += 1
+            if y_word is not last_y:
+                write(y_word)
+                last_y = y_word
+                transfers += 1
+            if z_enables is not None and z_enables != last_z:
+                output(pin_enZ1, z_enables[0])
+                output(pin_enZ2, z_enables[1])
+                last_z = z_enables
+            output(pin, 1)
+            stop = clock() + hold_ns
+            while clock() < stop:
+                pass
+            output(pin, 0)
+        self.commands = []
+        self.frames += 1
+        self.spi_transfers += transfers
+
+
 # Analog Scope Interface Class
 class AnaScope:
     def __init__(self, host_os, cb):
@@ -85,6 +168,8 @@ class AnaScope:
 
         self.move_delay = 35.0E-6
         self.draw_delay = 55.0E-6
+        self.move_delay_ns = int(self.move_delay * 1e9)
+        self.draw_delay_ns = int(self.draw_delay * 1e9)
 
         # for light gun
         self.wasPoint = False
@@ -118,23 +203,24 @@ class AnaScope:
             self.spi.open(0, 0)
             self.spi.max_speed_hz = 4000000
 
+        self.display_list = None
+        if cb.ana_scope_display_list and not self.PCDebug:
+            self.display_list = AnaScopeDisplayList(self)
+
     def __del__(self):
         if not self.PCDebug:
             gpio.cleanup()
             self.spi.close()
 
     # time.sleep has 70us overhead on Raspi B+ with python 3.7, use quicker method
-    def _delay(self, duration):
-        stop = time.perf_counter_ns() + int(duration * 1e9)
+    # The duration is in nanoseconds
+    def _delay(self, duration_ns):
+        stop = time.perf_counter_ns() + duration_ns
         while time.perf_counter_ns() < stop:
             pass
 
-    # private routine to send numbers to the D/A converter
-    def _setDA(self, n, val):
-        """ sets one D/A converter
-            n: SPI address 0 or 1 for converter number
-            val: python int -1023 to +1023
-        """
+    # the two bytes to send to the D/A converter to set it to val
+    def _daWord(self, n, val):
         # It's a 12-bit D/A converter, so we wire in the range of 0-4095
         if val >= 1024:
             val = 1023
@@ -149,23 +235,43 @@ class AnaScope:
         mask = 0x30
         if n == 0:
             mask = mask | 0x80
-        outv = [mask | hival, loval]
+        return [mask | hival, loval]
+
+    # private routine to send numbers to the D/A converter
+    def _setDA(self, n, val):
+        """ sets one D/A converter
+            n: SPI address 0 or 1 for converter number
+            val: python int -1023 to +1023
+        """
+        outv = self._daWord(n, val)
         if not self.PCDebug:
             self.spi.writebytes(outv)
         else:
             pass  # print("SPI write=[0x%02x, 0x%02x]" % (outv[0], outv[1]))
 
     def _movePoint(self, posx, posy):
+        if self.display_list is not None:
+            self.display_list.move(posx, posy)
+            return
         # move to destination
         self._setDA(0, posx)
         self._setDA(1, posy)
         if not self.PCDebug:
             gpio.output(self.pin_doMove, 1)
             # time.sleep(self.move_delay)  # don't use the built-in sleep...
-            self._delay(self.move_delay)   #  ... use the local one instead
+            self._delay(self.move_delay_ns)   #  ... use the local one instead
             gpio.output(self.pin_doMove, 0)
 
+    # the levels for the two Z-axis enable pins (inverted: 0 is enable) to intensify the selected scopes
+    def _zEnables(self, scope):
+        if scope & (self.cb.SCOPE_MAIN | self.cb.SCOPE_AUX) == 0:
+            return (0, 0)
+        return (0 if scope & self.cb.SCOPE_MAIN else 1, 0 if scope & self.cb.SCOPE_AUX else 1)
+
     def _drawSegment(self, speedx, speedy, scope):
+        if self.display_list is not None:
+            self.display_list.draw(speedx, speedy, self._zEnables(scope))
+            return
         # set speed and intensity
         self._setDA(0, speedx)
         self._setDA(1, speedy)
@@ -181,7 +287,7 @@ class AnaScope:
         if not self.PCDebug:
             gpio.output(self.pin_doDraw, 1)
             # time.sleep(self.draw_delay)  # don't use the built-in sleep...
-            self._delay(self.draw_delay)   #  ... use the local one instead
+            self._delay(self.draw_delay_ns)   #  ... use the local one instead
             gpio.output(self.pin_doDraw, 0)
 
     def _drawSmallVector(self, posx, posy, speedx, speedy, scope):
@@ -240,38 +346,20 @@ class AnaScope:
         """
             Draw a user defined character (7-segments)
             Uses small vector drawing directly.
-            To speed up, segments not drawn are skipped 
+            Only the lit segments come back from the glyph cache, so dark
+            ones cost nothing; the beam is moved only at the start of each run
         """
         if scope is None:
             scope = self.cb.SCOPE_MAIN
 
-        last_x = x
-        last_y = y
-        toMove = True
         # to increase accuracy, do an extra move to the start
         self._movePoint(x, y)
-        for i in range(0, 7):
-            if Xwin_crt.WW_CHAR_SEQ[i] == "down":
-                y = last_y - Xwin_crt.WW_CHAR_VSTROKE * expand
-            elif Xwin_crt.WW_CHAR_SEQ[i] == "up":
-                y = last_y + Xwin_crt.WW_CHAR_VSTROKE * expand
-            elif Xwin_crt.WW_CHAR_SEQ[i] == "left":
-                x = last_x - Xwin_crt.WW_CHAR_HSTROKE * expand
-            elif Xwin_crt.WW_CHAR_SEQ[i] == "right":
-                x = last_x + Xwin_crt.WW_CHAR_HSTROKE * expand
-            else:
-                print(("OMG its a bug! WW_CHAR_SEQ[%d]=%s " % (i, Xwin_crt.WW_CHAR_SEQ[i])))
-
-            if mask & 1 << (6 - i):
-                if toMove:
-                    self._movePoint(last_x, last_y)
-                    toMove = False
-                # self._drawSmallVector(last_x, last_y, 4*(x - last_x), 4*(y - last_y))
-                self._drawSegment(4 * (x - last_x), 4 * (y - last_y), scope)
-            else:
-                toMove = True
-            last_x = x
-            last_y = y
+        strokes = ww_glyphs.glyph_strokes.strokes(mask, expand, Xwin_crt.WW_CHAR_HSTROKE, Xwin_crt.WW_CHAR_VSTROKE)
+        for (x0, y0, x1, y1, new_run) in strokes:
+            if new_run:
+                self._movePoint(x + x0, y + y0)
+            # self._drawSmallVector(x + x0, y + y0, 4*(x1 - x0), 4*(y1 - y0))
+            self._drawSegment(4 * (x1 - x0), 4 * (y1 - y0), scope)
 
     """
         The light gun has a trigger switch for one-shot operation:
@@ -347,10 +435,18 @@ class AnaScope:
                     self.wasGunPulse2 = False
         return 0
 
+    # Send any pending display list to the scope; called on each display refresh
+    def updateDisplay(self):
+        if self.display_list is not None:
+            self.display_list.play(self.spi)
+
     def checkGun(self):
         if self.PCDebug:
             return(False)
 
+        # the light gun reports on the point just drawn, so the point had better be on the screen
+        self.updateDisplay()
+
         ret = False
         if self.getLightGuns():
             ret = True
@@ -511,10 +607,6 @@ class XwinCrt:
         self.win = None
         self.WW_CHAR_HSTROKE = 8  # should be 20.0 in 'expand'
         self.WW_CHAR_VSTROKE = 9  # should be 15.00
-        # The Whirlwind CRT character generator uses a seven-segment format with a bit in a seven-bit
-        # word to indicate each segment.  This list defines the sequence in which the bits are
-        # converted into line segments
-        self.WW_CHAR_SEQ = ("down", "right", "up", "left", "up", "right", "down")
 
 def charset_show(ana_scope, xwin_crt):
     mask = 0x7f   #turn on all the segments
@@ -555,6 +647,8 @@ if __name__ == "__main__":
     class ConstantsClass:
         def __init__(self):
             self.SCOPE_MAIN = 1
+            self.SCOPE_AUX = 2
+            self.ana_scope_display_list = False
             
     main()
 
@@ -184,83 +184,20 @@ class AlogParsedLine (AsmParsedLine):
         self.operand = self.parseExpr()
         pass
 
+# Anything that isn't one of the three operators or a string is taken whole, blanks
+# and all, as a NumberString, and left to the parser to make sense of.
+
 class AlogTokenizer (AsmTokenizer):
+    lexer = wwinfra.RegexLexer ([("Whitespace", r"[ \n\r\t]+"),
+                                 ("Operator", r"[,()]"),
+                                 ("String", AsmTokenizer.stringPattern),
+                                 ("OpenString", r'"'),
+                                 ("NumberString", r"[^,()]+")])
     def __init__ (self, str):
         super().__init__ (str)
     # Cut the number or operators down just these three
     def isSingleCharOper (self, c) -> bool:
         return c in (',', '(', ')')
-    def getRawToken (self) -> AsmToken:
-        while self.pos <= self.slen:
-            if self.pos < self.slen:
-                c = self.str[self.pos]
-            else:
-                c = self.endOfString
-            match self.state:
-                case 0:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return AsmToken (AsmTokenType.EndOfString, "")
-                    if self.isWhitespace (c):
-                        self.state = 0
-                        self.pos += 1
-                    elif self.isSingleCharOper (c):
-                        self.state = 0
-                        self.pos += 1
-                        return AsmToken (AsmTokenType.Operator, c)
-                    elif c == '"':
-                        self.state = 9
-                        self.pos += 1
-                    else:
-                        self.state = 2
-                        self.pos += 1
-                        self.push (c)
-                case 2:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return AsmToken (AsmTokenType.NumberString, self.pop())
-                    elif self.isSingleCharOper (c):
-                        self.state = 0
-                        return AsmToken (AsmTokenType.NumberString, self.pop())
-                    else:
-                        self.state = 2
-                        self.pos += 1
-                        self.push (c)
-                case 9:
-                    if c == '"':
-                        self.state = 0
-                        self.pos += 1
-                        return AsmToken (AsmTokenType.String, self.pop())
-                    elif c == "\\":
-                        self.state = 10
-                        self.pos += 1
-                    else:
-                        self.state = 9
-                        self.pos += 1
-                        self.push (c)
-                # Here we process common escapes \n etc. and note they are
-                # converted back to escapes in AsmExpr.listingstring(). 
-                case 10:
-                    if c == "b":
-                        self.state = 9
-                        self.pos += 1
-                        self.push ("\b")
-                    elif c == "t":
-                        self.state = 9
-                        self.pos += 1
-                        self.push ("\t")
-                    elif c == "n":
-                        self.state = 9
-                        self.pos += 1
-                        self.push ("\n")
-                    elif c == "\"":
-                        self.state = 9
-                        self.pos += 1
-                        self.push ("\"")
-                    else:
-                        self.state = 9
-                        self.push ("\\")
-        return AsmToken()
 
 def main():
     parser = wwinfra.StdArgs().getParser ("ArchaeoLog Test.")
@@ -1,10 +1,17 @@
 
+import time
+
 class gpioClass:
     def __init__(self):
         self.BCM = 0
         self.OUT = 0
         self.IN = 0
         self.PUD_UP = 0
+        self.outputs = None   # list of (perf_counter_ns, pin, val) when recording
+
+    # keep output changes, with the time they happened, instead of printing them
+    def record(self):
+        self.outputs = []
 
     def setmode(self, mode):
         print("set gpio mode")
@@ -13,8 +20,13 @@ class gpioClass:
         print("pin setup")
 
     def output(self, pin, val):
-        print("output val=0o%o to pin %d" % (val, pin))
+        if self.outputs is not None:
+            self.outputs.append((time.perf_counter_ns(), pin, val))
+        else:
+            print("output val=0o%o to pin %d" % (val, pin))
 
     def input(self, pin):
         print("input from pin %d" % pin)
 
+    def cleanup(self):
+        pass
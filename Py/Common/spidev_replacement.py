@@ -0,0 +1,28 @@
+
+import time
+
+# Stand-in for the spidev library when we're not running on a Raspberry Pi.
+# Transfers are dropped on the floor unless recording has been turned on, in which
+# case each one is kept along with the time it was made, so the stream going to the
+# analog scope D/A converters can be checked without the hardware.
+
+class SpiDev:
+    def __init__(self):
+        self.max_speed_hz = 0
+        self.transfers = None   # list of (perf_counter_ns, bytes) when recording
+
+    def open(self, bus, device):
+        print("open SPI bus %d, device %d" % (bus, device))
+
+    def record(self):
+        self.transfers = []
+
+    def writebytes(self, values):
+        if self.transfers is not None:
+            self.transfers.append((time.perf_counter_ns(), bytes(values)))
+
+    def writebytes2(self, values):
+        self.writebytes(values)
+
+    def close(self):
+        pass
@@ -0,0 +1,76 @@
+
+
+# Copyright 2026 Guy C. Fedorkow
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#   The above copyright notice and this permission notice shall be included in all copies or
+# substantial portions of the Software.
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Stroke geometry for the Whirlwind seven-segment character generator, shared by the
+# xwin and analog scope displays.
+#
+# The character generator draws seven strokes in a fixed sequence, starting from the
+# character's origin; a bit in the seven-bit mask says whether each stroke is
+# intensified (2M-0277 p.61).  Walking the sequence for every character on every
+# refresh adds up on character-heavy screens like Number-Display and Blackjack, so
+# the lit strokes for each (mask, expand, stroke size) are worked out once and kept.
+
+# The sequence in which mask bits, from the most-significant down, are converted
+# into line segments
+WW_CHAR_SEQ = ("down", "right", "up", "left", "up", "right", "down")
+
+
+class GlyphStrokeCache:
+    def __init__(self):
+        # (mask, expand, hstroke, vstroke) -> tuple of lit strokes
+        self.cache = {}
+
+    # Return the lit strokes for a character as a tuple of (x0, y0, x1, y1, new_run),
+    # offsets from the character's origin in Whirlwind orientation, i.e., "up" is
+    # positive y.  new_run is True if the beam has to be moved to (x0, y0) first,
+    # i.e., if the stroke before it was dark.
+    def strokes(self, mask, expand, hstroke, vstroke):
+        key = (mask, expand, hstroke, vstroke)
+        lit = self.cache.get(key)
+        if lit is None:
+            lit = self._build(mask, expand, hstroke, vstroke)
+            self.cache[key] = lit
+        return lit
+
+    def _build(self, mask, expand, hstroke, vstroke):
+        lit = []
+        last_x = 0
+        last_y = 0
+        x = 0
+        y = 0
+        new_run = True
+        for i in range(0, 7):
+            direction = WW_CHAR_SEQ[i]
+            if direction == "down":
+                y = last_y - vstroke * expand
+            elif direction == "up":
+                y = last_y + vstroke * expand
+            elif direction == "left":
+                x = last_x - hstroke * expand
+            else:  # "right"
+                x = last_x + hstroke * expand
+            if mask & 1 << (6 - i):
+                lit.append((last_x, last_y, x, y, new_run))
+                new_run = False
+            else:
+                new_run = True
+            last_x = x
+            last_y = y
+        return tuple(lit)
+
+
+# everyone should use the same cache
+glyph_strokes = GlyphStrokeCache()
@@ -18,6 +18,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import sys
+import os
+import mmap
+import array
+import struct
 import wwinfra
 import re
 import traceback
@@ -132,10 +136,100 @@ class CameraClass:
 #    si 0o1006                       A
 #    si 0o1007                       B
 
+# A paper tape image that's read as the program asks for it, rather than all at once.
+# Long archival tapes from Recovered-Tapes can be fed to a program without holding the
+# whole tape in memory; the file is mapped and a cursor moves along it, decoding a
+# chunk at a time.
+# Two formats are understood:
+#   .7ch files are the raw byte-per-character images transcribed at CHM; bit 6 is the
+#     Valid bit and the six tape bits come out in reverse order (see read_7ch in wwutd.py).
+#     Characters without the Valid bit are leader or block gaps, and are skipped.
+#   anything else is the text tape format from tape-decode, i.e., .petrA/.petrB
+#     @T00210: 0040000 0000100 0000001 0000100 0000000  None    None    None  ; memory load
+#     The offset after @T is just for debug; it's not used when reading the tape.
+# The tape name "-" reads a text tape from stdin, which can't be mapped, so it's read a line at a time.
+class PaperTapeImageClass:
+    CH7_DECODE = bytes(int(format(by & 0o77, "06b")[::-1], 2) for by in range(256))
+    CH7_GAP = bytes(by for by in range(256) if by & 0o100 == 0)
+    CH7_CHUNK = 4096
+
+    def __init__(self, filename, fd):
+        self.filename = filename
+        self.fd = fd
+        self.mm = None
+        self.ch7 = filename.endswith(".7ch")
+        self.pending = []      # decoded characters the program hasn't read yet
+        self.offset = 0        # characters read by the program so far
+        self.line_number = 0
+        self.at_eof = False
+        if fd is not sys.stdin and os.fstat(fd.fileno()).st_size > 0:
+            self.mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        elif fd is not sys.stdin:
+            self.at_eof = True
+
+    # Return the next n characters from the tape, or None if the tape runs out first,
+    # in which case nothing is taken from the tape.
+    def read(self, n):
+        while len(self.pending) < n and self.fill():
+            pass
+        if len(self.pending) < n:
+            return None
+        ret = self.pending[:n]
+        del self.pending[:n]
+        self.offset += n
+        return ret
+
+    # decode the next chunk of the tape into self.pending; return False at the end of the tape
+    def fill(self):
+        if self.at_eof:
+            return False
+        if self.ch7:
+            chunk = self.mm.read(self.CH7_CHUNK)
+            self.pending.extend(chunk.translate(self.CH7_DECODE, self.CH7_GAP))
+            self.at_eof = len(chunk) == 0
+        else:
+            line = self.fd.readline() if self.mm is None else self.mm.readline().decode("ascii", "replace")
+            self.at_eof = len(line) == 0
+            self.parse_tape_line(line)
+        if self.at_eof:
+            getiolog().info("end of Tape File %s, length=%d characters (%3.1f words)" %
+                            (self.filename, self.offset + len(self.pending), (self.offset + len(self.pending))/3.0))
+        return True
+
+    def parse_tape_line(self, ln):
+        self.line_number += 1
+        line = ln.rstrip(' \t\n\r')  # strip trailing blanks and newline
+        if len(line) == 0:  # skip blank lines
+            return
+        all_tokens = re.split(";", line)  # strip comments
+        input_minus_comment = all_tokens[0].rstrip(' ')  # strip any blanks at the end of the line
+        if len(input_minus_comment) == 0:  # skip blank lines
+            return
+        if input_minus_comment[0] == '%':
+            return   # skip the name directives
+        if re.match("^@T", input_minus_comment):  # read a line of tape bytes
+            tokens = re.split("[: \t][ \t]*", input_minus_comment)
+            if len(tokens[0]) == 0:
+                getiolog().info("parse error, read_tape @C: tokens=", tokens)
+                return
+            for token in tokens[1:]:
+                if token != "None" and len(token):
+                    self.pending.append(int(token, 8))
+        else:
+            getiolog().info("unexpected line '%s' in %s, Line %d" % (line, self.filename, self.line_number))
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.fd.close()
+
+
 # I am assuming that the machine could be programmed to alternate between PETRA and PETRB, although
 # I'm not really sure PETRB was even used.
-# I am also assuming that the tape doesn't get changed during operation of the program; i.e., we can read
-# in the whole tape at the first reference.
+# I am also assuming that the tape doesn't get changed during operation of the program.
+# The tape is read from the file as the program asks for characters; see PaperTapeImageClass.
+# If cb.petr_char_usec is set, the reader delivers characters no faster than the tape can move,
+# and the program is charged for the wait in cpu.accum_ww_inst_time_usec.
 class PhotoElectricTapeReaderClass:
     def __init__(self, cb):
         global petrAfile
@@ -145,12 +239,13 @@ class PhotoElectricTapeReaderClass:
         self.name = "PhotoElectricTapeReader"
         self.PETR_device = 'A'
         self.PETR_mode = 'Word'
-        self.PETR_fd = {'A':None, 'B':None}   # we won't try to open the file until the device is first accessed.
-        # But if we open the file, we'll read all of it into an array of bytes for later use, indexed by unit letter
-        self.PETR_tape_image = {'A':None, 'B':None}  # two arrays containing the contents of the tape
+        # we won't try to open the file until the device is first accessed.
+        # Then each unit letter gets a PaperTapeImageClass to read the tape as it goes
+        self.PETR_tape_image = {'A':None, 'B':None}
         # we assume the paper tape cannot be rewound; start the offset at zero and go up from there!
         # LAS 5/9/25 No we added a rewind capability, device base 0o1000. See below rewind var.
-        self.PETR_read_offset = {'A': 0, 'B': 0}
+        # The simulated time at which the next character will be under the read head, for the tape-speed model
+        self.PETR_next_char_usec = {'A': 0, 'B': 0}
 
     # each device needs to identify its own unit number.
     def is_this_for_me(self, io_address):
@@ -175,17 +270,21 @@ class PhotoElectricTapeReaderClass:
             
         rewind: bool = device & self.cb.REWIND_PETR_ADDR_MASK == self.cb.REWIND_PETR_BASE_ADDRESS and device & 0o4 != 0
 
-        if self.PETR_fd[self.PETR_device] is None or rewind:
-            self.PETR_read_offset[self.PETR_device] = 0
+        if self.PETR_tape_image[self.PETR_device] is None or rewind:
+            if self.PETR_tape_image[self.PETR_device] is not None:
+                self.PETR_tape_image[self.PETR_device].close()
             fd = None
             try:
-                self.PETR_fd[self.PETR_device] = open(filename, "r") if filename != "-" else sys.stdin
-                fd = self.PETR_fd[self.PETR_device]
+                if filename == "-":
+                    fd = sys.stdin
+                else:
+                    fd = open(filename, "rb" if filename.endswith(".7ch") else "r")
                 getiolog().info("Using file %s for PETR %s" % (filename, self.PETR_device))
             except IOError:
                 getiolog().fatal("Can't open paper tape file %s" % filename)
-            self.PETR_tape_image[self.PETR_device] = self.read_tape_file(fd, filename)
-            fd.close()
+            self.PETR_tape_image[self.PETR_device] = PaperTapeImageClass(filename, fd)
+        if self.cb.cpu is not None:
+            self.PETR_next_char_usec[self.PETR_device] = self.cb.cpu.accum_ww_inst_time_usec + self.cb.petr_char_usec
 
         getiolog().info("SI: PhotoElectricTapeReader %s initialized in %s mode " % (self.PETR_device, self.PETR_mode))
         return self.cb.NO_ALARM
@@ -196,12 +295,13 @@ class PhotoElectricTapeReaderClass:
 
     def rd(self, code, acc):  # "read"
         if self.PETR_mode == "Char":
-            offset = self.PETR_read_offset[self.PETR_device]
-            if offset >= len(self.PETR_tape_image[self.PETR_device]):
-                getiolog().info('PETR Overrun at Offset %d' % offset)
+            tape = self.PETR_tape_image[self.PETR_device]
+            chars = tape.read(1)
+            if chars is None:
+                getiolog().info('PETR Overrun at Offset %d' % tape.offset)
                 return self.cb.IO_ERROR_ALARM, 0
-            ret = self.PETR_tape_image[self.PETR_device][offset]
-            self.PETR_read_offset[self.PETR_device] += 1
+            self.wait_for_tape(1)
+            ret = chars[0]
             getiolog().info("RD: PhotoElectricTapeReader %s read character 0o%o (ascii '%s') " %
                             (self.PETR_device, ret,
                             # May be incorrect since we're not using the stateful flex model here
@@ -219,60 +319,37 @@ class PhotoElectricTapeReaderClass:
             same as the total time required to perform the rd instructions it replaces. Any
             sequence of rd and bi instructions may follow a single si.
         """
-        getiolog().info("block transfer PETR: start address 0o%o, length 0o%o Unimplemented" % (address, acc))
-        return self.cb.UNIMPLEMENTED_ALARM
-#        if address + acc > self.cb.WW_ADDR_MASK:
-#            getiolog().info "block transfer in PETR out of range"
-#            return self.cb.QUIT_ALARM
-#        for m in range(address, (address + acc)):
-#            w = 0
-#            cm.wr(m, w)  # write zero
-#        return self.cb.NO_ALARM
-
-    # Once a WW program has started, it may go back to read the remaining characters on the paper tape.
-    # This routine inhales the rest of the tape from a file, storing it in an array to be doled out
-    # later to individual RD instructions.
-    # Sample tape-file input format, from tape-decode
-    # *** Tape Image ***
-    # @T00210: 0040000 0000100 0000001 0000100 0000000  None    None    None  ; memory load
-    # unlike Core files, this format doesn't express addresses.  It does include an offset from the
-    # start of the tape, but that's just for debug.
-    # There are no directives in this file.
-    def read_tape_file(self, filedesc, filename):
-
-        LineNumber = 1
-        offset = 0
-
-        tape_image = []
-
-        for ln in filedesc:
-            line = ln.rstrip(' \t\n\r')  # strip trailing blanks and newline
-            LineNumber += 1
-            if len(line) == 0:  # skip blank lines
-                continue
-            all_tokens = re.split(";", line)  # strip comments
-            input_minus_comment = all_tokens[0].rstrip(' ')  # strip any blanks at the end of the line
-            if len(input_minus_comment) == 0:  # skip blank lines
-                continue
-            if input_minus_comment[0] == '%':
-                continue   # skip the name directives
-            if re.match("^@T", input_minus_comment):  # read a line of tape bytes
-                tokens = re.split("[: \t][ \t]*", input_minus_comment)
-                # getiolog().info "tokens:", tokens
-                if len(tokens[0]) == 0:
-                    getiolog().info("parse error, read_tape @C: tokens=", tokens)
-                    continue
-                offset = int(tokens[0][2:], 8)
-                for token in tokens[1:]:
-                    if token != "None" and len(token):
-                        tape_image.append(int(token, 8))
-                    offset += 1
-
-            else:
-                getiolog().info("unexpected line '%s' in %s, Line %d" % (line, filename, LineNumber))
+        # Only Char mode is implemented, same as for rd; each character goes in its own word
+        if self.PETR_mode != "Char":
+            getiolog().info("block transfer PETR: start address 0o%o, length 0o%o, mode %s Unimplemented" %
+                            (address, acc, self.PETR_mode))
+            return self.cb.UNIMPLEMENTED_ALARM
+        bi_len = acc & self.cb.WW_ADDR_MASK
+        getiolog().info("block transfer PETR %s: start address 0o%o, length 0o%o" % (self.PETR_device, address, bi_len))
+        if address + bi_len > self.cb.WW_ADDR_MASK:
+            getiolog().info("block transfer in PETR out of range")
+            return self.cb.QUIT_ALARM
+        tape = self.PETR_tape_image[self.PETR_device]
+        chars = tape.read(bi_len)
+        if chars is None:
+            getiolog().info('PETR Overrun at Offset %d' % (tape.offset + len(tape.pending)))
+            return self.cb.IO_ERROR_ALARM
+        self.wait_for_tape(bi_len)
+        cm.write_block(address, chars)
+        return self.cb.NO_ALARM
 
-        getiolog().info("read Tape File %s, length=%d characters (%3.1f words)" % (filename, offset, float(offset)/3.0))
-        return tape_image
+    # The tape-speed model: the reader can't hand over a character until it has come under the
+    # read head, so if the program asks sooner, it waits.  The tape is taken to start moving at
+    # the si, and keeps going at cb.petr_char_usec per character.
+    def wait_for_tape(self, nchars):
+        char_usec = self.cb.petr_char_usec
+        cpu = self.cb.cpu
+        if char_usec == 0 or cpu is None:
+            return
+        last_char_usec = max(self.PETR_next_char_usec[self.PETR_device], cpu.accum_ww_inst_time_usec) + \
+            (nchars - 1) * char_usec
+        cpu.accum_ww_inst_time_usec = last_char_usec
+        self.PETR_next_char_usec[self.PETR_device] = last_char_usec + char_usec
 
 
 # this class is a "device" that can be used to clear a block of memory
@@ -322,8 +399,7 @@ class CoreClearIoClass:
         if address + acc > self.cb.WW_ADDR_MASK:
             getiolog().info("block transfer in Clear Mem out of range")
             return self.cb.QUIT_ALARM
-        for m in range(address, (address + acc)):
-            cm.wr(m, 0)  # write zero
+        cm.write_block(address, [0] * acc)  # write zero
         return self.cb.NO_ALARM
 
 
@@ -389,6 +465,7 @@ class tty_class:
         self.tty_charset = [tty_letters, tty_figures]
         self.IO_ADDRESS_TTY = 0o402
         self.TTYoutput = []
+        self.output_sink = None     # a wwinfra.OutputSinkClass, opened on the first character if cb.tty_output is set
         self.name = "Teletype"
 
     def code_to_letter(self, w):  # input is a 16-bit word with three packed 5-bit characters
@@ -416,12 +493,166 @@ class tty_class:
     def rc(self, _unused, acc):  # "record", i.e. output instruction to tty
         code = acc
         symbol = self.code_to_letter(code)  # this actually returns three symbols
-        self.TTYoutput.append(symbol)
+        if self.cb.tty_output is not None:
+            if self.output_sink is None:
+                self.output_sink = wwinfra.OutputSinkClass(self.cb, self.cb.tty_output, self.cb.output_batch_chars)
+            self.output_sink.write(symbol)
+        else:
+            self.TTYoutput.append(symbol)
         return self.cb.NO_ALARM, symbol
 
     def get_saved_output(self):
         return self.TTYoutput
 
+    def close_output(self):
+        if self.output_sink is not None:
+            self.output_sink.close()
+            self.output_sink = None
+
+
+# A binary drum image, memory-mapped so the drum reads and writes go straight to the file,
+# with no load pass at startup and no save pass at exit.  The OS writes the pages back,
+# so the file stays up to date even if the simulator dies.
+# The layout is
+#   a header: magic, version, number of groups (tracks), words per group
+#   an 'initialized' bitmap, one bit per drum word, set once the word has been written
+#   the drum words themselves, two bytes each, little-endian, group after group
+# Uninitialized words read as None, just like the list-of-lists drum.
+# ww-drum-convert.py converts between this and the text drum state file.
+class DrumImageFileClass:
+    MAGIC = b"WWDR"
+    VERSION = 1
+    HEADER = struct.Struct("<4sBxHH6x")    # padded out to 16 bytes
+
+    def __init__(self, filename, num_groups, num_words):
+        if sys.byteorder != "little":
+            getiolog().fatal("binary drum files are only supported on little-endian hosts")
+        self.filename = filename
+        self.num_groups = num_groups
+        self.num_words = num_words
+        total = num_groups * num_words
+        bitmap_len = (total + 7) // 8
+        file_len = self.HEADER.size + bitmap_len + 2 * total
+        if not os.path.exists(filename):
+            with open(filename, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION, num_groups, num_words))
+                f.truncate(file_len)
+        self.fd = open(filename, "r+b")
+        (magic, version, groups, words) = self.HEADER.unpack(self.fd.read(self.HEADER.size))
+        if magic != self.MAGIC or version != self.VERSION:
+            getiolog().fatal("%s is not a version %d binary drum file" % (filename, self.VERSION))
+        if groups != num_groups or words != num_words or os.path.getsize(filename) != file_len:
+            getiolog().fatal("%s: drum geometry %d x %d doesn't match %d x %d" %
+                             (filename, groups, words, num_groups, num_words))
+        self.mm = mmap.mmap(self.fd.fileno(), file_len)
+        mv = memoryview(self.mm)
+        self.bitmap = mv[self.HEADER.size:self.HEADER.size + bitmap_len]
+        self.words = mv[self.HEADER.size + bitmap_len:].cast("H")
+        self.tracks = [DrumImageTrackClass(self, g * num_words) for g in range(num_groups)]
+
+    # it looks like the list of lists it replaces, i.e., drum[group][word]
+    def __getitem__(self, group):
+        return self.tracks[group]
+
+    def __len__(self):
+        return self.num_groups
+
+    def __iter__(self):
+        return iter(self.tracks)
+
+    def is_set(self, i):
+        return self.bitmap[i >> 3] & (1 << (i & 7)) != 0
+
+    # True if every word in [start, end) has been written
+    def all_set(self, start, end):
+        while start < end and start & 7:
+            if not self.is_set(start):
+                return False
+            start += 1
+        while start < end and end & 7:
+            end -= 1
+            if not self.is_set(end):
+                return False
+        full = self.bitmap[start >> 3:end >> 3]
+        return full.tobytes().count(0xff) == len(full)
+
+    def set_range(self, start, end, initialized):
+        fill = 0xff if initialized else 0
+        while start < end and start & 7:
+            self.set_one(start, initialized)
+            start += 1
+        while start < end and end & 7:
+            end -= 1
+            self.set_one(end, initialized)
+        self.bitmap[start >> 3:end >> 3] = bytes([fill]) * ((end - start) >> 3)
+
+    def set_one(self, i, initialized):
+        if initialized:
+            self.bitmap[i >> 3] |= 1 << (i & 7)
+        else:
+            self.bitmap[i >> 3] &= ~(1 << (i & 7)) & 0xff
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        for track in self.tracks:
+            track.file = None
+        self.bitmap.release()
+        self.words.release()
+        self.mm.close()
+        self.fd.close()
+
+
+# One group (track) of a binary drum file; indexing and slicing work as for a list
+class DrumImageTrackClass:
+    def __init__(self, drum_file, base):
+        self.file = drum_file
+        self.base = base
+
+    def __len__(self):
+        return self.file.num_words
+
+    def __getitem__(self, index):
+        f = self.file
+        if isinstance(index, slice):
+            (start, stop, _step) = index.indices(f.num_words)
+            start += self.base
+            stop = max(start, stop + self.base)
+            words = f.words[start:stop].tolist()
+            if not f.all_set(start, stop):
+                for i in range(stop - start):
+                    if not f.is_set(start + i):
+                        words[i] = None
+            return words
+        i = self.base + index
+        if not f.is_set(i):
+            return None
+        return f.words[i]
+
+    def __setitem__(self, index, value):
+        f = self.file
+        if isinstance(index, slice):
+            (start, stop, _step) = index.indices(f.num_words)
+            start += self.base
+            stop = max(start, stop + self.base)
+            if len(value) != stop - start:
+                raise ValueError("drum track slices can't change size")
+            if None in value:
+                for i in range(stop - start):
+                    self[start - self.base + i] = value[i]
+                return
+            f.words[start:stop] = array.array("H", value)
+            f.set_range(start, stop, True)
+            return
+        i = self.base + index
+        if value is None:
+            f.words[i] = 0
+            f.set_one(i, False)
+        else:
+            f.words[i] = value
+            f.set_one(i, True)
+
 
 class DrumClass:
     def __init__(self, cb):
@@ -440,6 +671,7 @@ class DrumClass:
         self.DRUM_NUM_GROUPS = 12         # 12 tracks
         self.DRUM_NUM_WORDS = 2048        # words per track
         self._drum_content = [[None] * self.DRUM_NUM_WORDS for _i in range(self.DRUM_NUM_GROUPS)]
+        self.drum_file = None  # a DrumImageFileClass if the drum content is mapped from a binary file
 
         # drum address decode
         self.DRUM_SI_WORD_ADDRESS = 0o001
@@ -549,13 +781,13 @@ class DrumClass:
         if address + bi_len > self.cb.WW_ADDR_MASK:
             cb.log.warn("block-transfer-in Drum address out of range")
             return self.cb.QUIT_ALARM
-        for m in range(address, (address + bi_len)):
-            wrd = self._drum_content[self.group_address][self.word_address]  # read the word from drum
-            self.word_address += 1
-            if self.word_address > self.DRUM_NUM_WORDS:
-                cb.log.warn("Haven't implemented Drum Address Wrap")
-                return self.cb.UNIMPLEMENTED_ALARM, 0
-            cm.wr(m, wrd)  # write the word to mem
+        # transfer as much as there is before the end of the track
+        n = min(bi_len, self.DRUM_NUM_WORDS - self.word_address)
+        cm.write_block(address, self._drum_content[self.group_address][self.word_address:self.word_address + n])
+        self.word_address += n
+        if n < bi_len:
+            cb.log.warn("Haven't implemented Drum Address Wrap")
+            return self.cb.UNIMPLEMENTED_ALARM
         return self.cb.NO_ALARM
 
     def bo(self, address, acc, cm):  # "block transfer out"
@@ -571,18 +803,22 @@ class DrumClass:
         if address + bo_len > self.cb.WW_ADDR_MASK:
             cb.log.warn("block-transfer-out Drum address out of range")
             return self.cb.QUIT_ALARM
-        for m in range(address, (address + bo_len)):
-            wrd = cm.rd(m)  # read the word from mem
-            self._drum_content[self.group_address][self.word_address] = wrd  # write the word to drum
+        # transfer as much as there is room for before the end of the track
+        n = min(bo_len, self.DRUM_NUM_WORDS - self.word_address)
+        self._drum_content[self.group_address][self.word_address:self.word_address + n] = cm.read_block(address, n)
+        if n != 0:
             self.dirty = True   # we changed the state of the drum; needs to be saved on exit
-            self.word_address += 1
-            if self.word_address > self.DRUM_NUM_WORDS:
-                getiolog().info("Haven't implemented Drum Address Wrap")
-                return self.cb.UNIMPLEMENTED_ALARM, 0
+        self.word_address += n
+        if n < bo_len:
+            getiolog().info("Haven't implemented Drum Address Wrap")
+            return self.cb.UNIMPLEMENTED_ALARM
         return self.cb.NO_ALARM
 
     def save_drum_state(self, drum_state_file_name):
         cb = self.cb
+        if self.drum_file is not None:  # a binary drum file is always up to date; just push it out
+            self.drum_file.flush()
+            return
         if self.dirty is False:
             cb.log.info("Drum State unchanged; state not saved")
             return
@@ -598,10 +834,55 @@ class DrumClass:
         wwinfra.write_core(cb, drumlist, offset, byte_stream, ww_filename, ww_tapeid,
                    jump_to, drum_state_file_name, string_list)
 
+    # A drum state file can be a binary drum image, which is mapped and used in place, or the
+    # text format written by save_drum_state.  A new file with a .wwdrum extension is created as
+    # a binary image; a text file that doesn't exist yet will be written on exit.
     def restore_drum_state(self, drum_state_file_name):
         cb = self.cb
         cb.log.info("Restoring Drum State from file %s" % drum_state_file_name)
-        return wwinfra.read_core(self, drum_state_file_name, None, cb)
+        if self.is_binary_drum_file(drum_state_file_name):
+            self.drum_file = DrumImageFileClass(drum_state_file_name, self.DRUM_NUM_GROUPS, self.DRUM_NUM_WORDS)
+            self._drum_content = self.drum_file
+            return
+        if not os.path.exists(drum_state_file_name):
+            cb.log.info("No drum state in %s yet; starting with an empty drum" % drum_state_file_name)
+            return
+        self.read_text_drum_state(drum_state_file_name)
+
+    @staticmethod
+    def is_binary_drum_file(filename):
+        if not os.path.exists(filename):
+            return filename.endswith(".wwdrum")
+        with open(filename, "rb") as f:
+            return f.read(len(DrumImageFileClass.MAGIC)) == DrumImageFileClass.MAGIC
+
+    # Read back the text drum state, which is a core file with a %Blocknum for each drum group.
+    # Only the @C lines and the block numbers matter here.
+    def read_text_drum_state(self, filename):
+        cb = self.cb
+        try:
+            fd = open(filename, "r")
+        except IOError:
+            cb.log.fatal("Can't open drum state file %s" % filename)
+        track = 0
+        for line in fd:
+            line = re.sub(";.*", "", line).rstrip()
+            if line.startswith("%Blocknum"):
+                track = int(line.split()[1], 8)
+            elif line.startswith("@C"):
+                tokens = re.split("[: \t][: \t]*", line)
+                address = int(tokens[0][2:], 8)
+                for token in tokens[1:]:
+                    if token != "None":
+                        self.wr(address, int(token, 8), track=track)
+                    address += 1
+        fd.close()
+
+    def close_drum_file(self):
+        if self.drum_file is not None:
+            self.drum_file.close()
+            self.drum_file = None
+            self._drum_content = [[None] * self.DRUM_NUM_WORDS for _i in range(self.DRUM_NUM_GROUPS)]
 
     # the wr method is used only to allow the drum state to be restored using the
     # generic memory "core" reader
@@ -880,12 +1161,15 @@ class DisplayScopeClass:
                 self.crt.last_mouse = pt
                 self.crt.last_button = button
 
-            # check to see if the most recent mouse click was near the last dot to be drawn on the screen; if so,
-            # count it as a hit, otherwise its a miss.  Once it hits, "forget" the last mouse click
-            if self.crt.last_mouse is not None and (
-                    abs(self.crt.last_pen_point.x0 - self.crt.last_mouse.getX()) < self.crt.WIN_MOUSE_BOX) & \
-                    (abs(self.crt.last_pen_point.y0 - self.crt.last_mouse.getY()) < self.crt.WIN_MOUSE_BOX):
-                getiolog().info("**Hit at x=0d%d, y=0d%d**" %(self.crt.last_pen_point.x0, self.crt.last_pen_point.y0))
+            # check to see if the most recent mouse click was near one of the last few dots to be drawn on the
+            # screen; if so, count it as a hit, otherwise its a miss.  Once it hits, "forget" the last mouse click
+            hit = None
+            if self.crt.last_mouse is not None:
+                hit = self.crt.ww_light_gun_hit(self.crt.last_mouse)
+            if hit is not None:
+                (seq, obj) = hit
+                getiolog().info("**Hit at x=0d%d, y=0d%d, point #%d**" % (obj.x0, obj.y0, seq))
+                self.crt.last_pen_point = obj  # highlight the point that was actually hit
                 if self.crt.last_button == 3:   # I'm returning 0o1000000 for Button Three on the mouse
                     val = 0o120000              #  ... added specifically for radar tracking
                 else:                           # changed Dec 30, 2023; see note above
@@ -1,6 +1,7 @@
 
 import os
 import sys
+import re
 import traceback
 import wwinfra
 from enum import Enum
@@ -32,14 +33,37 @@ class AsmToken:
     def print (self):
         print ("AsmToken ", self.tokenType, self.tokenStr)
 
+# The tokens are matched by a wwinfra.RegexLexer.  A number or identifier has to be
+# followed by an operator, whitespace (which goes with it) or the end of the line, and
+# digits run straight on into an identifier, e.g. 12abc.  A "0o" starts an octal number
+# and leaves the tokenizer part way into it; what follows may turn out to be empty, or an
+# identifier.  The ext alpha chars are those that lower() into a-z, which takes in the
+# Kelvin sign.
+
 class AsmTokenizer:
     endOfString = "<end-of-string>"
+    alpha = "A-Za-z_\u212a"
+    stringPattern = r'"(?:[^"\\]|\\[btn"]|\\(?![btn"]))*"'
+    lexer = wwinfra.RegexLexer ([("Whitespace", r"[ \n\r\t]+"),
+                                 ("Comment", r";"),
+                                 ("AutoComment", r"@@"),
+                                 ("Operator", r"[-+@:.,*/|&()=]"),
+                                 ("ZeroOh", r"0o"),
+                                 ("Identifier", r"[0-9]*[%s][0-9%s]*" % (alpha, alpha)),
+                                 ("DigitString", r"[0-9]+"),
+                                 ("String", stringPattern),
+                                 ("OpenString", r'"')])
+    octalLexer = wwinfra.RegexLexer ([("Identifier", r"[0-9]*[%s][0-9%s]*" % (alpha, alpha)),
+                                      ("DigitString", r"[0-9]*")])
+    # Here we process common escapes \n etc. and note they are
+    # converted back to escapes in AsmExpr.listingstring().
+    escape = re.compile (r'\\([btn"])')
+    escapeChars = {"b": "\b", "t": "\t", "n": "\n", "\"": "\""}
     def __init__ (self, str):
         self.pos = 0
         self.state = 0
         self.str = str
         self.slen = len (str)
-        self.buffer = ""
         self.tokenBuf: AsmToken = None
         self.cb = wwinfra.theConstWWbitClass
         self.log = AsmLogFactory().getLog()
@@ -50,19 +74,6 @@ class AsmTokenizer:
         return ":\n" + str.rstrip ("\r\n") + "\n" + s + "^\n"
     def isSingleCharOper (self, c) -> bool:
         return c in ['+', '-', '@', ':', '.', ';', ',', '*', '/', '|', '&', '(', ')', '=']
-    def isDigit (self, c) -> bool:
-        return ord (c) >= ord ('0') and ord (c) <= ord ('9')
-    def isExtAlphaChar (self, c) -> bool:
-        c = c.lower()
-        return ord (c) >= ord ('a') and ord (c) <= ord ('z') or c == '_'
-    def isExtAlphaNumChar (self, c) -> bool:
-        return self.isExtAlphaChar (c) or self.isDigit (c)
-    def push (self, c):
-        self.buffer += c
-    def pop (self):
-        buf = self.buffer
-        self.buffer = ""
-        return buf
     def illegalChar (self, c, pos, str, state):
         # traceback.print_stack()
         raise AsmParseSyntaxError ("Tokenizer state %d: Illegal char \'%c\'" % (state, c))
@@ -103,189 +114,71 @@ class AsmTokenizer:
         else:
             tok.pos = self.pos
         return tok
+    def restOfLine (self, tokenType: AsmTokenType) -> AsmToken:
+        tokenStr = self.str[self.pos:]
+        self.pos = self.slen
+        return self.asmToken (tokenType, tokenStr)
+    # The state is the one the hand-written tokenizer used to report illegal chars in
+    def wordToken (self, tokenType: AsmTokenType, m, state: int) -> AsmToken:
+        self.pos = m.end()
+        if self.pos < self.slen:
+            c = self.str[self.pos]
+            if self.isWhitespace (c):
+                self.pos += 1
+            elif not self.isSingleCharOper (c):
+                self.illegalChar (c, self.pos, self.str, state)
+        return self.asmToken (tokenType, m.group())
     def getRawToken (self) -> AsmToken:
-        while self.pos <= self.slen:
-            if self.pos < self.slen:
-                c = self.str[self.pos]
-            else:
-                c = self.endOfString
-            match self.state:
-                case 0:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return self.asmToken (AsmTokenType.EndOfString, "")
-                    if self.isWhitespace (c):
-                        self.state = 0
-                        self.pos += 1
-                    elif c == ';':
-                        self.state = 5
-                        self.pos += 1                        
-                    elif c == '@':
-                        self.state = 1
-                        self.pos += 1
-                    elif self.isSingleCharOper (c):
-                        self.state = 0
-                        self.pos += 1
-                        return self.asmToken (AsmTokenType.Operator, c)
-                    elif c == '0':
-                        self.state = 8
-                        self.pos += 1
-                        self.push (c)
-                    elif self.isDigit (c):
-                        self.state = 3
-                        self.pos += 1
-                        self.push (c)
-                    elif c == '"':
-                        self.state = 9
-                        self.pos += 1
-                    elif self.isExtAlphaChar (c):
-                        self.state = 4
-                        self.pos += 1
-                        self.push (c)
-                    else:
-                        self.illegalChar (c, self.pos, self.str, self.state)
-                case 1:
-                    if c == '@':
-                        self.state = 2
-                        self.pos += 1
-                    else:
-                        self.state = 0
-                        return self.asmToken (AsmTokenType.Operator, "@")
-                case 2:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return self.asmToken (AsmTokenType.AutoComment, self.pop())
-                    else:
-                        self.state = 2
-                        self.pos += 1
-                        self.push (c)
-                case 3:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return self.asmToken (AsmTokenType.DigitString, self.pop())
-                    if self.isDigit (c):
-                        self.state = 3
-                        self.pos += 1
-                        self.push (c)
-                    elif self.isSingleCharOper (c):
-                        self.state = 0
-                        return self.asmToken (AsmTokenType.DigitString, self.pop())
-                    elif self.isWhitespace (c):
-                        self.state = 0
-                        self.pos += 1
-                        return self.asmToken (AsmTokenType.DigitString, self.pop())
-                    elif self.isExtAlphaChar (c):
-                        self.state = 4
-                        self.pos += 1
-                        self.push (c)
-                    else:
-                        self.illegalChar (c, self.pos, self.str, self.state)
-                case 4:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return self.asmToken (AsmTokenType.Identifier, self.pop())
-                    elif self.isExtAlphaNumChar (c):
-                        self.state = 4
-                        self.pos += 1
-                        self.push (c)
-                    elif self.isSingleCharOper (c):
-                        self.state = 0
-                        return self.asmToken (AsmTokenType.Identifier, self.pop())
-                    elif self.isWhitespace (c):
-                        self.state = 0
-                        self.pos += 1
-                        return self.asmToken (AsmTokenType.Identifier, self.pop())
-                    else:
-                        self.illegalChar (c, self.pos, self.str, self.state)
-                case 5:
-                    if c == '@':
-                        self.state = 6
-                        self.pos += 1
-                    elif c == self.endOfString:
-                        self.state = 0
-                        return self.asmToken (AsmTokenType.Comment, self.pop())
-                    else:
-                        self.state = 5
-                        self.pos += 1
-                        self.push (c)
-                case 6:
-                    if c == '@':
-                        self.state = 7
-                        self.pos += 1
-                        return self.asmToken (AsmTokenType.Comment, self.pop())
-                    else:
-                        self.push ('@')     # We want the previous atsign
-                        self.state = 5
-                case 7:
-                    if c == self.endOfString:
-                        self.state = 0
-                        return self.asmToken (AsmTokenType.AutoComment, self.pop())
-                    else:
-                        self.state = 7
-                        self.pos += 1
-                        self.push (c)
-                case 8:
-                    if c == 'o':
-                        self.state = 3
-                        self.pos += 1
-                        self.pop()
-                        return self.asmToken (AsmTokenType.Operator, "0o")
-                    elif c == self.endOfString:
-                        self.state = 0
-                        self.pop()
-                        return self.asmToken (AsmTokenType.DigitString, "0")
-                    elif self.isDigit (c):
-                        self.state = 3
-                        self.pos += 1
-                        self.push (c)
-                    elif self.isWhitespace (c):
-                        self.state = 0
-                        self.pos += 1
-                        self.pop()
-                        return self.asmToken (AsmTokenType.DigitString, "0")
-                    elif self.isSingleCharOper (c):
-                        self.state = 0
-                        self.pop()
-                        return self.asmToken (AsmTokenType.DigitString, "0")
-                    elif self.isExtAlphaNumChar (c):
-                        self.state = 4
-                    else:
-                        self.illegalChar (c, self.pos, self.str, self.state)
-                case 9:
-                    if c == '"':
-                        self.state = 0
-                        self.pos += 1
-                        return self.asmToken (AsmTokenType.String, self.pop())
-                    elif c == "\\":
-                        self.state = 10
-                        self.pos += 1
-                    else:
-                        self.state = 9
-                        self.pos += 1
-                        self.push (c)
-                # Here we process common escapes \n etc. and note they are
-                # converted back to escapes in AsmExpr.listingstring(). 
-                case 10:
-                    if c == "b":
-                        self.state = 9
-                        self.pos += 1
-                        self.push ("\b")
-                    elif c == "t":
-                        self.state = 9
-                        self.pos += 1
-                        self.push ("\t")
-                    elif c == "n":
-                        self.state = 9
-                        self.pos += 1
-                        self.push ("\n")
-                    elif c == "\"":
-                        self.state = 9
-                        self.pos += 1
-                        self.push ("\"")
-                    else:
-                        self.state = 9
-                        self.push ("\\")
-        return self.asmToken (AsmTokenType.Null, "")
+        if self.pos > self.slen:
+            # Past an unterminated string
+            return self.asmToken (AsmTokenType.Null, "")
+        if self.state == 7:
+            # What follows the @@ in a comment
+            self.state = 0
+            return self.restOfLine (AsmTokenType.AutoComment)
+        if self.state == 3:
+            # Just past a 0o
+            self.state = 0
+            (kind, m) = self.octalLexer.match (self.str, self.pos)
+            if kind == "Identifier":
+                return self.wordToken (AsmTokenType.Identifier, m, 4)
+            return self.wordToken (AsmTokenType.DigitString, m, 3)
+        (kind, m) = self.lexer.match (self.str, self.pos)
+        if kind == "Whitespace":
+            self.pos = m.end()
+            (kind, m) = self.lexer.match (self.str, self.pos)
+        if kind is None:
+            if self.pos == self.slen:
+                return self.asmToken (AsmTokenType.EndOfString, "")
+            self.illegalChar (self.str[self.pos], self.pos, self.str, 0)
+        self.pos = m.end()
+        match kind:
+            case "Operator":
+                return self.asmToken (AsmTokenType.Operator, m.group())
+            case "Comment":
+                atAt = self.str.find ("@@", self.pos)
+                if atAt < 0:
+                    return self.restOfLine (AsmTokenType.Comment)
+                self.state = 7
+                self.pos = atAt + 2
+                return self.asmToken (AsmTokenType.Comment, self.str[m.end():atAt])
+            case "AutoComment":
+                return self.restOfLine (AsmTokenType.AutoComment)
+            case "ZeroOh":
+                self.state = 3
+                return self.asmToken (AsmTokenType.Operator, "0o")
+            case "Identifier":
+                return self.wordToken (AsmTokenType.Identifier, m, 4)
+            case "DigitString":
+                return self.wordToken (AsmTokenType.DigitString, m, 8 if m.group() == "0" else 3)
+            case "NumberString":
+                return self.asmToken (AsmTokenType.NumberString, m.group())
+            case "String":
+                tokenStr = self.escape.sub (lambda e: self.escapeChars[e.group (1)], m.group()[1:-1])
+                return self.asmToken (AsmTokenType.String, tokenStr)
+            case "OpenString":
+                self.pos = self.slen + 1
+                return self.asmToken (AsmTokenType.Null, "")
 
 
 AsmExprType = Enum ("AsmExprType", ["BinaryPlus", "BinaryMinus",
@@ -339,12 +232,22 @@ AsmExprValueType = Enum ("AsmExprValueType", ["Integer", "NegativeZero", "Fracti
 
 AsmExprValueSubType = Enum ("AsmExprValueSubType", ["Address", "Undefined"])
 
+# Needed by wwasm --Object, which has to know which values depend on where the
+# module is loaded. reloc counts the relocatable addresses (labels) summed into
+# the value, so label + 3 has reloc 1 and label1 - label2 has reloc 0; it is None
+# if the value can't be relocated at all, e.g. label * 2. extern names an imported
+# label, one the module doesn't define, whose address is added to value at link
+# time. Environments that don't relocate leave these as 0 and None.
+
 class AsmExprValue:
     def __init__ (self, exprValueType: AsmExprValueType, value,
-                  subType = AsmExprValueSubType.Address):
+                  subType = AsmExprValueSubType.Address,
+                  reloc: int = 0, extern: str = None):
         self.type = exprValueType
         self.subType = subType
         self.value = value  # int or float or str or list
+        self.reloc = reloc
+        self.extern = extern
     def asString (self) -> str:
         if self.type == AsmExprValueType.List:
             return str (self.type) + " " + str ([v.asString() for v in self.value])
@@ -456,6 +359,20 @@ class AsmExpr:
                          (p.tokenizer.pos, e, p.tokenizer.caretString (p.lineStr, p.tokenizer.pos - 1)))
             """
             return AsmExprValue (AsmExprValueType.Undefined, "")
+    # Work out the relocation of the result r of a binary op on x and y, at
+    # least one of which is relocatable or imported. Only sums and differences
+    # can be fixed up by the linker; anything else gets reloc None, which is an
+    # error only if the value ends up stored in a relocatable object module.
+    def relocate (self, r: AsmExprValue, x: AsmExprValue, y: AsmExprValue):
+        r.extern = x.extern if x.extern is not None else y.extern
+        if x.reloc is None or y.reloc is None:
+            r.reloc = None
+        elif self.exprType == AsmExprType.BinaryPlus and (x.extern is None or y.extern is None):
+            r.reloc = x.reloc + y.reloc
+        elif self.exprType == AsmExprType.BinaryMinus and y.extern is None:
+            r.reloc = x.reloc - y.reloc
+        else:
+            r.reloc = None
     def eval (self, env: AsmExprEnv) -> AsmExprValue:
         if self.exprType in [AsmExprType.BinaryPlus,
                              AsmExprType.BinaryMinus,
@@ -480,7 +397,10 @@ class AsmExpr:
                         AsmExprType.BinaryBitAnd: lambda x, y: x & y,
                         AsmExprType.BinaryBitOr:  lambda x, y: x | y
                         }[self.exprType]
-                    return AsmExprValue (AsmExprValueType.Integer, fcn (x.value, y.value))
+                    r = AsmExprValue (AsmExprValueType.Integer, fcn (x.value, y.value))
+                    if x.reloc != 0 or y.reloc != 0 or x.extern is not None or y.extern is not None:
+                        self.relocate (r, x, y)
+                    return r
         elif self.exprType == AsmExprType.BinaryDot and \
              self.leftSubExpr.exprType in [AsmExprType.UnaryPlus, AsmExprType.UnaryMinus] and \
              self.leftSubExpr.leftSubExpr.exprType == AsmExprType.LiteralDigits and \
@@ -513,8 +433,15 @@ class AsmExpr:
             if self.exprType == AsmExprType.UnaryMinus and x.type == AsmExprValueType.Integer and x.value == 0:
                 # -0 case
                 return AsmExprValue (AsmExprValueType.NegativeZero, 0)
+            elif self.exprType == AsmExprType.UnaryMinus:
+                r = AsmExprValue (AsmExprValueType.Integer, -x.value, extern = x.extern)
+                if x.extern is not None or x.reloc is None:
+                    r.reloc = None
+                else:
+                    r.reloc = -x.reloc
+                return r
             else:
-                return AsmExprValue (AsmExprValueType.Integer, (-1 if self.exprType == AsmExprType.UnaryMinus else 1) * x.value)
+                return AsmExprValue (AsmExprValueType.Integer, x.value, reloc = x.reloc, extern = x.extern)
         elif self.exprType == AsmExprType.UnaryZeroOh:
             # Handle 0o
             l = self
@@ -17,7 +17,7 @@
 
 import sys
 import os
-from wwinfra import LogFactory, FlexoControlClass, WwPrintTokenizer
+from wwinfra import LogFactory, FlexoControlClass, WwPrintTokenizer, SymbolIndexClass
 import ww_io_sim
 import ww_flow_graph
 import radar as radar_class
@@ -80,6 +80,9 @@ class CpuClass:
             ww_io_sim.InOutCheckRegistersClass(cb),
             ww_io_sim.CameraClass(cb),
         ]
+        # SI looks its device up in this table rather than asking every device in turn
+        # Rebuild it if the device list changes.
+        self.build_io_dispatch_table()
 
         self.cpu_switches = None
 
@@ -169,6 +172,7 @@ class CpuClass:
         # putting this stuff here seems pretty darn hacky
         self.SymTab = {}
         self.SymToAddr = {}
+        self.SymIndex = SymbolIndexClass(cb, self.SymTab, self.SymToAddr)  # replace it along with SymTab
         self.ExecTab = {}   # this table is for holding Python Exec statements interleaved with the WW code.
         self.CommentTab = [None] * 2048
 
@@ -190,6 +194,24 @@ class CpuClass:
             print("imported project_exec.py")
             self.project_exec = project_exec
 
+    # Each device says which SI addresses belong to it; ask them about every possible address
+    # once, here, instead of on every SI.  An address claimed by more than one device must be
+    # an incorrect table entry; it's reported now, and an SI to it still raises an alarm.
+    def build_io_dispatch_table(self):
+        self.io_dispatch = [None] * (self.cb.WW_ADDR_MASK + 1)
+        self.io_overlaps = set()
+        for dev in self.IODeviceList:
+            for address in range(len(self.io_dispatch)):
+                cl = dev.is_this_for_me(address)
+                if cl is None:
+                    continue
+                if self.io_dispatch[address] is not None:
+                    print("overlapping IO address 0o%o: %s and %s" % (address, self.io_dispatch[address].name, cl.name))
+                    self.io_overlaps.add(address)
+                self.io_dispatch[address] = cl
+        for address in self.io_overlaps:
+            self.io_dispatch[address] = None
+
     def reset (self):
         # Accumulated time based on the table in 2M-077. Using float since some
         # timing calcs can produce fractional usec.
@@ -282,27 +304,31 @@ class CpuClass:
     # [Jan 30, 2021] The routine also now returns octal by default, but will add the decimal
     # equivalent if the global flag is set.  Format is (for eg) "0o0100.64"
     # [Jan 28, 2022] Add an indicator of which bank is in use if it's not the default configuration.
+    # [2026] The strings for each address come ready-made from the symbol index.
     def wwaddr_to_str(self, num, label_only_flag=False, no_label=False):
+        (with_labels, numbers, label_only) = self.SymIndex.addr_strs()
+        if 0 <= num < len(numbers):
+            if label_only_flag:
+                return label_only[num]
+            number = numbers[num]
+            with_label = with_labels[num]
+        else:   # not an address in core, so it's not in the index
+            decimal = ''
+            if self.cb.decimal_addresses:
+                decimal = ".%03d" % num
+            label = self.SymTab[num][0] if num in self.SymTab else None
+            if label_only_flag:
+                return label if label is not None else "0o%o%s" % (num, decimal)
+            number = "0o%04o%s" % (num, decimal)
+            with_label = number + ("(" + label + ")" if label is not None else "")
+
         bank_str = ''  # by default, we don't give a bank number
         high_bank = (num & self.cb.WWBIT5)
         if high_bank and self.cm.MemGroupB != 1:
             bank_str = "[%d]" % self.cm.MemGroupB
         if not high_bank and self.cm.MemGroupA != 0:
             bank_str = "[%d]" % self.cm.MemGroupA
-
-        decimal = ''
-        if self.cb.decimal_addresses:
-            decimal = ".%03d" % num
-        if num in self.SymTab:
-            label = "(" + self.SymTab[num][0] + ")"
-            label_only = self.SymTab[num][0]
-        else:
-            label = ""
-            label_only = "0o%o%s" % (num, decimal)
-        if label_only_flag:
-            return label_only
-        else:
-            return ("%s0o%04o%s" % (bank_str, num, decimal)) + (label if no_label == False else "")
+        return bank_str + (number if no_label else with_label)
 
     # convert a Whirlwind int into a signed decimal number string; positive is easy, but
     #   negative numbers need conversion.
@@ -325,12 +351,7 @@ class CpuClass:
     # The point is allow long fields that exceed column boundaries once in a while, but get the
     # remaining fields back in sync if they're shorter than max
     def space_to_cursor(self, base_str, new_field, start_cursor, width):
-        new_str = base_str + new_field
-        current_cursor = len(new_str)
-        while current_cursor < (start_cursor + width):
-            new_str += ' '
-            current_cursor += 1
-        return new_str, start_cursor + width
+        return (base_str + new_field).ljust(start_cursor + width), start_cursor + width
 
 
     # I added a knob to optionally use ANSI coloring to indicate classes of instruction in the
@@ -419,10 +440,8 @@ class CpuClass:
             return None
         opcode = (instruction >> 11) & 0o37
         address = instruction & self.cb.WW_ADDR_MASK
-        if address in self.SymTab:
-            label = "(" + self.SymTab[address][0] + ")"
-        else:
-            label = ""
+        label = self.SymIndex.labels[address]
+        label = "(" + label + ")" if label is not None else ""
         oplist = self.op_decode[opcode]
         short_opcode = oplist[1]
         return (opcode, short_opcode, address, label, self._AC, self._BReg)
@@ -451,12 +470,8 @@ class CpuClass:
                 address = int(label)
 
         else:
-            address = -1
-            for addr in self.SymTab:
-                if label == self.SymTab[addr][0]:
-                    address = addr
-                    break
-            if address == -1:
+            address = self.SymIndex.addr_of.get(label)
+            if address is None:
                 self.cb.log.warn("Python Exec: unknown label '%s'" % label)
                 address = 0
         return address
@@ -817,21 +832,15 @@ class CpuClass:
 #            print("Clear FF Registers (currently unimplemented)")
 #            return self.cb.UNKNOWN_IO_DEVICE_ALARM
 
-        self.IODeviceClass = None    # forget whatever the last device was
-        # scan the table of devices to see if any device matches; if so, run the si initialization for the device
-        for dev in self.IODeviceList:
-            cl = dev.is_this_for_me(address)
-            if cl is not None:
-                # we shouldn't match more than one IO address; if we get a match here , there
-                # must be an incorrect table entry
-                if self.IODeviceClass is not None:
-                    print("SI: overlapping IO address 0o%o" % address)
-                    return self.cb.UNKNOWN_IO_DEVICE_ALARM
-                self.IODevice = address
-                self.IODeviceClass = cl
+        # look up the device; if there is one, run the si initialization for the device
+        self.IODeviceClass = self.io_dispatch[address]
         if self.IODeviceClass is None:
-            print("SI: unknown IO address 0o%o" % address)
+            if address in self.io_overlaps:
+                print("SI: overlapping IO address 0o%o" % address)
+            else:
+                print("SI: unknown IO address 0o%o" % address)
             return self.cb.UNKNOWN_IO_DEVICE_ALARM
+        self.IODevice = address
         ret = self.IODeviceClass.si(address, self._AC, self.cm)
         return ret
 
@@ -25,9 +25,22 @@ import re
 import hashlib
 import sys
 import analog_scope
+import ww_glyphs
 import control_panel
 import os
 import socket
+import struct
+import array
+import mmap
+import io
+import locale
+import threading
+import collections
+import bisect
+import zlib
+import heapq
+import itertools
+import subprocess
 from screeninfo import get_monitors
 from enum import Enum
 import argparse
@@ -113,6 +126,7 @@ class LogClass:
         self._no_warn = no_warn    # Suppress messages that warn of things like unitialized memory
         self.corefile = corefile
         self.error_count = 0
+        self.warn_count = 0        # warnings, counted even when they're suppressed
         self.factory = factory
         self.logfile = logfile
         self.logout = open (self.logfile, "wt") if self.logfile != None else None
@@ -188,6 +202,7 @@ class LogClass:
             self.writeLog (LogMsgType.Log, LogMsgSeverity.Info, message)
 
     def warn(self, message):
+        self.warn_count += 1
         if not self._no_warn:
             self.writeLog (LogMsgType.Log, LogMsgSeverity.Warning, message)
 
@@ -204,6 +219,23 @@ class AsmLogClass (LogClass):
     def warn (self, line_number, message):
         self.writeLog (LogMsgType.Log, LogMsgSeverity.Warning, message, lineNo = line_number)
 
+# A lexer engine for the tokenizers here and in the assembler's parsers.  A front end
+# hands in its token set as a list of (name, regex) pairs, tried in order; they're compiled
+# into one master regex of named groups, so finding the token at a given position is a single
+# match, and the name of the group that matched says what kind of token it is.  The token
+# patterns themselves shouldn't have capturing groups of their own.  A tokenizer that reads
+# differently in different places, e.g. inside a quoted string, keeps a lexer for each.
+
+class RegexLexer:
+    def __init__ (self, tokenSpecs: list):
+        self.regex = re.compile ("|".join ("(?P<%s>%s)" % (name, regex) for (name, regex) in tokenSpecs))
+    # Returns the kind of token at pos and its match, or (None, None) if nothing matches there
+    def match (self, str: str, pos: int):
+        m = self.regex.match (str, pos)
+        if m is None:
+            return (None, None)
+        return (m.lastgroup, m)
+
 # LAS 3/25/24
 #
 # When set up with a .print string, each call to getToken will return a string
@@ -224,12 +256,20 @@ class AsmLogClass (LogClass):
 class Tokenizer:
     endOfString = "<end-of-string>"
     endOfFmt = "<end-of-fmt>"
+    delimiter = ','
+    # Outside of quotes a token is anything up to the delimiter; it may start with one
+    lexer = RegexLexer ([("Whitespace", r"[ \t]+"),
+                         ("Quote", r'"'),
+                         ("Token", r'[^ \t"][^ \t,]*')])
+    # Inside quotes the format string is literal text broken up by directives
+    fmtLexer = RegexLexer ([("Text", r'(?:[^\\"%]|\\[\s\S])*')])
+    directiveLexer = RegexLexer ([("Directive", r"[ab][do]|[do]|f[lrmx]|i")])
+    escape = re.compile (r"\\([\s\S])")
     def __init__ (self, str):
         self.pos = 0
         self.state = 0
         self.str = str
         self.slen = len (str)
-        self.delimiter = ','
         self.cb = theConstWWbitClass
     def isWhitespace (self, c) -> bool:
         return c == ' ' or c == '\t'
@@ -238,191 +278,102 @@ class Tokenizer:
         return ":\n" + str + "\n" + s + "^\n"
     def error (self, msg: str):
         self.cb.log.error (msg)
+    def syntaxError (self, msg: str, pos: int) -> str:
+        self.error (msg + " at char pos %d in %s" % (pos, self.str) + self.caratString (self.str, pos))
+        self.pos = pos + 1
+        return self.endOfString
+    # Skip whitespace and match the token at pos
+    def nextMatch (self):
+        (kind, m) = self.lexer.match (self.str, self.pos)
+        if kind == "Whitespace":
+            self.pos = m.end()
+            (kind, m) = self.lexer.match (self.str, self.pos)
+        return (kind, m)
+    # The rest of a quoted string, with the backslash escapes taken out, leaving pos at
+    # whatever ended it.  None if the string isn't closed.
+    def quotedText (self, lexer) -> str:
+        (kind, m) = lexer.match (self.str, self.pos)
+        self.pos = m.end()
+        if self.pos == self.slen or self.str[self.pos] == '\\':
+            self.pos = self.slen + 1
+            return None
+        return self.escape.sub (r"\1", m.group())
     def getToken (self) -> str:
-        token = ""
-        while self.pos <= self.slen:
-            if self.pos < self.slen:
-                c = self.str[self.pos]
-            else:
-                c = self.endOfString
-            # print (c, self.state, self.pos, token) # LAS
-            # This section used to be a Case statement;  but that's only in Python 3.10+
-            # And, as of yet, the RasPi is still on 3.7
-            if self.state == 0:
-                if self.isWhitespace (c):
-                    self.pos += 1
-                elif c == '"':
-                    self.state = 1
-                    self.pos += 1
-                else:
-                    self.state = 3
-                    token = token + c
-                    self.pos += 1
-            elif self.state == 1:
-                if c == '\\':
-                    self.state = 2
-                    self.pos += 1
-                elif c == '"':
-                    self.state = 7
-                    self.pos += 1
-                    return token
-                elif c == '%':
-                    self.state = 5
-                    self.pos += 1
-                    return token
-                else:
-                    token = token + c
-                    self.pos += 1
-            elif self.state == 2:
-                    token = token + c
-                    self.state = 1
-                    self.pos += 1
-            elif self.state == 3:
-                if c == self.delimiter:
-                    self.state = 0
-                    self.pos += 1
-                    return token
-                elif c == self.endOfString:
-                    self.state = 8
-                    return token
-                elif self.isWhitespace (c):
-                    self.error ("Comma expected at char pos %d in %s" % (self.pos, self.str) +
-                                self.caratString (self.str, self.pos))
-                    self.pos += 1
-                    return self.endOfString
-                else:
-                    token = token + c
-                    self.pos += 1
-            elif self.state == 4:
-                if c == self.delimiter:
-                    self.state = 0
-                    self.pos += 1
-                elif c == self.endOfString:
-                    return self.endOfString
-                else:
-                    self.error ("Comma expected at char pos %d in %s" % (self.pos, self.str) +
-                                self.caratString (self.str, self.pos))
-                    self.pos += 1
-                    return self.endOfString
-            elif self.state == 5:
-                if (c == 'a' or c == 'b'):
-                    self.state = 6
-                    self.pos += 1
-                    token = token + c
-                elif (c == 'd' or c == 'o'):
-                    self.state = 1
-                    self.pos += 1
-                    token = '%' + token + c
-                    return token
-                elif (c == 'f'):
-                    self.state = 9
-                    self.pos += 1
-                    token = token + c
-                elif c == 'i':
-                    self.state = 1
-                    self.pos += 1
-                    token = '%' + c
-                    return token
-                else:
-                    self.error ("Illegal format directive at char pos %d in %s" % (self.pos, self.str) +
-                                self.caratString (self.str, self.pos))
-                    self.pos += 1
-                    return self.endOfString
-            elif self.state == 6:
-                if (c == 'd' or c == 'o'):
-                    self.state = 1
-                    self.pos += 1
-                    token = '%' + token + c
-                    return token
-                else:
-                    self.error ("Illegal format directive at char pos %d in %s" % (self.pos, self.str) +
-                                self.caratString (self.str, self.pos))
-                    self.pos += 1
-                    return self.endOfString
-            elif self.state == 7:
-                self.state = 4
-                return self.endOfFmt
-            elif self.state == 8:
-                self.state = 0
+        if self.pos > self.slen:
+            return self.endOfString
+        if self.state == 7:
+            self.state = 4
+            return self.endOfFmt
+        if self.state == 5:
+            # Just past a %
+            (kind, m) = self.directiveLexer.match (self.str, self.pos)
+            if kind is None:
+                badPos = self.pos + 1 if self.pos < self.slen and self.str[self.pos] in "abf" else self.pos
+                return self.syntaxError ("Illegal format directive", badPos)
+            self.state = 1
+            self.pos = m.end()
+            return '%' + m.group()
+        if self.state == 4:
+            # Just past a quoted string
+            if self.pos == self.slen:
                 return self.endOfString
-            elif self.state == 9:
-                if c in ['l','r','m','x']:
-                    self.state = 1
+            if self.str[self.pos] != self.delimiter:
+                return self.syntaxError ("Comma expected", self.pos)
+            self.pos += 1
+            self.state = 0
+        if self.state == 0:
+            (kind, m) = self.nextMatch()
+            if kind is None:
+                return self.endOfString
+            self.pos = m.end()
+            if kind == "Token":
+                if self.pos < self.slen:
+                    if self.str[self.pos] != self.delimiter:
+                        return self.syntaxError ("Comma expected", self.pos)
                     self.pos += 1
-                    token = '%' + token + c
-                    return token
-                else:
-                    self.error ("Illegal format directive at char pos %d in %s" % (self.pos, self.str) +
-                                self.caratString (self.str, self.pos))
-                    return self.endOfString
-            else:
-                print("Unexpected state %d in Tokenizer" % self.state)
-                exit(-1)
-        return self.endOfString
+                return m.group()
+            self.state = 1
+        token = self.quotedText (self.fmtLexer)
+        if token is None:
+            return self.endOfString
+        self.state = 7 if self.str[self.pos] == '"' else 5
+        self.pos += 1
+        return token
 
 class WwPrintTokenizer (Tokenizer):
     pass
 
 class ArgsTokenizer (Tokenizer):
-    def __init__ (self, str):
-        super().__init__ (str)
-        self.delimiter = ' '
+    delimiter = ' '
+    lexer = RegexLexer ([("Whitespace", r"[ \t]+"),
+                         ("Quote", r'"'),
+                         ("Token", r'[^ \t"][^ \t]*')])
 
+# Sim params are separated by blanks; there's no format string, and a quoted
+# string is just another token.
 
 class SimParamTokenizer (Tokenizer):
+    lexer = ArgsTokenizer.lexer
+    quotedLexer = RegexLexer ([("Text", r'(?:[^\\"]|\\[\s\S])*')])
     def __init__ (self, str):
         super().__init__ (str)
         pass
     def getToken (self) -> str:
-        token = ""
-        while self.pos <= self.slen:
+        if self.pos > self.slen:
+            return self.endOfString
+        (kind, m) = self.nextMatch()
+        if kind is None:
+            return self.endOfString
+        self.pos = m.end()
+        if kind == "Token":
             if self.pos < self.slen:
-                c = self.str[self.pos]
-            else:
-                c = self.endOfString
-            if self.state == 0:
-                if self.isWhitespace (c):
-                    self.pos += 1
-                elif c == '"':
-                    self.state = 1
-                    self.pos += 1
-                else:
-                    self.state = 3
-                    token = token + c
-                    self.pos += 1
-            elif self.state == 1:
-                if c == '\\':
-                    self.state = 2
-                    self.pos += 1
-                elif c == '"':
-                    self.state = 0
-                    self.pos += 1
-                    return token
-                else:
-                    token = token + c
-                    self.pos += 1
-            elif self.state == 2:
-                    token = token + c
-                    self.state = 1
-                    self.pos += 1
-            elif self.state == 3:
-                if self.isWhitespace (c):
-                    self.state = 0
-                    self.pos += 1
-                    return token
-                elif c == self.endOfString:
-                    self.state = 4
-                    return token
-                else:
-                    token = token + c
-                    self.pos += 1
-            elif self.state == 4:
-                self.state = 0
-                return self.endOfString
-            else:
-                print ("Unexpected state %d in SimParamTokenizer" % self.state)
-                exit (-1)
-        return self.endOfString
+                self.pos += 1
+            return m.group()
+        token = self.quotedText (self.quotedLexer)
+        if token is None:
+            return self.endOfString
+        self.pos += 1
+        return token
 
 ##    def set_sim_param(self, name, value):
 ##        self.simparams[name] = value
@@ -533,6 +484,10 @@ class StdArgs:
         parser.add_argument("--LogDir",
                             help="Directory into which to store logs. Default is current wd.", type=str)
         parser.add_argument ("--ArchaeoLog", help="Write data to the archaeolog dir.", action="store_true")
+        parser.add_argument ("--CoreCache", help="Directory in which to cache parsed core files of 4 KB or more; "
+                             "no cache if not given", type=str)
+        parser.add_argument ("--CoreCacheMB", help="Size limit for the core file cache, in megabytes (default 64)",
+                             type=int, default=64)
         return parser
 
 class RemoteUtility:
@@ -543,41 +498,457 @@ class RemoteUtility:
         # capricious.
         self.port = 65437
         pass
-    
+
+# Binary remote-scope protocol
+#
+# The original protocol is a stream of ASCII commands such as "L x0 y0 xd yd E ",
+# which the server has to take apart a character at a time. The binary protocol
+# sends fixed-size struct records instead, batched into length-prefixed frames,
+# normally one frame per ww_scope_update.
+#
+# Negotiation is done in-band so either end can be an old text-only program:
+# the client sends the text command "P <version> <flags> E ", which an old server
+# simply ignores. A binary-capable server answers with a HELLO struct giving the
+# version and flags it accepts, and from then on both ends speak binary frames.
+# If no answer arrives within negotiateTimeout seconds, the client stays with text.
+#
+# Frame:  FRAME_HEADER (flags, payload length), then the payload. If FRAME_ZLIB is
+#         set in the flags, the payload is zlib-compressed.
+# Record: one opcode byte (the same letters as the text commands) followed by the
+#         fixed-size struct for that opcode.
+class RemoteScopeProtocol:
+    VERSION = 1
+    FLAG_ZLIB = 0o1                     # negotiation flag: peer may send compressed frames
+    FRAME_ZLIB = 0o1                    # frame flag: this payload is compressed
+    HELLO_MAGIC = b"WWSP"
+    HELLO = struct.Struct ("<4sBB")     # magic, version, flags
+    FRAME_HEADER = struct.Struct ("<BI")  # frame flags, payload length
+    MAX_FRAME_LEN = 1 << 24             # sanity limit for the receiving end
+    ZLIB_MIN_LEN = 256                  # don't bother compressing tiny frames
+    # opcode -> struct for the record body
+    RECORDS = {
+        ord ('L'): struct.Struct ("<hhhh"),     # x0, y0, xd, yd
+        ord ('D'): struct.Struct ("<hhfff"),    # x, y, red, green, blue
+        ord ('C'): struct.Struct ("<hhHf"),     # x, y, mask, expand
+        ord ('H'): struct.Struct ("<"),         # highlight last light gun point
+        ord ('U'): struct.Struct ("<"),         # update
+        ord ('R'): struct.Struct ("<"),         # reset
+    }
+    # public
+    def negotiateCmd (self, flags: int) -> str:
+        return "P %d %d E " % (self.VERSION, flags)
+    # public
+    def packRecord (self, op: str, *args) -> bytes:
+        opcode = ord (op)
+        return bytes ((opcode,)) + self.RECORDS[opcode].pack (*args)
+    # public
+    def packFrame (self, payload: bytes, compress: bool) -> bytes:
+        flags = 0
+        if compress and len (payload) >= self.ZLIB_MIN_LEN:
+            payload = zlib.compress (payload, 1)
+            flags |= self.FRAME_ZLIB
+        return self.FRAME_HEADER.pack (flags, len (payload)) + payload
+    # public
+    # Split the payload of one frame into (op, args) tuples
+    def unpackRecords (self, flags: int, payload: bytes) -> [(str, tuple)]:
+        if flags & self.FRAME_ZLIB:
+            payload = zlib.decompress (payload)
+        records = []
+        offset = 0
+        n = len (payload)
+        while offset < n:
+            opcode = payload[offset]
+            s = self.RECORDS.get (opcode)
+            if s is None:
+                raise ValueError ("unknown remote scope record 0o%o at offset %d" % (opcode, offset))
+            records.append ((chr (opcode), s.unpack_from (payload, offset + 1)))
+            offset += 1 + s.size
+        return records
+
+# Reassembles frames from a byte stream that may be cut at arbitrary points
+class RemoteScopeFrameDecoder:
+    def __init__ (self):
+        self.proto = RemoteScopeProtocol()
+        self.buffer = bytearray()
+        pass
+    # public
+    # Add received bytes; returns a list of complete (flags, payload) frames
+    def feed (self, data: bytes) -> [(int, bytes)]:
+        self.buffer += data
+        frames = []
+        header = self.proto.FRAME_HEADER
+        offset = 0
+        while len (self.buffer) - offset >= header.size:
+            (flags, length) = header.unpack_from (self.buffer, offset)
+            if length > self.proto.MAX_FRAME_LEN:
+                raise ValueError ("remote scope frame length %d too large" % length)
+            end = offset + header.size + length
+            if end > len (self.buffer):
+                break
+            frames.append ((flags, bytes (self.buffer[offset + header.size:end])))
+            offset = end
+        del self.buffer[:offset]
+        return frames
+
+# The simulator side of the remote scope. Drawing calls only append to the
+# frame being built; update() hands the finished frame to a background thread
+# that does the socket I/O, so a slow or broken network never stalls the
+# simulation. If the network falls behind and the queue is full, the stalest
+# whole frame in the queue is dropped -- the phosphor will be repainted by the
+# next one anyway. A frame with a reset in it, or one queued in pieces because
+# it outgrew frameLim, is always sent, since losing it would leave the display
+# wrong rather than just late. If the connection is lost, the sender thread
+# keeps trying to reconnect, discarding frames in the meantime. The counters
+# are kept under the same lock as the queue, as both threads update them.
 class RemoteScope (RemoteUtility):
-    def __init__ (self, host: str):
+    def __init__ (self, host: str, binary: bool = True, compress: bool = False, maxFrames: int = 4):
         super().__init__()
-        self.buffer: str = "R E "
+        self.proto = RemoteScopeProtocol()
         if host is None:
             host = socket.gethostname()
-        s = socket.socket (socket.AF_INET, socket.SOCK_STREAM)
+        self.host = host
+        self.wantBinary = binary
+        self.wantCompress = compress
+        self.binary = False             # set by negotiation
+        self.compress = False           # set by negotiation
+        self.buffer: str = ""           # text commands waiting for the next update
+        self.frame = bytearray()        # binary records waiting for the next update
+        self.frameLim: int = 1 << 20    # queue an unfinished frame beyond this size
+        self.frameReset = False         # the frame being built has a reset in it
+        self.framePartial = False       # some of the frame being built is queued already
+        self.negotiateTimeout = 2.0
+        self.reconnectDelayMax = 5.0
+        # counters, for the curious
+        self.framesSent = 0
+        self.framesDropped = 0
+        self.bytesSent = 0
+        self.reconnects = 0
+        # frames waiting for the sender thread, as (binary, data, droppable) tuples
+        self.queue = collections.deque()
+        self.maxFrames = maxFrames
+        self.cv = threading.Condition()
+        self.closing = False
+        self.remote_scope_socket = None
         try:
-            s.connect ((host, self.port))
+            self.connect()
         except OSError as e:
             print ("Error connecting to remote scope server: %s" % e)
             sys.exit (-1)
+        self.sender = threading.Thread (target = self.senderThread, name = "RemoteScope", daemon = True)
+        self.sender.start()
+        pass
+    # private
+    # Open the socket, negotiate a protocol and start the display afresh
+    def connect (self):
+        s = socket.create_connection ((self.host, self.port))
+        try:
+            (self.binary, self.compress) = self.negotiate (s)
+            if self.binary:
+                reset = self.proto.packFrame (self.proto.packRecord ('R'), False)
+            else:
+                reset = b"R E "
+            s.sendall (reset)
+        except OSError:
+            s.close()
+            raise
         self.remote_scope_socket = s
-        self.sendBuffer()
+        pass
+    # private
+    # Offer the binary protocol; quietly stay with text if the server doesn't answer.
+    # Returns (binary, compress)
+    def negotiate (self, s) -> (bool, bool):
+        if not self.wantBinary:
+            return (False, False)
+        flags = self.proto.FLAG_ZLIB if self.wantCompress else 0
+        reply = b""
+        try:
+            s.sendall (bytes (self.proto.negotiateCmd (flags), "utf-8"))
+            s.settimeout (self.negotiateTimeout)
+            while len (reply) < self.proto.HELLO.size:
+                data = s.recv (self.proto.HELLO.size - len (reply))
+                if not data:
+                    break
+                reply += data
+        except socket.timeout:
+            pass
+        finally:
+            s.settimeout (None)
+        if len (reply) == self.proto.HELLO.size:
+            (magic, version, flags) = self.proto.HELLO.unpack (reply)
+            if magic == self.proto.HELLO_MAGIC and version == self.proto.VERSION:
+                return (True, (flags & self.proto.FLAG_ZLIB) != 0)
+        print ("Remote scope server doesn't speak the binary protocol; using text")
+        return (False, False)
+    # private
+    # Keep trying to get the connection back, backing off between attempts
+    def reconnect (self) -> bool:
+        delay = 0.1
+        while not self.closing:
+            try:
+                self.connect()
+                with self.cv:
+                    self.reconnects += 1
+                print ("Reconnected to remote scope server")
+                return True
+            except OSError:
+                pass
+            with self.cv:
+                self.cv.wait (delay)
+            delay = min (delay * 2, self.reconnectDelayMax)
+        return False
+    # private
+    def senderThread (self):
+        while True:
+            with self.cv:
+                while len (self.queue) == 0 and not self.closing:
+                    self.cv.wait()
+                if len (self.queue) == 0:
+                    return
+                (binary, data, droppable) = self.queue.popleft()
+                self.cv.notify_all()
+            sent = False
+            # a frame built for the protocol of a previous connection is no use now
+            if (self.remote_scope_socket is not None or self.reconnect()) and binary == self.binary:
+                try:
+                    self.remote_scope_socket.sendall (data)
+                    sent = True
+                except OSError as e:
+                    print ("Error sending data to remote scope server: %s" % e)
+                    self.remote_scope_socket.close()
+                    self.remote_scope_socket = None
+            with self.cv:
+                if sent:
+                    self.framesSent += 1
+                    self.bytesSent += len (data)
+                else:
+                    self.framesDropped += 1
+        pass
+    # private
+    # Queue a frame for the sender thread. If it's behind, the stalest droppable
+    # frame makes way; if none can be dropped the queue runs over maxFrames.
+    def enqueue (self, binary: bool, data: bytes, droppable: bool):
+        with self.cv:
+            if len (self.queue) >= self.maxFrames:
+                for i in range (len (self.queue)):
+                    if self.queue[i][2]:
+                        del self.queue[i]
+                        self.framesDropped += 1
+                        break
+            self.queue.append ((binary, data, droppable))
+            self.cv.notify_all()
         pass
     # public
     def send (self, msg: str):
-        if len (self.buffer) + len (msg) > self.bufferLim:
-            self.sendBuffer()
         self.buffer += msg
+        if len (self.buffer) > self.frameLim:
+            self.sendBuffer()
+        pass
+    # private
+    def addRecord (self, op: str, *args):
+        self.frame += self.proto.packRecord (op, *args)
+        if len (self.frame) > self.frameLim:
+            self.sendBuffer()
+        pass
+    # public
+    def line (self, x0: int, y0: int, xd: int, yd: int):
+        if self.binary:
+            self.addRecord ('L', x0, y0, xd, yd)
+        else:
+            self.send ("L %d %d %d %d E " % (x0, y0, xd, yd))
+        pass
+    # public
+    def point (self, x: int, y: int, red: float, green: float, blue: float):
+        if self.binary:
+            self.addRecord ('D', x, y, red, green, blue)
+        else:
+            self.send ("D %d %d %f %f %f E " % (x, y, red, green, blue))
+        pass
+    # public
+    def char (self, x: int, y: int, mask: int, expand: float):
+        if self.binary:
+            self.addRecord ('C', x, y, mask, expand)
+        else:
+            self.send ("C %d %d %d %d E " % (x, y, mask, expand))
+        pass
+    # public
+    def highlight (self):
+        if self.binary:
+            self.addRecord ('H')
+        else:
+            self.send ("H E ")
+        pass
+    # public
+    def reset (self):
+        self.frameReset = True
+        if self.binary:
+            self.addRecord ('R')
+        else:
+            self.send ("R E ")
         pass
     # public
     def update (self):
-        self.send ("U E ")
-        self.sendBuffer()
+        if self.binary:
+            self.addRecord ('U')
+        else:
+            self.send ("U E ")
+        self.sendBuffer (complete = True)
         pass
     # private
-    def sendBuffer (self):
-        try:
-            self.remote_scope_socket.sendall (bytes (self.buffer, "utf-8"))
+    # Hand whatever has been built so far to the sender thread. If the protocol
+    # changed on a reconnect there may be a little of each kind. Only a frame
+    # that goes as one piece, and has no reset, may be dropped on the way.
+    def sendBuffer (self, complete: bool = False):
+        droppable = complete and not self.framePartial and not self.frameReset
+        if len (self.frame) != 0:
+            self.enqueue (True, self.proto.packFrame (self.frame, self.compress), droppable)
+            self.frame = bytearray()
+        if len (self.buffer) != 0:
+            self.enqueue (False, bytes (self.buffer, "utf-8"), droppable)
             self.buffer = ""
+        self.framePartial = not complete
+        self.frameReset = False
+        pass
+    # public
+    # Give the sender thread a moment to drain the queue, then shut it down
+    def close (self, timeout: float = 2.0):
+        self.sendBuffer()
+        deadline = time.time() + timeout
+        with self.cv:
+            while len (self.queue) != 0 and time.time() < deadline:
+                self.cv.wait (deadline - time.time())
+            self.closing = True
+            self.cv.notify_all()
+        self.sender.join (timeout)
+        if self.remote_scope_socket is not None:
+            self.remote_scope_socket.close()
+            self.remote_scope_socket = None
+        pass
+    # public
+    def stats (self) -> str:
+        with self.cv:
+            return ("Remote scope: sent %d frames, %d bytes; dropped %d frames; %d reconnects" %
+                    (self.framesSent, self.bytesSent, self.framesDropped, self.reconnects))
+
+# Scope recordings
+#
+# wwsim --RecordScope <file> saves the display command stream in the same
+# record format as the binary remote-scope protocol, one frame per
+# ww_scope_update, each stamped with the simulated time in microseconds
+# (cpu.accum_ww_inst_time_usec). ww-scope-player.py plays a recording back
+# into an XwinCrt window or the remote scope server at any speed.
+#
+# The frames are cut wherever the simulator refreshes the display, so two runs
+# record the same bytes only if the refresh comes every fixed number of
+# instructions (--RefreshRate 0, which wwsim uses with --RecordScope unless told
+# otherwise); a refresh paced by the wall clock cuts them differently each time.
+#
+# File:  FILE_HEADER (magic, version, length of the core file name), the core
+#        file name in utf-8, then frames.
+# Frame: FRAME_HEADER (simulated usec, frame flags, payload length), then the
+#        payload, which is a RemoteScopeProtocol record list, zlib-compressed
+#        if FRAME_ZLIB is set in the flags.
+class ScopeRecordingFormat:
+    MAGIC = b"WWSR"
+    VERSION = 1
+    FILE_HEADER = struct.Struct ("<4sBH")
+    FRAME_HEADER = struct.Struct ("<QBI")
+
+class ScopeRecorder:
+    def __init__ (self, cb, filename: str):
+        self.cb = cb
+        self.filename = filename
+        self.fmt = ScopeRecordingFormat()
+        self.proto = RemoteScopeProtocol()
+        self.frame = bytearray()
+        self.frames = 0
+        try:
+            self.fd = open (filename, "wb", buffering = 1 << 16)
         except OSError as e:
-            print ("Error sending data to remote scope server: %s" % e)
-            sys.exit (-1)
+            cb.log.fatal ("can't open scope recording file %s: %s" % (filename, e))
+        name = bytes (str (cb.CoreFileName), "utf-8")
+        self.fd.write (self.fmt.FILE_HEADER.pack (self.fmt.MAGIC, self.fmt.VERSION, len (name)) + name)
+        pass
+    # public
+    def line (self, x0: int, y0: int, xd: int, yd: int):
+        self.frame += self.proto.packRecord ('L', x0, y0, xd, yd)
+    # public
+    def point (self, x: int, y: int, red: float, green: float, blue: float):
+        self.frame += self.proto.packRecord ('D', x, y, red, green, blue)
+    # public
+    def char (self, x: int, y: int, mask: int, expand: float):
+        self.frame += self.proto.packRecord ('C', x, y, mask, expand)
+    # public
+    def highlight (self):
+        self.frame += self.proto.packRecord ('H')
+    # public
+    def reset (self):
+        self.frame += self.proto.packRecord ('R')
+    # public
+    def update (self):
+        self.frame += self.proto.packRecord ('U')
+        usec = 0
+        if self.cb.cpu is not None:
+            usec = int (self.cb.cpu.accum_ww_inst_time_usec)
+        payload = bytes (self.frame)
+        flags = 0
+        if len (payload) >= self.proto.ZLIB_MIN_LEN:
+            payload = zlib.compress (payload, 1)
+            flags |= self.proto.FRAME_ZLIB
+        self.fd.write (self.fmt.FRAME_HEADER.pack (usec, flags, len (payload)))
+        self.fd.write (payload)
+        self.frame = bytearray()
+        self.frames += 1
+        pass
+    # public
+    def close (self):
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+        pass
+
+# Reads a scope recording. Opening the file only walks the frame headers, so
+# seeking around a long recording doesn't need to decode it.
+class ScopeRecording:
+    def __init__ (self, filename: str):
+        self.fmt = ScopeRecordingFormat()
+        self.proto = RemoteScopeProtocol()
+        self.fd = open (filename, "rb")
+        header = self.fd.read (self.fmt.FILE_HEADER.size)
+        if len (header) != self.fmt.FILE_HEADER.size:
+            raise ValueError ("%s is too short to be a scope recording" % filename)
+        (magic, version, nameLen) = self.fmt.FILE_HEADER.unpack (header)
+        if magic != self.fmt.MAGIC or version != self.fmt.VERSION:
+            raise ValueError ("%s isn't a version %d scope recording" % (filename, self.fmt.VERSION))
+        self.corefile = self.fd.read (nameLen).decode ("utf-8")
+        self.times = []                 # simulated usec of each frame
+        self.offsets = []               # file offset of each frame header
+        offset = self.fd.tell()
+        while True:
+            h = self.fd.read (self.fmt.FRAME_HEADER.size)
+            if len (h) < self.fmt.FRAME_HEADER.size:
+                break                   # a recording cut short by a crash just ends early
+            (usec, flags, length) = self.fmt.FRAME_HEADER.unpack (h)
+            self.times.append (usec)
+            self.offsets.append (offset)
+            offset += self.fmt.FRAME_HEADER.size + length
+            self.fd.seek (offset)
+        pass
+    # public
+    def __len__ (self):
+        return len (self.times)
+    # public
+    # Index of the first frame at or after the given simulated time
+    def find (self, usec: int) -> int:
+        return bisect.bisect_left (self.times, usec)
+    # public
+    # Returns (usec, [(op, args)...]) for frame n
+    def frame (self, n: int) -> (int, [(str, tuple)]):
+        self.fd.seek (self.offsets[n])
+        (usec, flags, length) = self.fmt.FRAME_HEADER.unpack (self.fd.read (self.fmt.FRAME_HEADER.size))
+        return (usec, self.proto.unpackRecords (flags, self.fd.read (length)))
+    # public
+    def close (self):
+        self.fd.close()
         pass
 
 class ConstWWbitClass:
@@ -676,9 +1047,11 @@ class ConstWWbitClass:
         self.use_x_win = True               # clear this flag to completely turn off the xwin display, widgets and all
         self.xWin_size_arg = None           # if this is set to a number by the cmd-line arg, use it as the size of the xWinCRT
         self.ana_scope = None               # this is a handle to the methods for operating the analog scope
+        self.ana_scope_display_list = False # send the analog scope a frame at a time on each display refresh
         self.remote_scope = None            # Holds RemoteScope instance when spec'd in args
         self.remote_scope_only = False      # True if the scope should be remote only, i.e., don't bring up scope on local machine
         self.this_is_remote_scope = False   # True if this process is the remote scope server
+        self.scope_recorder = None          # Holds ScopeRecorder instance when the display is being recorded
         self.which_scope = 3                # default to showing both D and F scopes on the xwin display
         self.RasPi = False                  # this will be set in microWhirlwind if it's running on a RasPi
         self.hnf_hardware_present = hnf_hardware_present
@@ -711,7 +1084,12 @@ class ConstWWbitClass:
         self.TraceDisplayScope = False
         self.PETRAfilename = None
         self.PETRBfilename = None
+        self.flexo_output = None        # output sink names for the Flexowriter and Teletype; see OutputSinkClass
+        self.tty_output = None
+        self.output_batch_chars = 0
+        self.petr_char_usec = 0     # paper tape reader time per character; zero means no tape-speed model
         self.record_core_info = False
+        self.core_cache = None      # a CoreCacheClass, if parsed core files are being cached
 
         #
         # Read std args
@@ -722,6 +1100,8 @@ class ConstWWbitClass:
         if args:
             self.logDirSpecified = True if args.LogDir is not None else False
             self.logDir = args.LogDir if self.logDirSpecified else "./"
+            if args.CoreCache:
+                self.core_cache = CoreCacheClass(self, args.CoreCache, args.CoreCacheMB * 1024 * 1024)
         else:
             self.logDirSpecified = False
             self.logDir = "./"
@@ -945,6 +1325,9 @@ class AdjustSwitchWidgetClass:
                 self.target.heading += 360.0
 
 class WWSwitchClass:
+    # the FF Preset switch names, and their internal names; the table is reset for every core file read
+    ff_preset_names = [("FlipFlopPreset%02o" % s, "FF%02oSw" % s) for s in range(2, 32)]
+
     def __init__(self, cb):
         self.cb = cb
         self.SwitchNameDict = {}
@@ -969,9 +1352,8 @@ class WWSwitchClass:
             "ActivationReg0":       [0, 0xffff, "ActivationReg0"],  #
             "ActivationReg1":       [0, 0xffff, "ActivationReg1"],  #
         }
-        for s in range(2, 32):
-            name = "FlipFlopPreset%02o" % s
-            self.SwitchNameDict[name] = [None, 0xffff, "FF%02oSw" % s]
+        for (name, internal_name) in self.ff_preset_names:
+            self.SwitchNameDict[name] = [None, 0xffff, internal_name]
 
     # The five Flip Flop Registers could be assigned to different locations in the lower
     # 32 words of the address space.  I can't imagine why they did that, and I haven't found
@@ -1300,6 +1682,7 @@ class CorememClass:
 #        self.metadata_goto = None
 #        self.metadata_filename_from_core = []
 #        self.metadata_ww_tapeid = []
+        self.core_tables = None   # the CoreFileTablesClass from the last core file read
         self.exec_directives = {}  # keep a dictionary of all the python exec directives found in the core file
                                    #   indexed by bank and address
         self.mem_addr_reg = 0       # store the most recent memory access address and data for blinkenlights
@@ -1307,7 +1690,8 @@ class CorememClass:
         self.corememinfo = None
 
     def restore_toggle_default(self):
-        self._toggle_switch_mem = copy.deepcopy(self._toggle_switch_mem_default)
+        # a copy of each [value, read-only] pair; this is done for every core file loaded, and deepcopy is slow
+        self._toggle_switch_mem = [list(tsr) for tsr in self._toggle_switch_mem_default]
         self.tsr_callback = [None] * 32
 
 
@@ -1387,6 +1771,111 @@ class CorememClass:
             self.mem_data_reg = ret     # But _don't_ save when the rd() is from the control panel reading FF reg!
         return ret
 
+    # Block transfers for BI and BO; these give the same results as calling wr() or rd() on
+    # each address in turn, but copy whole slices of the memory banks at a time.
+    # The first 32 addresses still go through wr()/rd() one word at a time for the toggle
+    # switch rules, and a block that crosses from Group A into Group B is split into a
+    # slice for each bank.  The caller is expected to have checked that the block fits in
+    # the address space.
+    def write_block(self, addr, words):
+        n = len(words)
+        if n == 0:
+            return
+        first = 0
+        if self.use_default_tsr:
+            first = max(0, min(n, self._toggle_switch_mask + 1 - addr))
+            self.write_toggle_switches(addr, words[:first])
+        for (start, end, bank) in self._block_slices(addr + first, addr + n):
+            offset = start & self.cb.WWBIT6_15
+            self._coremem[bank][offset:offset + end - start] = words[start - addr:end - addr]
+        if first < n:
+            if self.cb.TraceCoreLocation is not None and addr + first <= self.cb.TraceCoreLocation < addr + n:
+                self.cb.log.info("Write to core memory; addr=0o%05o, value=0o%05o" %
+                                 (self.cb.TraceCoreLocation, words[self.cb.TraceCoreLocation - addr]))
+            if self.corememinfo is not None:
+                for a in range(addr + first, addr + n):
+                    self.corememinfo.registerWr (a)
+        self.mem_addr_reg = addr + n - 1
+        self.mem_data_reg = words[n - 1]
+
+    # Write words into the toggle switch registers starting at addr, with the same results as
+    # calling wr() on each in turn, but without the call and the callback and trace checks for
+    # each word.  Programs loaded at address zero, as most tapes are, start with 32 of them, so
+    # overwriting read-only switches is logged once for the lot, not once for each word.
+    def write_toggle_switches(self, addr, words, force=False):
+        n = len(words)
+        if n == 0:
+            return
+        cb = self.cb
+        if self.corememinfo is not None or any(self.tsr_callback[addr:addr + n]) or \
+           (cb.TraceCoreLocation is not None and addr <= cb.TraceCoreLocation < addr + n):
+            for i in range(n):
+                self.wr(addr + i, words[i], force=force)
+            return
+        tsr = self._toggle_switch_mem
+        bank = self._coremem[self.MemGroupA]
+        overwritten = 0
+        for i in range(n):
+            val = words[i]
+            switch = tsr[addr + i]
+            if switch[0] != val:
+                if switch[1]:
+                    if not force:
+                        if not cb.no_toggle_switch_warn and addr + i != 0:
+                            cb.log.warn("Can't write a read-only toggle switch at addr=0o%o" % (addr + i))
+                        continue
+                    if overwritten == 0:
+                        first = addr + i
+                    last = addr + i
+                    overwritten += 1
+                switch[0] = val
+            bank[addr + i] = val
+        if overwritten:
+            cb.log.info("Overwriting %d read-only toggle switches, addr=0o%o to 0o%o" % (overwritten, first, last))
+        self.mem_addr_reg = addr + n - 1
+        self.mem_data_reg = words[n - 1]
+
+    def read_block(self, addr, n, fix_none=True):
+        if n == 0:
+            return []
+        words = []
+        first = 0
+        if self.use_default_tsr:
+            while first < n and ((addr + first) & ~self._toggle_switch_mask) == 0:
+                words.append(self.rd(addr + first, fix_none=fix_none))
+                first += 1
+        for (start, end, bank) in self._block_slices(addr + first, addr + n):
+            offset = start & self.cb.WWBIT6_15
+            words.extend(self._coremem[bank][offset:offset + end - start])
+        if first < n:
+            if self.corememinfo is not None:
+                for a in range(addr + first, addr + n):
+                    self.corememinfo.registerRd (a)
+            if fix_none or self.cb.ZeroizeCore:
+                for i in range(first, n):
+                    if words[i] is None:
+                        if not self.cb.ZeroizeCore:
+                            bank = self.MemGroupB if (addr + i) & self.cb.WWBIT5 else self.MemGroupA
+                            print ("Reading Uninitialized Memory at location 0o%o, bank %o" % (addr + i, bank))
+                        words[i] = 0
+            if self.cb.TraceCoreLocation is not None and addr + first <= self.cb.TraceCoreLocation < addr + n:
+                self.cb.log.info("Read from core memory; addr=0o%05o, value=%s" %
+                                 (self.cb.TraceCoreLocation, octal_or_none(words[self.cb.TraceCoreLocation - addr])))
+        self.mem_addr_reg = addr + n - 1
+        self.mem_data_reg = words[n - 1]
+        return words
+
+    # split the address range [start, end) into (start, end, physical bank) pieces for Group A and Group B
+    def _block_slices(self, start, end):
+        slices = []
+        if start < end and not start & self.cb.WWBIT5:
+            split = min(end, self.cb.WWBIT5)
+            slices.append((start, split, self.MemGroupA))
+            start = split
+        if start < end:
+            slices.append((start, end, self.MemGroupB))
+        return slices
+
     def clear_mem(self):
         self._coremem = []
         for _i in range(self.NBANKS):
@@ -1398,8 +1887,8 @@ class CorememClass:
             self._coremem[0][1] = 1
 
     # entry point to read a core file into 'memory'
-    def read_core(self, filename, cpu, cb, file_contents=None):
-        return read_core_file(self, filename, cpu, cb, file_contents)
+    def read_core(self, filename, cpu, cb, file_contents=None, tables=True):
+        return read_core_file(self, filename, cpu, cb, file_contents, tables)
 
 
     # call this method to change the default for which Toggle Switch Registers are replaced by
@@ -1454,6 +1943,637 @@ class CorememClass:
         self.tsr_callback[address] = function
 
 
+# Core files are mostly @C lines, so the parser below looks at the first couple of characters
+# to decide what a line is, and only then takes it apart.  The words on consecutive @C lines
+# are collected into a run, then converted and loaded with one CorememClass.write_block() call;
+# see _load_core_run().
+# Fields are separated by any mix of colons, blanks and tabs.  A row of words is split with
+# str.split(), which is much quicker than the regex, but which also splits on other
+# whitespace characters; so if a file has any of those, it goes the slow way.
+_core_file_sep = re.compile("[: \t][: \t]*")   # separators between fields of @C, @T, @S lines
+_core_file_odd_space = "\r\x0b\x0c\x1c\x1d\x1e\x1f"   # ASCII whitespace other than blank, tab and newline
+_core_file_line_types = ("@C", "@T", "@S", "@N", "@E")
+_core_file_comment = re.compile(";.*")
+_core_file_rows = re.compile(r"^@[CT].*(?:\n@[CT].*)*", re.M)   # a stretch of consecutive @C/@T lines
+_core_file_heads = {}   # "@C00000:", "@C00010:"... for each row type; see _core_row_addresses()
+
+
+# Convert a run of octal words from a core file to integers.  The usual seven-digit words are
+# done all at once: with a zero in place of each blank, each one is eight octal digits, i.e.,
+# three bytes of one big integer, and the top byte of each is zero if the word fits in 16 bits.
+# Anything else is converted a word at a time, raising ValueError for a bad one.
+def _core_words_to_int(tokens):
+    n = len(tokens)
+    words = " ".join(tokens)
+    # every eighth character a blank means every word is seven characters long; int() allows
+    # underscores, but they'd throw the digits out of line
+    if n and len(words) == 8 * n - 1 and words[7::8] == " " * (n - 1) and "_" not in words:
+        try:
+            raw = int("0" + words.replace(" ", "0"), 8).to_bytes(3 * n, "big")
+            if raw[0::3].count(0) == n:
+                pairs = bytearray(2 * n)
+                pairs[0::2] = raw[1::3]
+                pairs[1::2] = raw[2::3]
+                return list(struct.unpack(">%dH" % n, pairs))
+        except (ValueError, OverflowError):
+            pass
+    return list(map(int, tokens, itertools.repeat(8)))
+
+
+# Load a contiguous run of words read from a core file into memory, giving the same results as
+# calling cm.wr(addr, word, force=True) on each one.  Words in the toggle switch registers, or
+# past the top of the address space (which wraps), go through wr() for its special cases; the
+# rest are written as a block.
+def _load_core_words(cm, cb, start, words, track):
+    end = start + len(words)
+    low = min(max(start, cm._toggle_switch_mask + 1), end) if cm.use_default_tsr else start
+    high = max(min(end, cb.CORE_SIZE), low)
+    cm.write_toggle_switches(start, words[:low - start], force=True)
+    cm.write_block(low, words[low - start:high - start])
+    for addr in range(high, end):
+        cm.wr(addr, words[addr - start], force=True, track=track)
+
+
+# Same, but for a run of octal words as they appear in the file.
+# rows gives the (index in tokens, line number, line) where each core file line's words start,
+# to say where a bad word came from.
+def _load_core_run(cm, cb, start, tokens, rows, track):
+    try:
+        words = _core_words_to_int(tokens)
+    except ValueError:
+        words = []
+        for token in tokens:
+            try:
+                words.append(int(token, 8))
+            except ValueError:
+                break
+        _load_core_words(cm, cb, start, words, track)
+        (_index, line_number, line) = [row for row in rows if row[0] <= len(words)][-1]
+        cb.log.fatal(" invalid number '%s' in line %d: \"%s\"" %
+                     (tokens[len(words)], line_number, line.rstrip(' \t\n\r')))
+    _load_core_words(cm, cb, start, words, track)
+
+
+# Check that the addresses at the heads of a stretch of @C or @T lines go up by eight from line
+# to line, and return the first one, or None if they don't.  They're nearly always written as
+# five octal digits, so they're compared as strings against a table of those first.
+def _core_row_addresses(heads):
+    first = heads[0]
+    table = _core_file_heads.get(first[:2])
+    if table is None:
+        table = _core_file_heads[first[:2]] = [first[:2] + "%05o:" % a for a in range(0, 0o100000, 8)]
+    try:
+        start = int(first[2:-1], 8) if first[-1] == ':' else -1
+        if start >= 0 and start % 8 == 0 and heads == table[start // 8:start // 8 + len(heads)]:
+            return start
+        addresses = [int(head[2:-1], 8) for head in heads if head[-1] == ':']
+    except ValueError:
+        return None
+    if len(addresses) == len(heads) and \
+       addresses == list(range(addresses[0], addresses[0] + 8 * len(heads), 8)):
+        return addresses[0]
+    return None
+
+
+# Split the text of a core file into lines, except that each stretch of consecutive @C or @T
+# lines, which is nearly all of a typical file, comes as one piece without being taken apart.
+# Yields (stretch, None) for a stretch of rows and (None, line) for any other line.
+def _core_file_chunks(text):
+    pos = 0
+    for m in _core_file_rows.finditer(text):
+        for line in text[pos:m.start()].split('\n')[:-1]:
+            yield (None, line)
+        yield (m.group(), None)
+        pos = m.end() + 1
+    if pos <= len(text):
+        for line in text[pos:].split('\n'):
+            yield (None, line)
+
+
+# Read a stretch of consecutive @C (or @T) lines from a core file into memory; the first one is
+# line number first_line.  The lines come as one string, separated by newlines, just as they
+# are in the file.  Returns the number of words read.
+# Nearly always, the stretch is one solid block of memory, eight words to a line except maybe
+# the last, so the whole thing is taken apart at once: with the comments gone, the address is
+# every ninth token.  If it turns out to be anything else, e.g., a line with "None" in it, it
+# goes a line at a time.
+def _read_core_rows(cm, cb, stretch, first_line, plain_spacing, track):
+    nrows = stretch.count('\n') + 1
+    last = stretch.rfind('\n') + 1
+    if nrows > 1 and "None" in stretch[last:]:   # a partly-filled line, usually at the end of a block
+        return _read_core_rows(cm, cb, stretch[:last - 1], first_line, plain_spacing, track) + \
+            _read_core_rows(cm, cb, stretch[last:], first_line + nrows - 1, plain_spacing, track)
+    text = stretch
+    if ';' in text:
+        text = _core_file_comment.sub("", text)
+    # each line starts with '@', so with just one '@' and one ':' per line, the addresses are
+    # exactly the tokens with an '@' in them
+    if plain_spacing and (nrows == 1 or "None" not in text) and \
+       text.count('@') == nrows and text.count(':') == nrows:
+        tokens = text.split()
+        if nrows == 1 and "None" in text:   # the Nones at the end of a partly-filled line are skipped
+            while len(tokens) > 1 and tokens[-1] == "None":
+                tokens.pop()
+            if "None" in tokens:
+                tokens = []
+        heads = tokens[0::9]
+        if 9 * nrows - 8 <= len(tokens) <= 9 * nrows and "".join(heads).count('@') == nrows:
+            start = _core_row_addresses(heads)
+            if start is not None:
+                del tokens[0::9]
+                try:
+                    words = _core_words_to_int(tokens)
+                except ValueError:
+                    words = None   # let the line-at-a-time code say where the bad word is
+                if words is not None:
+                    if words:
+                        _load_core_words(cm, cb, start, words, track)
+                    return len(words)
+
+    word_count = 0
+    run_start = 0  # consecutive words, waiting to be loaded with _load_core_run
+    run_end = 0
+    run = []
+    run_rows = []
+    line_number = first_line
+    for ln in stretch.split('\n'):
+        semicolon = ln.find(';')
+        input_minus_comment = ln[:semicolon] if semicolon >= 0 else ln
+        tokens = input_minus_comment.split()
+        if plain_spacing and tokens[0][-1] == ':' and input_minus_comment.count(':') == 1:
+            tokens[0] = tokens[0][:-1]
+        else:
+            tokens = _core_file_sep.split(input_minus_comment.rstrip())
+        # if it's actually a binary core file, pick up the address from @C or @T
+        address = int(tokens[0][2:], 8)
+        for token in tokens[1:]:
+            if token != "None":
+                if address != run_end:
+                    if run:
+                        _load_core_run(cm, cb, run_start, run, run_rows, track)
+                    run = []
+                    run_rows = []
+                    run_start = run_end = address
+                if not run_rows or run_rows[-1][1] != line_number:
+                    run_rows.append((len(run), line_number, ln))
+                run.append(token)
+                run_end += 1
+                word_count += 1
+            address += 1
+        line_number += 1
+    if run:
+        _load_core_run(cm, cb, run_start, run, run_rows, track)
+    return word_count
+
+
+# bytes 0 and 1 for each bit of a byte, low bit first; for turning the bitmap in a binary core
+# image into something str.find() can search
+_bitmap_bits = [bytes((b >> i) & 1 for i in range(8)) for b in range(256)]
+
+
+# A core image in binary form (.bcore).  Text core files are still the interchange format, but a
+# binary image loads in a fraction of the time, which matters for museum mode and for batch runs
+# that load the same programs over and over.  read_core_file() recognizes one by its magic
+# number; write_core() and the assembler write one if the output file name ends in .bcore, and
+# Py/Tools/ww-core-convert.py converts in either direction.
+# The file is a header giving the offset and length of each section, then the sections:
+#   memory      a bitmap of the initialized words, then CORE_SIZE 16-bit words
+#   directives  the %-directive lines from the text file (%File, %JumpTo, %Switch, %Hash...),
+#               in order, one per line, in UTF-8
+#   symbols, comments, exec statements
+#               a count, that many 32-bit addresses, then the name, comment or Python
+#               statement for each, one per line, in UTF-8
+# Numbers are little-endian.  Reading either form of a core image gives the same results.
+class BinaryCoreImageClass:
+    MAGIC = b"WWBC"
+    VERSION = 1
+    HEADER = struct.Struct("<4sBcH10I")    # magic, version, file type, core size, (offset, length) x 5
+
+    def __init__(self, cb, file_type='C'):
+        self.cb = cb
+        self.file_type = file_type  # 'C' for a core image, 'T' for a tape bytestream, as in the text file
+        self.memory = array.array('H', bytes(2 * cb.CORE_SIZE))
+        self.bitmap = bytearray(cb.CORE_SIZE // 8)
+        self.directives = []   # e.g. "%JumpTo 0o40"
+        self._tables = [[], [], []]   # symbols, comments and exec statements; see _table()
+        self._packed_tables = None
+
+    @staticmethod
+    def is_binary_core_file(filename):
+        try:
+            with open(filename, "rb") as f:
+                return f.read(len(BinaryCoreImageClass.MAGIC)) == BinaryCoreImageClass.MAGIC
+        except IOError:
+            return False
+
+    # The tables from a binary file aren't unpacked until they're used
+    def _table(self, i):
+        if self._tables[i] is None:
+            self._tables[i] = self._unpack_table(self._packed_tables[i])
+        return self._tables[i]
+
+    symbols = property(lambda self: self._table(0))    # (address, name)
+    comments = property(lambda self: self._table(1))   # (address, comment)
+    execs = property(lambda self: self._table(2))      # (address, Python statement)
+
+    # memory contents as a list, with None for words that aren't initialized
+    def get_words(self):
+        flags = b"".join(map(_bitmap_bits.__getitem__, self.bitmap))
+        return [w if f else None for (w, f) in zip(self.memory, flags)]
+
+    def set_words(self, words):
+        for (addr, w) in enumerate(words[:self.cb.CORE_SIZE]):
+            if w is not None:
+                self.memory[addr] = w
+                self.bitmap[addr >> 3] |= 1 << (addr & 7)
+
+    # the initialized words, as a list of (start, end) address ranges
+    def runs(self):
+        flags = b"".join(map(_bitmap_bits.__getitem__, self.bitmap))
+        runs = []
+        start = flags.find(1)
+        while start >= 0:
+            end = flags.find(0, start)
+            if end < 0:
+                end = len(flags)
+            runs.append((start, end))
+            start = flags.find(1, end)
+        return runs
+
+    # Load the image into memory, just as read_core_file() would from the text file; the
+    # directives are left for read_core_file() to do, and the tables for CoreFileTablesClass.
+    # Returns the number of words loaded.
+    def load(self, cm, track):
+        word_count = 0
+        for (start, end) in self.runs():
+            _load_core_words(cm, self.cb, start, self.memory[start:end].tolist(), track)
+            word_count += end - start
+        return word_count
+
+    @staticmethod
+    def _pack_table(entries):
+        addresses = array.array('i', [address for (address, _text) in entries])
+        if sys.byteorder != "little":
+            addresses.byteswap()
+        text = "\n".join([text for (_address, text) in entries])
+        return struct.pack("<I", len(entries)) + addresses.tobytes() + text.encode("utf-8")
+
+    @staticmethod
+    def _unpack_table(section):
+        (n,) = struct.unpack_from("<I", section)
+        addresses = array.array('i', section[4:4 + 4 * n])
+        if sys.byteorder != "little":
+            addresses.byteswap()
+        if n == 0:
+            return []
+        return list(zip(addresses, section[4 + 4 * n:].decode("utf-8").split('\n')))
+
+    def write(self, filename):
+        memory = array.array('H', self.memory)
+        if sys.byteorder != "little":
+            memory.byteswap()
+        sections = [bytes(self.bitmap) + memory.tobytes(),
+                    "\n".join(self.directives).encode("utf-8"),
+                    self._pack_table(self.symbols),
+                    self._pack_table(self.comments),
+                    self._pack_table(self.execs)]
+        fields = []
+        offset = self.HEADER.size
+        for section in sections:
+            fields += [offset, len(section)]
+            offset += len(section)
+        with open(filename, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.file_type.encode("ascii"),
+                                     self.cb.CORE_SIZE, *fields))
+            for section in sections:
+                f.write(section)
+
+    # Read a binary core image; f, if given, is the file, already open for binary reading.
+    # Raises ValueError if it isn't a good one.
+    @classmethod
+    def read(cls, cb, filename, f=None):
+        if f is None:
+            with open(filename, "rb") as f:
+                return cls.read(cb, filename, f)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(mm) < cls.HEADER.size:
+                raise ValueError("%s is too short to be a binary core file" % filename)
+            (magic, version, file_type, core_size, *fields) = cls.HEADER.unpack_from(mm)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError("%s is not a version %d binary core file" % (filename, cls.VERSION))
+            if core_size != cb.CORE_SIZE:
+                raise ValueError("%s: core size %d doesn't match %d" % (filename, core_size, cb.CORE_SIZE))
+            if max([fields[i] + fields[i + 1] for i in range(0, len(fields), 2)]) > len(mm):
+                raise ValueError("%s: binary core file is truncated" % filename)
+            sections = [mm[fields[i]:fields[i] + fields[i + 1]] for i in range(0, len(fields), 2)]
+        finally:
+            mm.close()
+        image = cls(cb, file_type.decode("ascii"))
+        image.bitmap[:] = sections[0][:core_size // 8]
+        image.memory = array.array('H', sections[0][core_size // 8:])
+        if sys.byteorder != "little":
+            image.memory.byteswap()
+        if len(sections[1]):
+            image.directives = sections[1].decode("utf-8").split('\n')
+        image._packed_tables = sections[2:5]
+        image._tables = [None, None, None]
+        return image
+
+    # Make a binary image from the lines of a text core file.  A tape bytestream with more than
+    # one block doesn't have a single memory image, so that raises ValueError.
+    # warn=False leaves out the warnings for bad lines, e.g., when read_core_file() has just
+    # given them; strict=True makes a bad @S or @N line a ValueError, as the image can't carry it.
+    @classmethod
+    def from_text(cls, cb, lines, filename, warn=True, strict=False):
+        image = cls(cb, '?')   # as for read_core_file(), the type isn't known until there's a row of words
+        cm = CorememClass(cb, use_default_tsr=False)   # a scratch memory to put the words in
+        cm._coremem[0][0] = cm._coremem[0][1] = None   # these aren't from the file
+        text = "".join(lines)
+        plain_spacing = text.isascii() and not any(c in text for c in _core_file_odd_space)
+        tables = CoreFileTablesClass(cb, warn=warn)
+        row_type = ("@C", "@T")
+        rows = []
+        blocks = 0
+        line_number = 1   # numbered as in read_core_file()'s messages
+        for ln in itertools.chain(lines, [""]):
+            line_number += 1
+            if ln.startswith(row_type):
+                if blocks == 0:
+                    image.file_type = ln[1]
+                    row_type = ln[:2]
+                    blocks = 1
+                elif blocks > 1:
+                    raise ValueError("%s: a binary core image can't hold more than one block" % filename)
+                rows.append(ln)
+                continue
+            if ln.startswith(("@C", "@T")):
+                cb.log.fatal("how can 'T' and 'C' be in the same file??")
+            if rows:
+                _read_core_rows(cm, cb, "\n".join(rows), line_number - len(rows), plain_spacing, 0)
+                rows = []
+            if ln.startswith(CoreFileTablesClass.LINE_TYPES):
+                tables.add_line(ln)
+                continue
+            line = ln.rstrip(' \t\n\r')
+            semicolon = line.find(';')
+            input_minus_comment = (line[:semicolon] if semicolon >= 0 else line).rstrip()
+            line_type = input_minus_comment[:2]
+            if len(line_type) == 2 and line_type[0] == '%' and line_type[1].isascii() and line_type[1].isalpha():
+                if input_minus_comment.startswith("%Blocknum") and blocks:
+                    blocks += 1
+                image.directives.append(input_minus_comment)
+        image.set_words(cm._coremem[0] + cm._coremem[1])
+        image.symbols.extend(tables.symbols())
+        image.comments.extend(tables.comments())
+        image.execs.extend(tables.execs())
+        if strict and tables.bad_lines:
+            raise ValueError("%s: %d badly-formed @S or @N lines" % (filename, tables.bad_lines))
+        return image
+
+    # Write the image out as a text core file
+    def write_text(self, fout):
+        fout.write("\n; *** %s ***\n" % ("Tape Bytestream" if self.file_type == 'T' else "Core Image"))
+        for directive in self.directives:
+            fout.write("%s\n" % directive)
+        words = self.get_words()
+        for addr in range(0, self.cb.CORE_SIZE, 8):
+            row = words[addr:addr + 8]
+            if row.count(None) != len(row):
+                fout.write("@%s%05o: %s\n" % (self.file_type, addr,
+                                              "".join(["%07o " % w if w is not None else " None   " for w in row])))
+        for (address, name) in self.symbols:
+            fout.write("@S%05o: %s\n" % (address, name))
+        for (address, exec) in self.execs:
+            fout.write("@E%05o: %s\n" % (address, exec))
+        for (address, comment) in self.comments:
+            fout.write("@N%05o: %s\n" % (address, comment))
+
+
+# The symbol, comment and exec tables from a core file.  read_core_file() just collects the @S,
+# @N and @E lines as it goes, along with the binary image, if there is one, and the tables are
+# parsed the first time something asks for them.  That way tools that only look at what's in
+# memory, like wwdiff and code-correlate, don't pay for them.
+class CoreFileTablesClass:
+    LINE_TYPES = ("@S", "@N", "@E")
+    IMAGE_TABLES = {"@S": "symbols", "@N": "comments", "@E": "execs"}
+
+    def __init__(self, cb, warn=True):
+        self.cb = cb
+        self.warn = warn   # warn about bad lines when they're parsed
+        self.bad_lines = 0
+        self.image = None  # a BinaryCoreImageClass, whose tables come after those from the text
+        self.lines = {line_type: [] for line_type in self.LINE_TYPES}
+        self._entries = {}
+        self._symtab = None
+        self._sym_to_addr_tab = None
+        self._exectab = None
+        self._symbol_index = None
+
+    def add_line(self, ln):
+        self.lines[ln[:2]].append(ln)
+
+    # (address, name), (address, comment) and (address, Python statement) lists, in file order
+    def symbols(self):
+        return self._get_entries("@S")
+
+    def comments(self):
+        return self._get_entries("@N")
+
+    def execs(self):
+        return self._get_entries("@E")
+
+    def _get_entries(self, line_type):
+        entries = self._entries.get(line_type)
+        if entries is None:
+            entries = []
+            for ln in self.lines[line_type]:
+                line = ln.rstrip(' \t\n\r')
+                if line_type == "@E":   # the whole line is the statement, semicolons and all
+                    tokens = _core_file_sep.split(line, maxsplit = 1)
+                else:
+                    semicolon = line.find(';')
+                    input_minus_comment = (line[:semicolon] if semicolon >= 0 else line).rstrip()
+                    # a comment is the rest of the line, but a symbol has to be one word
+                    tokens = _core_file_sep.split(input_minus_comment, maxsplit = 1 if line_type == "@N" else 0)
+                    if len(tokens) != 2:
+                        self.bad_lines += 1
+                        if self.warn:
+                            self.cb.log.warn("read_core parse error, read_core %s: tokens=%s" % (line_type, tokens))
+                        continue
+                entries.append((int(tokens[0][2:], 8), tokens[1]))
+            if self.image is not None:
+                entries += getattr(self.image, self.IMAGE_TABLES[line_type])
+            self._entries[line_type] = entries
+        return entries
+
+    # the tables in the form read_core_file() returns them
+    def symtab(self):
+        if self._symtab is None:
+            self._symtab = {}
+            self._sym_to_addr_tab = {}
+            for (address, name) in self.symbols():
+                self._symtab[address] = (name, '')  # save the name, and a marker saying we don't know the type
+                self._sym_to_addr_tab[name] = address
+        return self._symtab
+
+    def sym_to_addr_tab(self):
+        self.symtab()
+        return self._sym_to_addr_tab
+
+    def exectab(self):
+        if self._exectab is None:
+            self._exectab = {}
+            for (address, exec) in self.execs():
+                self._exectab[address] = exec
+                self.cb.log.info("ExecAddr=0o%02o: Python Exec Statement: %s" % (address, exec))
+        return self._exectab
+
+    def fill_comment_tab(self, commenttab):
+        for (address, comment) in self.comments():
+            commenttab[address] = comment
+
+    def symbol_index(self):
+        if self._symbol_index is None:
+            self._symbol_index = SymbolIndexClass(self.cb, self.symtab(), self.sym_to_addr_tab())
+        return self._symbol_index
+
+
+# An index of a program's labels, made once when the core file is loaded and shared by
+# everything that goes between labels and addresses: rl() in .exec statements, wwaddr_to_str()
+# for the trace and the flow graph, and the debugger.  Labels are by the address in the
+# instruction, 0 to CORE_SIZE-1; wwaddr_to_str() adds which bank Group A or B is mapped to.
+class SymbolIndexClass:
+    def __init__(self, cb, symtab, sym_to_addr_tab):
+        self.cb = cb
+        self.symtab = symtab              # address -> (label, type), as from read_core_file()
+        self.addr_of = sym_to_addr_tab    # label -> address, including the second label on an address
+        self.labels = [None] * cb.CORE_SIZE
+        for (address, (label, _type)) in symtab.items():
+            if 0 <= address < cb.CORE_SIZE:
+                self.labels[address] = label
+        self._decimal = None
+        self._addr_strs = None
+
+    # The strings wwaddr_to_str() gives for each address, leaving out the bank: the number with
+    # the label, e.g., "0o0100(loop)", the number alone, and the label alone, or the number if
+    # there's no label.  They depend on cb.decimal_addresses, so they're made when first asked for.
+    def addr_strs(self):
+        if self._decimal != self.cb.decimal_addresses:
+            self._decimal = self.cb.decimal_addresses
+            numbers = []
+            with_labels = []
+            label_only = []
+            for (address, label) in enumerate(self.labels):
+                decimal = ".%03d" % address if self._decimal else ''
+                number = "0o%04o%s" % (address, decimal)
+                numbers.append(number)
+                if label is not None:
+                    with_labels.append(number + "(" + label + ")")
+                    label_only.append(label)
+                else:
+                    with_labels.append(number)
+                    label_only.append("0o%o%s" % (address, decimal))
+            self._addr_strs = (with_labels, numbers, label_only)
+        return self._addr_strs
+
+
+# An on-disk cache of parsed text core files, so that tools that read the same core files over
+# and over, e.g., wwsim, wwdisasm, wwdiff and code-correlate in test scripts, only parse each
+# one the first time.  It's only used if it's asked for, with --CoreCache <dir>.
+# Each entry is the file's binary core image (see BinaryCoreImageClass), named for a hash of the
+# file's path, modification time, size and contents, so a changed file just misses.  Hits are
+# marked by updating the entry's modification time, and when the cache grows past its size
+# limit, the entries used longest ago are removed.
+# It only pays for files that are read over and over, and not for small ones.  Measured on the
+# Recovered-Tapes and Code-Samples core files, reading a file takes, in ms:
+#   file size     parsed      cache hit   cache miss
+#   under 4 KB    0.07-0.13   0.12-0.15   0.46-0.63
+#   4-8 KB        0.21        0.17        0.90
+#   8-32 KB       0.34-0.37   0.18-0.19   1.4
+#   32-64 KB      1.6         0.31        4.1
+# so files under min_bytes are left alone, and a bigger one has to be read from two to a dozen
+# or more times, depending on its size, to make up for the miss.  A miss costs a second parse,
+# to make the image, and writing the entry.
+# A file that draws any warnings isn't cached, so they come out every time it's read; so is a
+# tape bytestream with more than one block, which doesn't have a single memory image.
+class CoreCacheClass:
+    def __init__(self, cb, cache_dir, max_bytes=64 * 1024 * 1024, min_bytes=4096):
+        self.cb = cb
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.min_bytes = min_bytes   # smaller files parse faster than a cache entry loads
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = None   # size of the cache, as of the last look, plus what's been added since
+
+    def entry_name(self, filename, contents):
+        st = os.stat(filename)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(os.path.abspath(filename).encode("utf-8", "surrogateescape"))
+        h.update(struct.pack("<qq", st.st_mtime_ns, st.st_size))
+        h.update(contents)
+        return os.path.join(self.cache_dir, h.hexdigest() + ".bcore")
+
+    # Return the cached BinaryCoreImageClass for a core file, given its contents as bytes, or
+    # None if it isn't in the cache
+    def lookup(self, filename, contents):
+        if len(contents) < self.min_bytes:
+            return None
+        try:
+            entry = self.entry_name(filename, contents)
+            with open(entry, "rb") as f:
+                image = BinaryCoreImageClass.read(self.cb, entry, f)
+            os.utime(entry)
+        except (OSError, ValueError, struct.error):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return image
+
+    # Add a core file that's just been parsed from the given lines.  Anything that goes wrong
+    # just means it isn't cached.
+    def store(self, filename, contents, lines):
+        if len(contents) < self.min_bytes:
+            return
+        try:
+            image = BinaryCoreImageClass.from_text(self.cb, lines, filename, warn=False, strict=True)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entry = self.entry_name(filename, contents)
+            tmp = "%s.%d.tmp" % (entry, os.getpid())
+            image.write(tmp)
+            os.replace(tmp, entry)   # so another process never sees half an entry
+            if self.total_bytes is not None:
+                self.total_bytes += os.path.getsize(entry)
+            if self.total_bytes is None or self.total_bytes > self.max_bytes:
+                self.evict()
+        except (OSError, ValueError) as e:
+            self.cb.log.info("core cache: can't cache %s: %s" % (filename, e))
+
+    # If the cache is bigger than max_bytes, remove the least-recently-used entries until it's
+    # down to three quarters of that
+    def evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for e in it:
+                if e.name.endswith(".bcore"):
+                    st = e.stat()
+                    entries.append((st.st_mtime_ns, st.st_size, e.path))
+                    total += st.st_size
+        if total > self.max_bytes:
+            entries.sort()
+            for (_mtime, size, path) in entries:
+                if total <= self.max_bytes * 3 // 4:   # leave some room, so this isn't done on every miss
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+        self.total_bytes = total
+
+
 # input for the simulation comes from a "core" file giving the contents of memory
 # Sample core-file input format, from tape-decode or wwasm
 # The image file contains symbols as well as a bit of metadata for where it came from
@@ -1465,7 +2585,10 @@ class CorememClass:
 # [May 2026] This routine primarily returns a core-file, an array of memory contents.  But it's grown
 # an increasing list of metadata elements, which are not returned in a uniform way; This needs
 # some refactoring to make it clearer what's being returned!
-def read_core_file(cm, filename, cpu, cb, file_contents=None):
+# With tables=False, the symbol, comment and exec tables aren't made; symtab, sym_to_addr_tab and
+# exectab come back as None and cpu.CommentTab isn't touched.  Either way, cm.core_tables can
+# make them later.
+def read_core_file(cm, filename, cpu, cb, file_contents=None, tables=True):
     line_number = 1
     jumpto_addr = None
     ww_file = None
@@ -1480,15 +2603,16 @@ def read_core_file(cm, filename, cpu, cb, file_contents=None):
     isa = "isa1958"   # assume it's the 1958 instruction set unless there's a directive saying otherwise
     sim_params = cb.sim_params
 
-    symtab = {}
-    sym_to_addr_tab = {}
+    core_tables = CoreFileTablesClass(cb)
     switch_class = cpu.cpu_switches
     if cpu.cpu_switches is not None:
         cpu.cpu_switches.clear_switch_tab() 
     commenttab = cpu.CommentTab  # This is a BUG...  the cpu.CommentTab is not cleared with each read_core invocation...
-    exectab = {}
     filedesc = None
     address = 0   # for 'tape' / .ocore files, we don't have addresses, so just start at zero
+    image = None   # a BinaryCoreImageClass, if it's a binary core file or it's in the core cache
+    uncached = None   # the contents of a text core file to be added to the core cache
+    warn_count = cb.log.warn_count if cb.core_cache is not None else 0   # a file with warnings isn't cached
     cm.restore_toggle_default()
     sim_params.reset_simparams()
 
@@ -1502,78 +2626,75 @@ def read_core_file(cm, filename, cpu, cb, file_contents=None):
     # would contain the same string.
     if file_contents == None:   # This would be the normal case, so we use the file name to open the file.
         try:
-            filedesc = open(filename, 'r')
+            filedesc = open(filename, 'rb')
         except IOError:
             cb.log.fatal("read_core: Can't open file %s" % filename)
-        cb.log.info("core file %s" % filename)
+        if filedesc.read(len(BinaryCoreImageClass.MAGIC)) == BinaryCoreImageClass.MAGIC:
+            # a binary core image; the directives are done below as for a text file, then the
+            # image is loaded after the loop
+            cb.log.info("binary core file %s" % filename)
+            try:
+                image = BinaryCoreImageClass.read(cb, filename, filedesc)
+            except ValueError as e:
+                cb.log.fatal("read_core: %s" % e)
+            text = "\n".join(image.directives)
+        else:
+            cb.log.info("core file %s" % filename)
+            filedesc.seek(0)
+            contents = filedesc.read()
+            if cb.core_cache is not None:
+                image = cb.core_cache.lookup(filename, contents)
+            if image is not None:
+                text = "\n".join(image.directives)
+            else:
+                # as open(filename) would read it, but without setting up a text stream for a small file
+                text = contents.decode(locale.getpreferredencoding(False))
+                if '\r' in text:
+                    text = text.replace('\r\n', '\n').replace('\r', '\n')
+                uncached = contents
+        filedesc.close()
+        filedesc = text
     else:
-        filedesc = file_contents
+        # one string per line, each with or without its newline
+        filedesc = "\n".join(ln[:-1] if ln.endswith('\n') else ln for ln in file_contents)
+        text = filedesc
         cb.log.info("core core_string_array, starting with %s" % file_contents[0])
-    # Note at this point, the filedesc might be a pointer to an open file, or it might be a pointer
-    # to the head of an array of strings, one per line, representing what would otherwise be a core file.
-    for ln in filedesc:
-        line = ln.rstrip(' \t\n\r')  # strip trailing blanks and newline
+    plain_spacing = text.isascii() and not any(c in text for c in _core_file_odd_space)
+    # Note at this point, the filedesc is the text of a core file, either read from the file or put
+    # together from an array of strings, one per line, representing what would otherwise be a core file.
+    for (stretch, ln) in _core_file_chunks(filedesc):
+        if stretch is not None:  # lines of core memory contents
+            if file_type == '?':    # from here on, they're all @C, or all @T
+                file_type = stretch[1]
+            other = "@T" if file_type == 'C' else "@C"
+            if stretch.startswith(other) or ("\n" + other) in stretch:
+                cb.log.fatal("how can 'T' and 'C' be in the same file??")
+            core_word_count += _read_core_rows(cm, cb, stretch, line_number + 1, plain_spacing, blocknum)
+            line_number += stretch.count('\n') + 1
+            continue
         line_number += 1
+        if ln.startswith(CoreFileTablesClass.LINE_TYPES):  # @S symbol, @N comment or @E Python exec pseudo-op
+            core_tables.add_line(ln)
+            continue
+        line = ln.rstrip(' \t\n\r')  # strip trailing blanks and newline
         if len(line) == 0:  # skip blank lines
             continue
-        if len(line) and line[0] == ';':  # skip comment lines
+        if line[0] == ';':  # skip comment lines
             continue
-        if re.match(" \\*\\*\\* Core Image \\*\\*\\*", line):  # sigh, due to an error in wwutd, this now is a de-facto comment
+        if line.startswith(" *** Core Image ***"):  # sigh, due to an error in wwutd, this now is a de-facto comment
             continue
 
-        input_minus_comment = re.sub(";.*", "", line).rstrip()
-        if not re.match("^@N|^@C|^@T|^@S|^@E|^%[a-zA-Z]", input_minus_comment):
+        semicolon = line.find(';')
+        input_minus_comment = (line[:semicolon] if semicolon >= 0 else line).rstrip()
+        line_type = input_minus_comment[:2]
+
+        if line_type not in _core_file_line_types and \
+           not (len(line_type) == 2 and line_type[0] == '%' and line_type[1].isascii() and line_type[1].isalpha()):
             cb.log.warn("ignoring line %d: %s" % (line_number, line))
             continue     # ignore anything that doesn't start with:
                          # @C - code, @T - tape-stream, @N - comment, @S - symbol, %<something> - directive
 
-        if re.match("^@C|^@T", input_minus_comment):  # read a line of core memory contents
-            if re.match("^@C", input_minus_comment) and file_type == 'T' or \
-               re.match("^@T", input_minus_comment) and file_type == 'C':
-                cb.log.fatal("how can 'T' and 'C' be in the same file??")
-            file_type = input_minus_comment[1]
-            tokens = re.split("[: \t][: \t]*", input_minus_comment)
-            # print "tokens:", tokens
-            if len(tokens[0]) == 0:
-                cb.log.warn("read_core parse error, read_core @C/@T: tokens=%s" % tokens)
-                continue
-            # if it's actually a binary core file, pick up the address from @C or @T
-            if re.match("^@C|^@T", input_minus_comment):
-                address = int(tokens[0][2:], 8)
-            for token in tokens[1:]:
-                if token != "None":
-                    try:
-                        cm.wr(address, int(token, 8), force=True, track=blocknum)
-                    except ValueError:
-                        cb.log.fatal(" invalid number '%s' in line %d: \"%s\"" % (token, line_number, line))
-                    core_word_count += 1
-                address += 1
-        elif re.match("^@S", input_minus_comment):  # read a line with a single symbol
-            tokens = re.split("[: \t][: \t]*", input_minus_comment)
-            # print "tokens:", tokens
-            if len(tokens) != 2:
-                cb.log.warn("read_core parse error, read_core @S: tokens=%s" % tokens)
-                continue
-            address = int(tokens[0][2:], 8)
-            symtab[address] = (tokens[1], '')  # save the name, and a marker saying we don't know the type
-            sym_to_addr_tab[tokens[1]] = address
-        elif re.match("^@N", input_minus_comment):  # read a line with a comment indexed by the core address
-            tokens = re.split("[: \t][: \t]*", input_minus_comment, maxsplit = 1)
-            # print "tokens:", tokens
-            if len(tokens) != 2:
-                cb.log.warn("read_core parse error, read_core @N: tokens=%s" % tokens)
-                continue
-            address = int(tokens[0][2:], 8)
-            commenttab[address] = tokens[1]  # save the string
-
-        elif re.match("^@E", input_minus_comment):   # Python exec pseudo-op
-            tokens = re.split("[: \t][: \t]*", line, maxsplit = 1)
-            address = int(tokens[0][2:], 8)
-            exec = tokens[1]
-            exectab[address] = exec
-            cb.log.info("ExecAddr=0o%02o: Python Exec Statement: %s" %(address, exec) )
-
-        elif re.match("^%Switch", input_minus_comment):
+        if input_minus_comment.startswith("%Switch"):
             tokens = input_minus_comment.split()
             if switch_class is None:
                 cb.log.fatal("Read Core File: %%Switch directive, but no switch_class")
@@ -1581,49 +2702,49 @@ def read_core_file(cm, filename, cpu, cb, file_contents=None):
             if ret != 0:
                 cb.log.warn("Errors setting switches")
 
-        elif re.match("^%JumpTo", input_minus_comment):
+        elif input_minus_comment.startswith("%JumpTo"):
             tokens = input_minus_comment.split()
             jumpto_addr = int(tokens[1], 8)
             cb.log.info("corefile JumpTo address = 0%oo" % jumpto_addr)
-        elif re.match("^%File", input_minus_comment):
+        elif input_minus_comment.startswith("%File"):
             tokens = input_minus_comment.split()
             if len(tokens) > 1:
                 ww_file = tokens[1]
                 cb.log.info("Whirlwind tape file name: %s" % ww_file)
-        elif re.match("^%TapeID", input_minus_comment):
+        elif input_minus_comment.startswith("%TapeID"):
             tokens = input_minus_comment.split()
             if len(tokens) > 1:
                 ww_tapeid = tokens[1]
                 cb.log.info("Whirlwind tape identifier: %s" % ww_tapeid)
-        elif re.match("^%Hash:", input_minus_comment):
+        elif input_minus_comment.startswith("%Hash:"):
             tokens = input_minus_comment.split()
             if len(tokens) > 1:
                 ww_hash = tokens[1]
             else:
                 cb.log.warn("read_core: missing arg to %Hash")
         # identifies any thing that might be a Flexo Character string in the image
-        elif re.match("^%String:", input_minus_comment):
+        elif input_minus_comment.startswith("%String:"):
             tokens = input_minus_comment.split()
             if len(tokens) > 1:
                 ww_strings += tokens[1] + '\n'
             else:
                 cb.log.warn("read_core: missing arg to %String")
-        elif re.match("^%Stats", input_minus_comment):  # put the Colon back in here!
+        elif input_minus_comment.startswith("%Stats"):  # put the Colon back in here!
             tokens = input_minus_comment.split(' ', 1)
             if len(tokens) > 1:
                 ww_stats = tokens[1]
             else:
                 cb.log.warn("read_core: missing arg to %%Stats")
-        elif re.match("^%Blocknum", input_minus_comment):
+        elif input_minus_comment.startswith("%Blocknum"):
             tokens = input_minus_comment.split()
             blocknum = int(tokens[1], 8)
             cb.log.info("starting corefile blocknum 0%oo" % blocknum)
-        elif re.match("^%ISA:", input_minus_comment):  # "isa" is a special case that needs to be recorded for the asm
+        elif input_minus_comment.startswith("%ISA:"):  # "isa" is a special case that needs to be recorded for the asm
             tokens = input_minus_comment.split()
             isa = tokens[1]
             sim_params.set_simparam("isa", isa)
             cb.log.info("Setting instruction set architecture to '%s'" % isa)
-        elif re.match("^%DbWgt:", input_minus_comment):  # On-screen Debug Widget
+        elif input_minus_comment.startswith("%DbWgt:"):  # On-screen Debug Widget
             # This directive says to put a real-time debug widget on the screen if the CRT is opened
             # We have to parse the items later to get all the symbolic addresses and their translations at once
             # Format:  %DbWgt: <addr> [increment]
@@ -1631,11 +2752,26 @@ def read_core_file(cm, filename, cpu, cb, file_contents=None):
             if len(args) < 1 or len(args) > 5:
                 cb.log.warn("read_core: %%DbWgt takes from one to five args, got %d" % len(args))
             screen_debug_widgets.append(args)
-        elif re.match("^%SimParam:", input_minus_comment):
+        elif input_minus_comment.startswith("%SimParam:"):
             sim_params.strToDict (input_minus_comment)  # add terms to the sim_param_dict
             pass
         else:
             cb.log.warn("read_core: unexpected line '%s' in %s, Line %d" % (line, filename, line_number))
+    if image is not None:
+        core_word_count += image.load(cm, blocknum)
+        file_type = image.file_type
+        core_tables.image = image
+    cm.core_tables = core_tables
+    if tables:
+        symtab = core_tables.symtab()
+        sym_to_addr_tab = core_tables.sym_to_addr_tab()
+        exectab = core_tables.exectab()
+        core_tables.fill_comment_tab(commenttab)
+    else:
+        symtab = sym_to_addr_tab = exectab = None
+    if uncached is not None and cb.core_cache is not None and cb.log.warn_count == warn_count and \
+       text.count("%Blocknum") <= 1:
+        cb.core_cache.store(filename, uncached, text.split('\n'))
 
     cm.metadata['strings'] = ww_strings
     cm.metadata['hash'] = ww_hash
@@ -1667,6 +2803,22 @@ def hash_to_fingerprint(hash_obj, word_count):
     return fp
 
 
+# The strings write_core puts in the comment on each row: the Flexo character for each
+# six-bit code, and the mnemonic (with the space after it) for each five-bit op code.  Made
+# on first use.
+_write_core_tables = None
+
+
+def _get_write_core_tables():
+    global _write_core_tables
+    if _write_core_tables is None:
+        flexo = FlexToCsyntaxFlascii()
+        op_table = InstructionOpTable()
+        _write_core_tables = ([flexo.decodeSingleChar(code) for code in range(64)],
+                              [op[0] + ' ' for op in op_table.op_decode])
+    return _write_core_tables
+
+
 # Output the Core Image
 # I modified this routine May 22, 2019 to retain its original function of writing out a memory image, but
 # also to write out an array of bytes simply representing the stream of bytes on a tape, with no decoding.
@@ -1674,8 +2826,7 @@ def hash_to_fingerprint(hash_obj, word_count):
 #  [Careful, there's another write_core in wwasm.py.  oops.]
 def write_core(cb, corelist, offset, byte_stream, ww_filename, ww_tapeid,
                jump_to, output_file, string_list, block_msg=None, stats_string='', fatal_fcn=None):
-    flexo = FlexToCsyntaxFlascii()
-    op_table = InstructionOpTable()
+    flexo_chars, op_columns = _get_write_core_tables()
     hash_obj = hashlib.md5()  # create an object to store the hash of the file contents
 
     file_size = 0
@@ -1689,12 +2840,14 @@ def write_core(cb, corelist, offset, byte_stream, ww_filename, ww_tapeid,
         filetype = "Tape Bytestream"
         tag = "@T"  # lines that start with %T are simply streams of bytes at an offset from the tape start
 
+    # a binary core image is made from the text, so it comes out exactly the same
+    binary = output_file is not None and output_file.endswith(".bcore")
     if output_file is None:
         fout = sys.stdout
     else:
         cb.log.info("Output Core File Name: %s" % output_file)
         try:
-            fout = open(output_file, 'wt')
+            fout = io.StringIO() if binary else open(output_file, 'wt', buffering=1 << 20)
         except IOError:
             msg = "can't open output file %s" % output_file
             # Passing in the fatal fcn allows us to intercept eg in wwutd
@@ -1713,52 +2866,57 @@ def write_core(cb, corelist, offset, byte_stream, ww_filename, ww_tapeid,
         fout.write('%%JumpTo 0%o\n' % jump_to)
     if stats_string != '':
         fout.write('%%Stats: %s\n' % stats_string)
+
+    # A full row of eight words is formatted in one go; rows with Nones in them, and the short
+    # row at the end of a bytestream, are put together a word at a time
+    columns = 8
+    full_row_format = tag + "%05o: " + "%07o " * columns + " ; %24s : %16s : %16s\n"
+    row_format = tag + "%05o: %s ; %24s : %16s : %16s\n"
     word_count = 0
     blocknum = 0
     for coremem in corelist:
-        columns = 8
-        addr = 0
         fout.write("%%Blocknum 0o%0o\n" % blocknum)
-        while (byte_stream is False and addr < cb.CORE_SIZE) or (byte_stream is True and addr < len(coremem)):
-            i = 0
-            non_null = 0  # count the non-null characters in each line
-            row = ''
-            flexo_string_low = ''
-            flexo_string_high = ''
-            op_string = ''
-            while i < columns:
-                if (addr+i) < len(coremem):
-                    m = coremem[addr+i]
-                else:
-                    m = None
-                    if byte_stream:
-                        break
-                if m is not None:
-                    row += "%07o " % m
-                    hash_obj.update(m.to_bytes(2, byteorder='big'))   # if the word is not Null, include it in the hash
-                    word_count += 1
-                    non_null += 1
-                    flexo_string_low += '%s' % flexo.decodeSingleChar (m & 0x3f)
-                    flexo_string_high += '%s' % flexo.decodeSingleChar ((m >> 10) & 0x3f)
-                    op = op_table.op_decode[m >> 11]
-                    op_string += '%s ' % op[0]
-                else:
-                    row += " None   "
-                    flexo_string_low += '  '
-                    flexo_string_high += '  '
-                    op_string += '  '
-                i += 1
-            if non_null:
-                fout.write('%s%05o: %s ; %24s : %16s : %16s\n' %
-                           (tag, addr + offset, row, op_string, flexo_string_low, flexo_string_high))
-                # ok, this is a bit weird, but I'm including the address in the hash.  WW code is not Position Indep!
-                hash_obj.update((addr + offset).to_bytes(2, byteorder='big'))
-
-            addr += columns
-            # core files may have embedded "None" values, but a bytestream ends
-            # with the first Null character in the array
-            if non_null == 0 and byte_stream is True:
-                break
+        if byte_stream:
+            words = coremem
+        else:
+            # a core image always covers all of core, with Nones past the end of the list
+            words = list(coremem[:cb.CORE_SIZE])
+            words += [None] * (cb.CORE_SIZE - len(words))
+        lines = []
+        # The hash covers each word that's not Null and then the address of its row, in that
+        # order, as big-endian sixteen-bit numbers.  They're collected for the whole block and
+        # hashed at once.
+        hashed = array.array('H')
+        for addr in range(0, len(words), columns):
+            row = words[addr:addr + columns]
+            non_null = len(row) - row.count(None)
+            if non_null == 0:
+                # core files may have embedded "None" values, but a bytestream ends
+                # with the first Null character in the array
+                if byte_stream:
+                    break
+                continue
+            if non_null == columns:
+                lines.append(full_row_format % (addr + offset, *row,
+                                                ''.join([op_columns[m >> 11] for m in row]),
+                                                ''.join([flexo_chars[m & 0o77] for m in row]),
+                                                ''.join([flexo_chars[(m >> 10) & 0o77] for m in row])))
+                hashed.extend(row)
+            else:
+                lines.append(row_format %
+                             (addr + offset,
+                              ''.join(["%07o " % m if m is not None else " None   " for m in row]),
+                              ''.join([op_columns[m >> 11] if m is not None else '  ' for m in row]),
+                              ''.join([flexo_chars[m & 0o77] if m is not None else '  ' for m in row]),
+                              ''.join([flexo_chars[(m >> 10) & 0o77] if m is not None else '  ' for m in row])))
+                hashed.extend([m for m in row if m is not None])
+            # ok, this is a bit weird, but I'm including the address in the hash.  WW code is not Position Indep!
+            hashed.append(addr + offset)
+            word_count += non_null
+        fout.write(''.join(lines))
+        if sys.byteorder == 'little':
+            hashed.byteswap()
+        hash_obj.update(hashed.tobytes())
         blocknum += 1
 
     h = hash_to_fingerprint(hash_obj, word_count)
@@ -1769,6 +2927,16 @@ def write_core(cb, corelist, offset, byte_stream, ww_filename, ww_tapeid,
         for s in string_list:
             fout.write("%%String: %s\n" % s)
 
+    if binary:
+        try:
+            image = BinaryCoreImageClass.from_text(cb, fout.getvalue().split('\n'), output_file)
+            image.write(output_file)
+        except (ValueError, IOError) as e:
+            msg = "can't write output file %s: %s" % (output_file, e)
+            if fatal_fcn is not None:
+                fatal_fcn (msg)
+            else:
+                cb.log.fatal (msg)
     if output_file is not None:  # don't close stdout!
         fout.close()
 
@@ -1823,6 +2991,85 @@ class InstructionOpTable:
             "CL": [["clc", "clh"], ["cycle left and clear", "cycle left and hold"]]
             }
 
+# Flexowriter and Teletype output normally piles up in memory and is printed when the simulation
+# ends.  With --FlexoOutput or --TeletypeOutput it goes to an output sink instead, as the program
+# prints it, so a long listing run streams its output and doesn't grow without limit.
+# A sink is named by a string:
+#   "-" or "stdout"       the console
+#   "|command"            a pipe into a shell command, e.g., "|lpr"
+#   "printer:host[:port]" a socket to a printer server, e.g., Py/Tools/ww-printer-server.py
+#   anything else         a file name
+# Output is written as it arrives, or if batch_chars is set, in batches of up to that many
+# characters, which is also the most that will be held in memory.
+PRINTER_SERVER_PORT = 65447   # the next prime after the remote scope port
+
+
+class OutputSinkClass:
+    def __init__(self, cb, spec: str, batch_chars: int = 0):
+        self.cb = cb
+        self.spec = spec
+        self.batch_chars = batch_chars
+        self.pending = []
+        self.pending_chars = 0
+        self.chars_written = 0
+        self.failed = False
+        self.proc = None
+        self.sock = None
+        try:
+            if spec == "-" or spec == "stdout":
+                self.fd = sys.stdout
+            elif spec.startswith("|"):
+                self.proc = subprocess.Popen(spec[1:], shell=True, stdin=subprocess.PIPE, text=True)
+                self.fd = self.proc.stdin
+            elif spec.startswith("printer:"):
+                (host, _sep, port) = spec[len("printer:"):].partition(":")
+                self.sock = socket.create_connection((host if host else "localhost",
+                                                      int(port) if port else PRINTER_SERVER_PORT))
+                self.fd = self.sock.makefile("w", encoding="utf-8")
+            else:
+                self.fd = open(spec, "w")
+        except (OSError, ValueError) as e:
+            cb.log.fatal("Can't open output %s: %s" % (spec, e))
+
+    def write(self, text: str):
+        if len(text) == 0:
+            return
+        self.pending.append(text)
+        self.pending_chars += len(text)
+        if self.pending_chars >= self.batch_chars:
+            self.flush()
+
+    def flush(self):
+        if self.pending_chars == 0:
+            return
+        text = "".join(self.pending)
+        self.pending = []
+        self.pending_chars = 0
+        if self.failed:
+            return
+        try:
+            self.fd.write(text)
+            self.fd.flush()
+            self.chars_written += len(text)
+        except OSError as e:
+            # don't stop the simulation just because the printer went away
+            self.cb.log.warn("Output to %s failed: %s; further output is discarded" % (self.spec, e))
+            self.failed = True
+
+    def close(self):
+        self.flush()
+        if self.fd is sys.stdout:
+            return
+        try:
+            self.fd.close()
+            if self.sock is not None:
+                self.sock.close()
+        except OSError:
+            pass
+        if self.proc is not None:
+            self.proc.wait()
+
+
 # See manual 2M-0277 pg 46 for flexowriter codes and addresses
 # This class the Flexowriter output driver.
 # Translating between ASCII and Flex is handled by classes in wwflex.py.
@@ -1836,6 +3083,7 @@ class FlexoControlClass:
         self.flexoDecoder = FlexToCsyntaxFlascii()      # For out-of-context char lookup
         
         self.flexToFlexoWin: FlexToFlexoWin = None
+        self.output_sink: OutputSinkClass = None     # opened on the first character, if cb.flexo_output is set
         self.name = "Flexowriter"
         self.cb = cb   # what's the right way to do this??
         if log is not None:
@@ -1883,6 +3131,12 @@ class FlexoControlClass:
         # Only do the standard flex buffering if we have no flex window
         if self.flexToFlexoWin is not None:
             self.flexToFlexoWin.addCode (code)
+        elif self.cb.flexo_output is not None:
+            if self.output_sink is None:
+                self.output_sink = OutputSinkClass(self.cb, self.cb.flexo_output, self.cb.output_batch_chars)
+            self.flexoOut.addCode (code)
+            self.output_sink.write(self.flexoOut.getFlascii())
+            self.flexoOut.clearAsciiOut()
         else:
             self.flexoOut.addCode (code)
             if self.flexoLine.isNewline (code):
@@ -1916,6 +3170,12 @@ class FlexoControlClass:
     def clear_saved_output(self) -> str:
         return self.flexoOut.clearAsciiOut()
 
+    # called at sim termination to push out anything still waiting in the output sink
+    def close_output(self):
+        if self.output_sink is not None:
+            self.output_sink.close()
+            self.output_sink = None
+
 
 # The following class prints debug text on the CRT to display and adjust memory values
 # while the program runs.
@@ -2277,8 +3537,85 @@ def parse_xwin_geometry(cb, spec: str) -> Geometry:
 
 # ----------------------
 
+# Decide when the sim main loop should refresh the display and poll the panel.
+# Refreshing every few hundred instructions ties the frame rate to the speed of the host:
+# a fast laptop redraws the screen a thousand times a second, while a Raspberry Pi stutters.
+# Here the refresh is paced by the wall clock instead.  Reading the clock after every
+# instruction would cost more than it saves, so the main loop only asks every 'interval'
+# instructions, where the interval is adapted to the measured instruction rate so that
+# there are a few checks per frame.
+# A frame_rate of zero gives the old behavior, a refresh every fixed number of instructions,
+# which keeps a run repeatable from one host to the next.
+class DisplayRefreshClass:
+    def __init__(self, cb, frame_rate):
+        self.cb = cb
+        self.frame_rate = frame_rate
+        # Set the fixed interval to a prime number in an attempt to prevent a program
+        # loop from synchronizing with the panel update.  Checking the xwin stuff slows the
+        # Rasp Pi, so it's done less often in AnaScope mode
+        self.fixed_interval = 511
+        if cb.analog_display:
+            self.fixed_interval = 5003
+        self.checks_per_frame = 4
+        self.min_interval = 31
+        self.max_interval = 1000003
+        self.interval = self.fixed_interval
+        self.next_check = self.interval
+        self.frame_period = 1.0 / frame_rate if frame_rate else 0.0
+        self.inst_per_sec = 0.0
+        self.frames = 0
+        self.last_check_cycle = 0
+        self.last_check_time = time.monotonic()
+        self.next_frame_time = self.last_check_time + self.frame_period
+
+    # the caller's cycle count has been reset, e.g., by a Museum Mode state change
+    def restart(self, sim_cycle):
+        self.last_check_cycle = sim_cycle
+        self.last_check_time = time.monotonic()
+        self.next_check = sim_cycle + self.interval
+
+    # Called from the main loop once sim_cycle reaches next_check; returns True if it's
+    # time for a refresh, and sets next_check for the next call.
+    def frame_due(self, sim_cycle):
+        if self.frame_rate == 0:
+            self.next_check = sim_cycle + self.fixed_interval
+            self.frames += 1
+            return True
+
+        now = time.monotonic()
+        elapsed = now - self.last_check_time
+        cycles = sim_cycle - self.last_check_cycle
+        # A long gap means the sim was stopped or sitting in the debugger, which says
+        # nothing about how fast it runs
+        if 0.0 < elapsed < 1.0 and cycles > 0:
+            sample = cycles / elapsed
+            if self.inst_per_sec == 0.0:
+                self.inst_per_sec = sample
+            else:
+                self.inst_per_sec = 0.75 * self.inst_per_sec + 0.25 * sample
+            interval = int(self.inst_per_sec / (self.frame_rate * self.checks_per_frame))
+            self.interval = min(max(interval, self.min_interval), self.max_interval)
+        self.last_check_cycle = sim_cycle
+        self.last_check_time = now
+        self.next_check = sim_cycle + self.interval
+
+        if now < self.next_frame_time:
+            return False
+        self.next_frame_time += self.frame_period
+        if self.next_frame_time < now:  # fell behind; don't try to catch up with a burst of frames
+            self.next_frame_time = now + self.frame_period
+        self.frames += 1
+        return True
+
+
+# ----------------------
+
 
 class XwinCrtObject:
+    # a busy display can have tens of thousands of these on the screen at once
+    __slots__ = ('x0', 'y0', 'x1', 'y1', 'graphical_type', 'char_mask', 'expand',
+                 'red', 'green', 'blue', 'intensity')
+
     def __init__(self, x0, y0, x1, y1, graphical_type, char_mask, expand = 1.0):
         self.x0 = x0
         self.y0 = y0
@@ -2290,6 +3627,64 @@ class XwinCrtObject:
         self.red = 0     # RGB color range is zero to one
         self.green = 1.0   # default color is full green
         self.blue = 0
+        self.intensity = 0
+
+
+# A uniform grid over the light-gun points drawn recently, so a mouse click can be matched
+# against all of them rather than only the very last one, without scanning the screen.
+# The cell size is the mouse hit box, so any point within the box around the click is in
+# one of the nine cells around it.
+# Points are kept for the current and the previous refresh; a point drawn just before a
+# refresh can still be hit by a read just after it.
+class LightGunGridClass:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}       # (col, row) -> list of (seq, obj), in drawing order
+        self.old_cells = {}   # the same, for points drawn before the last refresh
+        self.seq = 0          # drawing-order sequence number of the most recent point
+
+    # add a newly-drawn point, returning its sequence number
+    def add(self, obj):
+        self.seq += 1
+        key = (int(obj.x0 // self.cell_size), int(obj.y0 // self.cell_size))
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [(self.seq, obj)]
+        else:
+            cell.append((self.seq, obj))
+        return self.seq
+
+    def new_frame(self):
+        self.old_cells = self.cells
+        self.cells = {}
+
+    # Return (seq, obj) for the most recently drawn point within the hit box around (x, y),
+    # ignoring points drawn before sequence number min_seq; None if nothing was hit
+    def hit(self, x, y, min_seq=0):
+        col = int(x // self.cell_size)
+        row = int(y // self.cell_size)
+        best_seq = min_seq - 1
+        best = None
+        for cells in (self.cells, self.old_cells):
+            for c in (col - 1, col, col + 1):
+                for r in (row - 1, row, row + 1):
+                    cell = cells.get((c, r))
+                    if cell is None:
+                        continue
+                    # newest first; stop at the first one in the box, or once they're too old
+                    for i in range(len(cell) - 1, -1, -1):
+                        (seq, obj) = cell[i]
+                        if seq <= best_seq:
+                            break
+                        if abs(obj.x0 - x) < self.cell_size and abs(obj.y0 - y) < self.cell_size:
+                            best_seq = seq
+                            best = cell[i]
+                            break
+        return best
+
+    def clear(self):
+        self.cells = {}
+        self.old_cells = {}
 
 
 # This class manages the emulation of the Whirlwind "scope" display
@@ -2342,6 +3737,7 @@ class XwinCrt:
                 win_y_size = win_y_size / 4
 
             self.WIN_MOUSE_BOX = self.WIN_MAX_COORD / 50.0
+            self.light_gun_grid = LightGunGridClass(self.WIN_MOUSE_BOX)
 
             win_name = "Whirlwind CoreFile: %s" % cb.CoreFileName
             self.win = self.gfx.GraphWin(win_name, self.WIN_MAX_COORD, win_y_size, autoflush=False)
@@ -2372,7 +3768,14 @@ class XwinCrt:
 
             self.BRIGHT = 20
             self.DARK = 0
-            self.screen_brightness = {}  # a list of graphical elements, with corresponding brightness
+            # The graphical elements on the screen, keyed by what they look like, i.e., position,
+            # shape and color.  Each element carries its own brightness, so a program that
+            # repaints the same dot or character on every refresh just brightens the element
+            # that's already there rather than piling up copies of it.
+            self.screen_brightness = {}
+            # Hard limit on the number of elements kept on the screen; if a program paints
+            # faster than the phosphor fades, the dimmest ones are dropped to make room
+            self.max_screen_objects = 20000
             self.fade_delay_param = cb.crt_fade_delay_param
             self._fade_delay = self.fade_delay_param
 
@@ -2385,13 +3788,13 @@ class XwinCrt:
                 self.WW_CHAR_HSTROKE = int(25.6 / 2.0 * (self.WIN_MAX_COORD / (self.WW_MAX_COORD * 2.0)))  # should be 20.0 in 'expand'
                 self.WW_CHAR_VSTROKE = int(19.2 / 2.0 * (self.WIN_MAX_COORD / (self.WW_MAX_COORD * 2.0)))  # should be 15.00
 
-        # The Whirlwind CRT character generator uses a seven-segment format with a bit in a seven-bit
-        # word to indicate each segment.  This list defines the sequence in which the bits are
-        # converted into line segments
-        self.WW_CHAR_SEQ = ("down", "right", "up", "left", "up", "right", "down")
-
         # recall the most recent light gun display point so it can be erased when the next one comes up
         self.last_pen_point = None
+        # A click on any of the last few points counts as a hit on the point the program is
+        # checking, so a program can read the gun a few points after drawing its target
+        self.light_gun_lag = 4
+        # drawing-order sequence number of the point hit by the last successful light gun read
+        self.last_gun_hit_seq = None
         # remember the location of the last unprocessed mouse click
         self.last_mouse = None
         self.last_button = 0
@@ -2456,16 +3859,19 @@ class XwinCrt:
     def ww_draw_char(self, ww_x, ww_y, mask, expand, scope=None):
         if scope is None:
             scope = self.cb.SCOPE_MAIN
+        if self.cb.scope_recorder is not None:
+            self.cb.scope_recorder.char(ww_x, ww_y, mask, expand)
         if self.cb.ana_scope:
             self.cb.ana_scope.drawChar(ww_x, ww_y, mask, expand, self, scope=scope)
         else:
             if self.cb.remote_scope is not None:
-                cmd = "C %d %d %d %d E " % (ww_x, ww_y, mask, expand)
-                self.cb.remote_scope.send (cmd)
+                self.cb.remote_scope.char (ww_x, ww_y, mask, expand)
             if not self.cb.remote_scope_only:
                 x0, y0 = self.ww_to_xwin_coords(ww_x, ww_y)
-                obj = XwinCrtObject(x0, y0, 0, 0, 'C', mask, expand = expand)
-                self.screen_brightness[obj] = self.BRIGHT
+                key = ('C', x0, y0, mask, expand)
+                obj = self._repaint(key)
+                if obj is None:
+                    self._paint(key, XwinCrtObject(x0, y0, 0, 0, 'C', mask, expand = expand))
         pass
 
     # Display Scope Vector Generator
@@ -2490,25 +3896,30 @@ class XwinCrt:
         if scope is None:
             scope = self.cb.SCOPE_MAIN
         self.cb.log.info("ww_draw_line: pt=(%d,%d) len=(%d,%d), scope=%d" % (ww_x0, ww_y0, ww_xd, ww_yd, scope)) 
+        if self.cb.scope_recorder is not None:
+            self.cb.scope_recorder.line(ww_x0, ww_y0, ww_xd, ww_yd)
         if self.cb.ana_scope:
                 self.cb.ana_scope.drawVector(ww_x0, ww_y0, ww_xd>>2, ww_yd>>2, scope=scope)
         else:
             if self.cb.remote_scope is not None:
-                cmd = "L %d %d %d %d E " % (ww_x0, ww_y0, ww_xd, ww_yd)
-                self.cb.remote_scope.send (cmd)
+                self.cb.remote_scope.line (ww_x0, ww_y0, ww_xd, ww_yd)
             if not self.cb.remote_scope_only:
                 ww_x1 = ww_x0 + ww_xd
                 ww_y1 = ww_y0 + ww_yd
                 x0, y0 = self.ww_to_xwin_coords(ww_x0, ww_y0)
                 x1, y1 = self.ww_to_xwin_coords(ww_x1, ww_y1)
-                obj = XwinCrtObject(x0, y0, x1, y1, 'L', 0)
-                self.screen_brightness[obj] = self.BRIGHT
+                key = ('L', x0, y0, x1, y1)
+                obj = self._repaint(key)
+                if obj is None:
+                    self._paint(key, XwinCrtObject(x0, y0, x1, y1, 'L', 0))
         pass
 
     def ww_draw_point(self, ww_x, ww_y, color=(0.0, 1.0, 0.0), scope=None, light_gun=False):  # default color is green
         if scope is None:
             scope = self.cb.SCOPE_MAIN
         self.cb.log.info("ww_draw_point: x=%d, y=%d, scope=%d, gun_enable=%d" % (ww_x, ww_y, scope, light_gun)) 
+        if self.cb.scope_recorder is not None:
+            self.cb.scope_recorder.point(ww_x, ww_y, color[0], color[1], color[2])
         if self.cb.ana_scope:
             self.cb.ana_scope.drawPoint(ww_x, ww_y, scope=scope)
             if light_gun:
@@ -2518,20 +3929,53 @@ class XwinCrt:
             green = color[1]
             blue = color[2]
             if self.cb.remote_scope is not None:
-                cmd = "D %d %d %f %f %f E " % (ww_x, ww_y, red, green, blue)
-                self.cb.remote_scope.send (cmd)
+                self.cb.remote_scope.point (ww_x, ww_y, red, green, blue)
             if not self.cb.remote_scope_only:
                 x0, y0 = self.ww_to_xwin_coords(ww_x, ww_y)
-                obj = XwinCrtObject(x0, y0, 0, 0, 'D', 0)
-                obj.red = red
-                obj.green = green
-                obj.blue = blue
-                self.screen_brightness[obj] = self.BRIGHT
+                key = ('D', x0, y0, red, green, blue)
+                obj = self._repaint(key)
+                if obj is None:
+                    obj = XwinCrtObject(x0, y0, 0, 0, 'D', 0)
+                    obj.red = red
+                    obj.green = green
+                    obj.blue = blue
+                    self._paint(key, obj)
                 if light_gun:
                     self.last_pen_point = obj  # remember the point so it can be undrawn later
+                    self.light_gun_grid.add(obj)
         pass
     
+    # If an element that looks just like this one is already on the screen, bring it back
+    # to full brightness and return it, otherwise return None.
+    # The element is moved to the end of the dict, so among elements of equal brightness,
+    # the dict stays in order of when they were last painted.
+    def _repaint(self, key):
+        obj = self.screen_brightness.pop(key, None)
+        if obj is not None:
+            obj.intensity = self.BRIGHT
+            self.screen_brightness[key] = obj
+        return obj
+
+    # add a new element to the screen at full brightness
+    def _paint(self, key, obj):
+        if len(self.screen_brightness) >= self.max_screen_objects:
+            self._evict_dimmest()
+        obj.intensity = self.BRIGHT
+        self.screen_brightness[key] = obj
+
+    # Make room on a full screen by dropping the dimmest tenth of the elements; they're
+    # the ones closest to fading out anyway.  nsmallest is stable, so ties go to the
+    # elements painted longest ago.
+    def _evict_dimmest(self):
+        count = max(1, self.max_screen_objects // 10)
+        victims = heapq.nsmallest(count, self.screen_brightness.items(), key=lambda item: item[1].intensity)
+        for key, obj in victims:
+            del self.screen_brightness[key]
+        self.cb.log.info("CRT display full; dropped %d dimmest elements" % len(victims))
+
     def ww_highlight_point(self):
+        if self.cb.scope_recorder is not None:
+            self.cb.scope_recorder.highlight()
         if self.last_pen_point is not None:
             if not self.cb.remote_scope_only:
                 x0 = self.last_pen_point.x0
@@ -2541,10 +3985,18 @@ class XwinCrt:
                 c.draw(self.win)
                 self.last_pen_point = None
             if self.cb.remote_scope is not None:
-                cmd = "H E "
-                self.cb.remote_scope.send (cmd)
+                self.cb.remote_scope.highlight()
         pass
 
+    # Find the light-gun point under a mouse click, from among the points drawn in the last
+    # light_gun_lag points; returns the (drawing-order sequence number, point) or None
+    def ww_light_gun_hit(self, pt):
+        grid = self.light_gun_grid
+        hit = grid.hit(pt.getX(), pt.getY(), min_seq=grid.seq - self.light_gun_lag)
+        if hit is not None:
+            self.last_gun_hit_seq = hit[0]
+        return hit
+
     # check the light gun for a hit
     # Note that management of the Mouse 'light gun' is quite different from the optical gun on an analog scope.
     # With the mouse, this routine has to check the position of the mouse to see if it's inside the bounding box
@@ -2608,35 +4060,16 @@ class XwinCrt:
                                                       pt.getX(), pt.getY())))
         return self.cb.NO_ALARM, pt, button
 
+    # Only the lit strokes are drawn; the stroke geometry comes from the shared glyph cache
     def _render_char(self, x, y, mask, color, expand):
-        last_x = x
-        last_y = y
-        for i in range(0, 7):
-            if self.WW_CHAR_SEQ[i] == "down":
-                y = last_y + self.WW_CHAR_VSTROKE * expand
-            elif self.WW_CHAR_SEQ[i] == "up":
-                y = last_y - self.WW_CHAR_VSTROKE * expand
-            elif self.WW_CHAR_SEQ[i] == "left":
-                x = last_x - self.WW_CHAR_HSTROKE * expand
-            elif self.WW_CHAR_SEQ[i] == "right":
-                x = last_x + self.WW_CHAR_HSTROKE * expand
-            else:
-                print(("OMG its a bug! WW_CHAR_SEQ[%d]=%s " % (i, self.WW_CHAR_SEQ[i])))
-
-            # I should optimmize out drawing the "black" segments
-            if mask & 1 << (6 - i):
-                seg_color = color
-            else:
-                seg_color = "Black"
-
-            char_segment = self.gfx.Line(self.gfx.Point(last_x, last_y), self.gfx.Point(x, y))
-            char_segment.setOutline(seg_color)
-            if expand < 1.0 :
-                expand = 1.0
-            char_segment.setWidth(int(expand))
+        width = int(expand) if expand >= 1.0 else 1
+        strokes = ww_glyphs.glyph_strokes.strokes(mask, expand, self.WW_CHAR_HSTROKE, self.WW_CHAR_VSTROKE)
+        for (x0, y0, x1, y1, new_run) in strokes:
+            # glyph offsets have y going up, xwin coords have y going down
+            char_segment = self.gfx.Line(self.gfx.Point(x + x0, y - y0), self.gfx.Point(x + x1, y - y1))
+            char_segment.setOutline(color)
+            char_segment.setWidth(width)
             char_segment.draw(self.win)
-            last_x = x
-            last_y = y
 
     # This routine should be called "periodically", i.e., at constant-time intervals
     # For now, I think that means "every N instruction cycles"
@@ -2645,14 +4078,19 @@ class XwinCrt:
     # Then go on to refresh the screen
 
     def ww_scope_update(self, cm, cb):
+        if self.cb.scope_recorder is not None:
+            self.cb.scope_recorder.update()
         if self.cb.remote_scope is not None:
             self.cb.remote_scope.update()
+        if self.cb.ana_scope:
+            self.cb.ana_scope.updateDisplay()
 
         if self.cb.remote_scope_only:
             return self.cb.NO_ALARM
 
         if self.win is None:   # all this stuff only works on a laptop display, not a CRT display
             return self.cb.NO_ALARM
+        self.light_gun_grid.new_frame()
 
         if self.polling_mouse is False:
             pt, button = self.win.checkMouse()
@@ -2677,51 +4115,51 @@ class XwinCrt:
         if cb.analog_display:
             return self.cb.NO_ALARM
 
-        for i in range(self.DARK, self.BRIGHT+1):
-            for obj in self.screen_brightness:
-                x0 = obj.x0
-                y0 = obj.y0
-                x1 = obj.x1
-                y1 = obj.y1
-                graphical_type = obj.graphical_type  # L=line, D=dot, C=char
-                char_mask = obj.char_mask  # bit map of seven-seg character
-                intensity = self.screen_brightness[obj]
-                if intensity == i:
-                    # print("draw", obj, intensity)
-                    red = obj.red * intensity * (256 / (self.BRIGHT - self.DARK))  # I'm sure I'm not scaling the color properly
-                    green = obj.green * intensity * (256 / (self.BRIGHT - self.DARK))
-                    blue = obj.blue * intensity * (256 / (self.BRIGHT - self.DARK))
-                    if red > 255:
-                        red = 255
-                    if green > 255:
-                        green = 255
-                    if blue > 255:
-                        blue = 255
-                    color = self.gfx.color_rgb(int(red), int(green), int(blue))
-                    if graphical_type == 'D':  # it's a Dot
-                        # We've played some with the size of the spot.
-                        # for Air Defense, I wanted the yellow spot representing the second WW display to be
-                        # prominent, so I made it larger.
-                        # Once we added "Slow Motion" mode, the active Green spot became too hard to see too, so
-                        # I'm making that larger too.  Once the spot fades, it returns to the small size.
-                        spot_size = 2 * cb.gfx_scale_factor  # default circle diameter
-                        if red != 0 or blue != 0 or green > 254:  # hack alert ; if the color is not All Green, expand the size
-                            spot_size *= 2
-                        c = self.gfx.Circle(self.gfx.Point(x0, y0), spot_size)  # was 5 # the last arg is the circle dimension
-                        c.setFill(color)
-                        c.draw(self.win)
-                        # print("Draw-Dot (%d,%d) rgb=%3.2f;%3.2f;%3.2f, intensity=%d" %
-                        #       (x0, y0, red, green, blue, intensity))
-
-                    elif graphical_type == 'L':  # it's a line
-                        #    self._ww_draw_line(x0, y0, x1, y1, color)
-                        scope_line = self.gfx.Line(self.gfx.Point(x0, y0), self.gfx.Point(x1, y1))
-                        scope_line.setOutline(color)
-                        scope_line.setWidth(4)
-                        scope_line.draw(self.win)
-
-                    elif graphical_type == 'C':  # it's a char
-                        self._render_char(x0, y0, char_mask, color, obj.expand)
+        # draw from dimmest to brightest, so bright elements end up on top
+        # (sorted() is stable, so elements of equal brightness are drawn oldest first)
+        for obj in sorted(self.screen_brightness.values(), key=lambda obj: obj.intensity):
+            x0 = obj.x0
+            y0 = obj.y0
+            x1 = obj.x1
+            y1 = obj.y1
+            graphical_type = obj.graphical_type  # L=line, D=dot, C=char
+            char_mask = obj.char_mask  # bit map of seven-seg character
+            intensity = obj.intensity
+            # print("draw", obj, intensity)
+            red = obj.red * intensity * (256 / (self.BRIGHT - self.DARK))  # I'm sure I'm not scaling the color properly
+            green = obj.green * intensity * (256 / (self.BRIGHT - self.DARK))
+            blue = obj.blue * intensity * (256 / (self.BRIGHT - self.DARK))
+            if red > 255:
+                red = 255
+            if green > 255:
+                green = 255
+            if blue > 255:
+                blue = 255
+            color = self.gfx.color_rgb(int(red), int(green), int(blue))
+            if graphical_type == 'D':  # it's a Dot
+                # We've played some with the size of the spot.
+                # for Air Defense, I wanted the yellow spot representing the second WW display to be
+                # prominent, so I made it larger.
+                # Once we added "Slow Motion" mode, the active Green spot became too hard to see too, so
+                # I'm making that larger too.  Once the spot fades, it returns to the small size.
+                spot_size = 2 * cb.gfx_scale_factor  # default circle diameter
+                if red != 0 or blue != 0 or green > 254:  # hack alert ; if the color is not All Green, expand the size
+                    spot_size *= 2
+                c = self.gfx.Circle(self.gfx.Point(x0, y0), spot_size)  # was 5 # the last arg is the circle dimension
+                c.setFill(color)
+                c.draw(self.win)
+                # print("Draw-Dot (%d,%d) rgb=%3.2f;%3.2f;%3.2f, intensity=%d" %
+                #       (x0, y0, red, green, blue, intensity))
+
+            elif graphical_type == 'L':  # it's a line
+                #    self._ww_draw_line(x0, y0, x1, y1, color)
+                scope_line = self.gfx.Line(self.gfx.Point(x0, y0), self.gfx.Point(x1, y1))
+                scope_line.setOutline(color)
+                scope_line.setWidth(4)
+                scope_line.draw(self.win)
+
+            elif graphical_type == 'C':  # it's a char
+                self._render_char(x0, y0, char_mask, color, obj.expand)
         self.gfx.update()
         # step two, decay the brightness of each object
         # In the normal case, we dim each object one step at a time until it goes dark,
@@ -2733,22 +4171,22 @@ class XwinCrt:
         if normal_fade:
             if self._fade_delay <= 0:
                 self._fade_delay = self.fade_delay_param
-                for obj in self.screen_brightness:
-                    intensity = self.screen_brightness[obj]
+                # When in "Museum Mode" and "Slow Motion" state, we want to fade the
+                # image, but not all the way to zero.
+                mm = cb.museum_mode
+                slow = mm and mm.states[mm.state].name == "Slow"
+                for key, obj in self.screen_brightness.items():
+                    intensity = obj.intensity
                     # print("CRT decay (%d,%d) rgb=%3.1f;%3.1f;%3.1f, intensity=%d" %
                     #       (obj.x0, obj.y0, obj.red, obj.green, obj.blue, intensity))
-                    # When in "Museum Mode" and "Slow Motion" state, we want to fade the
-                    # image, but not all the way to zero.
-                    mm = cb.museum_mode
-                    slow = mm and mm.states[mm.state].name == "Slow"
                     if not slow or intensity > 10:
                         intensity -= 1
                     if intensity < 0:
-                        for_deletion.append(obj)
+                        for_deletion.append(key)
                     else:
-                        self.screen_brightness[obj] = intensity
-                for obj in for_deletion:
-                    del self.screen_brightness[obj]
+                        obj.intensity = intensity
+                for key in for_deletion:
+                    del self.screen_brightness[key]
             self._fade_delay -= 1
         else:
             self.screen_brightness = {}
@@ -2758,5 +4196,6 @@ class XwinCrt:
     def ww_scope_reset (self):
         self.win.undrawAll()
         self.screen_brightness = {}
+        self.light_gun_grid.clear()
         pass
     
@@ -176,11 +176,7 @@ def parse_and_save_screen_debug_widgets(cb, dbwgt_list):
                 label = cpu.SymTab[address][0]
         else:
             label = args[0]
-            address = -1
-            for addr in cpu.SymTab:
-                if label == cpu.SymTab[addr][0]:
-                    address = addr
-                    break
+            address = cpu.SymIndex.addr_of.get(label, -1)
             if address == -1:
                 cb.log.warn("Debug Widget: unknown label %s" % label)
         if len(args) >= 2:   # if there's a second arg, it would be the amount of increment in octal
@@ -294,6 +290,7 @@ def main_run_sim(args, cb, cpu):
 
     (cpu.SymTab, cpu.SymToAddrTab, cpu.ExecTab, JumpTo, WWfile, WWtapeID, dbwgt_list) = \
         CoreMem.read_core(cb.CoreFileName, cpu, cb)
+    cpu.SymIndex = CoreMem.core_tables.symbol_index()
     # LAS Test print for sim params
     # print ("LAS", sim_param_dict)
     cpu.set_isa(cb.sim_params.get_simparam("isa"))
@@ -363,6 +360,7 @@ def main_run_sim(args, cb, cpu):
 
     start_time = time.time()        # use this to compute the total run time for the sim
     checkpoint_time = start_time    # use this to calculate instructions-per-second every X-zillion instructions
+    refresh = wwinfra.DisplayRefreshClass(cb, args.RefreshRate)
     #  Here (soon!) Commences The Main Loop (ok, maybe not quite here, but soon...)
     # simulate each cycle one by one
     sim_cycle = 0
@@ -389,8 +387,8 @@ def main_run_sim(args, cb, cpu):
         if Debugger is None:
             Debugger = DbgDebugger()
         Debugger.reset (CoreMem,
-                        cpu.SymToAddrTab,
-                        cpu.SymTab,
+                        cpu.SymIndex.addr_of,
+                        cpu.SymIndex.symtab,
                         cpu.wwprint_to_str,
                         cpu.get_dbg_line,
                         cpu.opname_to_opcode,
@@ -473,14 +471,10 @@ def main_run_sim(args, cb, cpu):
             # ################### The Rest is Just Overhead  ###################
             cb.first_instruction_after_start = False # clear this flag to re-enable control panel stop-on-address
             # poll various I/O circumstances, and update the xwin screen
-            # Do this less frequently in AnaScope mode, as it slows the Rasp Pi performance,
-            # even to check the xwin stuff
-            # Set the update interval to a prime number in an attempt to prevent a program
-            # loop from synchronizing with the panel update
-            update_rate = 511
-            if cb.analog_display:
-                update_rate = 5003
-            if (sim_cycle % update_rate == 0) or args.SynchronousVideo or CycleDelayTime:
+            # The refresh is paced by the wall clock, but SynchronousVideo, and any per-instruction
+            # delay (including Museum Mode "Slow Motion") still update after every instruction
+            if (sim_cycle >= refresh.next_check and refresh.frame_due(sim_cycle)) or \
+                    args.SynchronousVideo or CycleDelayTime:
                 exit_alarm = cb.NO_ALARM
                 if cb.panel:
                     (quit, alarm_clear) = cb.panel.update_panel(cb, 0, alarm_state=alarm_state)  # watch for mouse clicks on the panel
@@ -589,6 +583,7 @@ def main_run_sim(args, cb, cpu):
                 else:  # else continue the simulation with the next set of parameters
                     ns = cb.museum_mode.next_state(cb, cpu)
                     sim_cycle = 0
+                    refresh.restart(sim_cycle)
                     cycle_limit = ns.cycle_limit
                     CycleDelayTime = ns.instruction_cycle_delay
                     cb.crt_fade_delay_param = ns.crt_fade_delay
@@ -622,6 +617,7 @@ def main_run_sim(args, cb, cpu):
         if not cb.TraceQuiet:
             cb.log.raw("Total cycles = %d, last PC=0o%o, wall_clock_time=%d sec, avg time per cycle = %4.1f usec\n" %
                        (sim_cycle, cpu.PC, wall_clock_time, 1000000.0 * float(wall_clock_time) / float(sim_cycle)))
+            cb.log.raw("Display refreshes = %d (%.1f per sec)\n" % (refresh.frames, refresh.frames / wall_clock_time))
         if cb.sim_params.get_simparam("Radar"):
             print("    elapsed radar time = %4.1f minutes (%4.1f revolutions)" %
                   (radar.elapsed_time / 60.0, radar.antenna_revolutions))
@@ -642,6 +638,9 @@ def main_run_sim(args, cb, cpu):
         del(radar)
 
     for d in cpu.IODeviceList:
+        if d.name == "Flexowriter" or d.name == "Teletype":
+            d.close_output()   # anything sent to an output sink has already been printed
+
         if d.name == "Flexowriter":
             s = d.get_saved_output()
             if len(s):
@@ -705,12 +704,25 @@ def main():
     # parser.add_argument("-r", "--Radar", help="Incorporate Radar Data Source", action="store_true")
     parser.add_argument("--AutoClick", help="Execute pre-programmed mouse clicks during simulation", action="store_true")
     parser.add_argument("--AnalogScope", help="Display graphical output on an analog CRT", action="store_true")
+    parser.add_argument("--AnalogDisplayList", help="Send the analog CRT a whole frame at a time on each display refresh",
+                        action="store_true")
     parser.add_argument("--RemoteScope", help="Display graphical output on the remote scope server (default localhost)", action="store_true")
     parser.add_argument("--RemoteScopeOnly", help="Don't bring up scope on local machine too", action="store_true")
     parser.add_argument("--RemoteScopeServer", help="Remote scope server machine name or IP addr (default localhost)", type=str)
+    parser.add_argument("--RemoteScopeText", help="Use the original text protocol to talk to the remote scope server", action="store_true")
+    parser.add_argument("--RemoteScopeZlib", help="Ask the remote scope server for zlib-compressed binary frames", action="store_true")
+    parser.add_argument("--RecordScope", help="Record the display command stream into the named file for ww-scope-player; "
+                        "runs are only recorded the same way every time with the fixed-interval refresh, "
+                        "which is the default with this option (--RefreshRate 0)", type=str)
     # the following arg should be revised to take the full geometry as "width x height + Xoffset + Yoffset"
     parser.add_argument("--xWinSize", help="specify the size of an xWinCrt pseudo-scope display in pixels", type=int)
     parser.add_argument("--FlexoWin", help="Display Flexowriter output in its own window", action="store_true")
+    parser.add_argument("--FlexoOutput", type=str,
+                        help="Send Flexowriter output as it's printed to a file, '-' for stdout, '|command', or printer:host[:port]")
+    parser.add_argument("--TeletypeOutput", type=str,
+                        help="Send Teletype output as it's printed; same choices as --FlexoOutput")
+    parser.add_argument("--OutputBatch", type=int, default=0,
+                        help="Write Flexowriter and Teletype output in batches of this many characters")
     parser.add_argument("--NoXWin", help="Don't open any x-windows", action="store_true")
     parser.add_argument("--NoToggleSwitchWarning", help="Suppress warning if WW code writes a read-only toggle switch",
                         action="store_true")
@@ -721,6 +733,8 @@ def main():
                         help="File name for photoelectric paper tape reader A input file")
     parser.add_argument("--PETRBfile", type=str,
                         help="File name for photoelectric paper tape reader B input file")
+    parser.add_argument("--PETRCharsPerSec", type=float, default=0,
+                        help="Model paper tape reader speed, e.g. 200 characters/sec; default is no delay")
     parser.add_argument("--NoAlarmStop", help="Don't stop on alarms", action="store_true")
     parser.add_argument("--QuickStart", help="Don't wait for the Restart button on the control panel; just go!", action="store_true")
     parser.add_argument("-n", "--NoCloseOnStop", help="Don't close the display on halt", action="store_true")
@@ -734,6 +748,10 @@ def main():
                         help="Don't automatically return 0 and 1 for locations 0 and 1", action="store_true")
     parser.add_argument("--SynchronousVideo",
                         help="Display pixels immediately; Disable video caching buffer ", action="store_true")
+    parser.add_argument("--RefreshRate",
+                        help="Target display refresh rate in frames per second (default 60, or 0 with --RecordScope); "
+                             "zero refreshes every fixed number of instructions, so the frames fall at the same "
+                             "instructions on every run", type=float)
     parser.add_argument("--CrtFadeDelay",
                         help="Configure Phosphor fade delay (default=0)", type=int)
     parser.add_argument("--DumpCoreToFile",
@@ -741,7 +759,7 @@ def main():
     parser.add_argument("--RestoreCoreFromFile",
                         help="Restore contents of memory from a core dump file", type=str)
     parser.add_argument("--DrumStateFile",
-                        help="File to store Persistent state for WW Drum", type=str)
+                        help="File to store Persistent state for WW Drum; a .wwdrum file is a binary image used in place", type=str)
     parser.add_argument("--MuseumMode",
                         help="Cycle through states endlessly for museum display", action="store_true")
     parser.add_argument("--HnfProgramDispatcher",
@@ -816,21 +834,40 @@ def main():
         cb.PETRBfilename = args.PETRBfile
     else:
         cb.PETRBfilename = re.sub("\\..core$", "", args.corefile) + ".petrB"
+    if args.PETRCharsPerSec > 0:
+        cb.petr_char_usec = 1e6 / args.PETRCharsPerSec
 
     # This command line arg switches graphical output to an analog oscilloscope display
     if args.AnalogScope:
         cb.analog_display = True
+        cb.ana_scope_display_list = args.AnalogDisplayList
 
     if (args.RemoteScope or
         args.RemoteScopeServer is not None or
         args.RemoteScopeOnly):
-        cb.remote_scope = wwinfra.RemoteScope (args.RemoteScopeServer)
+        cb.remote_scope = wwinfra.RemoteScope (args.RemoteScopeServer, binary = not args.RemoteScopeText,
+                                               compress = args.RemoteScopeZlib)
 
     if args.RemoteScopeOnly:
         cb.remote_scope_only = True
 
+    if args.RecordScope:
+        cb.scope_recorder = wwinfra.ScopeRecorder(cb, args.RecordScope)
+
+    # A refresh paced by the wall clock comes at instruction counts that depend on
+    # the speed of the host, so a recording, which is cut into frames at each refresh,
+    # uses the fixed interval unless asked otherwise
+    if args.RefreshRate is None:
+        args.RefreshRate = 0.0 if args.RecordScope else 60.0
+    elif args.RecordScope and args.RefreshRate != 0:
+        cb.log.warn("--RefreshRate %g paces frames by the wall clock; the scope recording won't be the same from run to run" %
+                    args.RefreshRate)
+
     if args.FlexoWin:
         cb.flexo_win = True
+    cb.flexo_output = args.FlexoOutput
+    cb.tty_output = args.TeletypeOutput
+    cb.output_batch_chars = args.OutputBatch
         
     if args.NoXWin:
         cb.use_x_win = False
@@ -913,6 +950,15 @@ def main():
                     d.crt.win.items.clear()
                     d.crt.close_display()
 
+    # let the remote scope's sender thread finish off what's queued
+    if cb.remote_scope is not None:
+        cb.remote_scope.close()
+        if not cb.TraceQuiet:
+            print(cb.remote_scope.stats())
+
+    if cb.scope_recorder is not None:
+        cb.scope_recorder.close()
+
     # sys.exit(alarm_state != cb.NO_ALARM)
     sys.exit(0)         # return zero for an ordinary exit
 
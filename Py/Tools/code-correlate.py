@@ -256,8 +256,7 @@ def analyze_a_file(cb, sc, args, probe, filename):
     cpu = wwinfra.CpuClass(cb, cm)
     cb.cpu = cpu
     cpu.cpu_switches = wwinfra.WWSwitchClass(cb)
-    (cpu.SymTab, cpu.SymToAddrTab, JumpTo, WWfile, WWtapeID, dbwgt_list) = \
-        wwinfra.read_core_file(cm, sc.archive_filename, cpu, cb)
+    wwinfra.read_core_file(cm, sc.archive_filename, cpu, cb, tables=False)   # only the memory contents are used
     archive = coremem_to_list(cb, cm)
 
     if len(archive) == 0:
@@ -292,6 +291,10 @@ def main():
     parser.add_argument("--WordCompare", '-w', help="Compare the whole word, not just op-codes", action="store_true")
     parser.add_argument('--ProbeFileName', '-p', type=str, help='file name containing search pattern')
     parser.add_argument("--RunThreshold", "-t", help="set threshold bytes for identifying a match (default=10)", type=int)
+    parser.add_argument("--CoreCache", help="Directory in which to cache parsed core files of 4 KB or more; "
+                        "no cache if not given", type=str)
+    parser.add_argument("--CoreCacheMB", help="Size limit for the core file cache, in megabytes (default 64)",
+                        type=int, default=64)
 
     args = parser.parse_args()
     # args
@@ -315,8 +318,7 @@ def main():
     cpu = wwinfra.CpuClass(cb, cm)
     cb.cpu = cpu
     cpu.cpu_switches = wwinfra.WWSwitchClass(cb)
-    (cpu.SymTab, cpu.SymToAddrTab, JumpTo, WWfile, WWtapeID, dbwgt_list) = \
-        wwinfra.read_core_file(cm, sc.probe_filename, cpu, cb)
+    wwinfra.read_core_file(cm, sc.probe_filename, cpu, cb, tables=False)   # only the memory contents are used
     probe = coremem_to_list(cb, cm)
 
     if args.FileList:
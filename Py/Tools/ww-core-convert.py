@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import wwinfra
+
+# Convert a core file between the text formats (.acore, .tcore and so on) and the binary
+# core image (.bcore), in either direction.  The format of the input is recognized from its
+# contents; the output is binary if its name ends in .bcore, unless --Text or --Binary says
+# otherwise.  The conversion is data-lossless, not byte-for-byte: going to binary and back
+# gives a text file with the same memory, symbols, comments, exec statements and directives,
+# but the original layout, spacing and ; remarks are gone.
+
+def main ():
+    parser = argparse.ArgumentParser (description = "Convert a Whirlwind core file between text and binary formats. "
+                                      "The conversion is data-lossless: the core data, symbols, comments and "
+                                      "directives are kept, but not the text layout or ; remarks.")
+    parser.add_argument ("infile", help="Core file to read, text or binary")
+    parser.add_argument ("outfile", help="Core file to write; '-' for text to stdout")
+    parser.add_argument ("--Binary", help="Write a binary core image", action="store_true")
+    parser.add_argument ("--Text", help="Write a text core file", action="store_true")
+    parser.add_argument ("--Force", help="Overwrite the output file if it exists", action="store_true")
+    args = parser.parse_args()
+
+    cb = wwinfra.ConstWWbitClass()
+    wwinfra.theConstWWbitClass = cb
+    cb.log = wwinfra.LogFactory().getLog (quiet=True)
+
+    if not os.path.exists (args.infile):
+        cb.log.fatal ("Can't find core file %s" % args.infile)
+    if args.outfile != '-' and os.path.exists (args.outfile) and not args.Force:
+        cb.log.fatal ("%s already exists; use --Force to overwrite it" % args.outfile)
+    binary = args.Binary or (args.outfile.endswith (".bcore") and not args.Text)
+
+    if wwinfra.BinaryCoreImageClass.is_binary_core_file (args.infile):
+        try:
+            image = wwinfra.BinaryCoreImageClass.read (cb, args.infile)
+        except ValueError as e:
+            cb.log.fatal (str (e))
+    else:
+        with open (args.infile, 'r') as f:
+            lines = f.read().split ('\n')
+        try:
+            image = wwinfra.BinaryCoreImageClass.from_text (cb, lines, args.infile)
+        except ValueError as e:
+            cb.log.fatal (str (e))
+
+    if binary:
+        if args.outfile == '-':
+            cb.log.fatal ("won't write a binary core image to stdout")
+        image.write (args.outfile)
+    elif args.outfile == '-':
+        image.write_text (sys.stdout)
+    else:
+        with open (args.outfile, 'wt') as fout:
+            image.write_text (fout)
+
+    if args.outfile != '-':
+        words = sum (end - start for (start, end) in image.runs())
+        print ("%s -> %s: %d words, %d symbols, %s format" %
+               (args.infile, args.outfile, words, len (image.symbols), "binary" if binary else "text"))
+
+main()
@@ -0,0 +1,53 @@
+import argparse
+import os
+import wwinfra
+import ww_io_sim
+
+# Convert a drum state file between the text format wwsim writes with --DrumStateFile
+# and the memory-mapped binary drum image (.wwdrum), in either direction.  The format
+# of the input is recognized from its contents; the output is binary if its name ends
+# in .wwdrum, unless --Text or --Binary says otherwise.
+
+def main ():
+    parser = argparse.ArgumentParser (description = "Convert a Whirlwind drum state file between text and binary formats.")
+    parser.add_argument ("infile", help="Drum state file to read, text or binary")
+    parser.add_argument ("outfile", help="Drum state file to write")
+    parser.add_argument ("--Binary", help="Write a binary drum image", action="store_true")
+    parser.add_argument ("--Text", help="Write a text drum state file", action="store_true")
+    parser.add_argument ("--Force", help="Overwrite the output file if it exists", action="store_true")
+    args = parser.parse_args()
+
+    cb = wwinfra.ConstWWbitClass()
+    wwinfra.theConstWWbitClass = cb
+    cb.log = wwinfra.LogFactory().getLog (quiet=True)
+
+    if not os.path.exists (args.infile):
+        cb.log.fatal ("Can't find drum state file %s" % args.infile)
+    if os.path.exists (args.outfile):
+        if not args.Force:
+            cb.log.fatal ("%s already exists; use --Force to overwrite it" % args.outfile)
+        os.remove (args.outfile)
+    binary = args.Binary or (args.outfile.endswith (".wwdrum") and not args.Text)
+
+    src = ww_io_sim.DrumClass (cb)
+    src.restore_drum_state (args.infile)
+    tracks = [src._drum_content[g][:] for g in range (src.DRUM_NUM_GROUPS)]
+    src.close_drum_file()
+
+    if binary:
+        dst = ww_io_sim.DrumImageFileClass (args.outfile, src.DRUM_NUM_GROUPS, src.DRUM_NUM_WORDS)
+        for g in range (src.DRUM_NUM_GROUPS):
+            dst[g][:] = tracks[g]
+        dst.flush()
+        dst.close()
+    else:
+        dst = ww_io_sim.DrumClass (cb)
+        dst._drum_content = tracks
+        dst.dirty = True
+        dst.save_drum_state (args.outfile)
+
+    words = sum (len (t) - t.count (None) for t in tracks)
+    print ("%s -> %s: %d initialized drum words, %s format" %
+           (args.infile, args.outfile, words, "binary" if binary else "text"))
+
+main()
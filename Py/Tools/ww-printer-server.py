@@ -0,0 +1,59 @@
+import argparse
+import codecs
+import socket
+import sys
+import wwinfra
+
+# A "printer" for Flexowriter or Teletype output from wwsim --FlexoOutput printer:host[:port].
+# Simulators connect one at a time; whatever each one prints is copied to stdout, or
+# appended to a file, as it arrives.
+
+class PrinterServer:
+    def __init__ (self, port: int, out):
+        self.port = port
+        self.out = out
+        self.listener = socket.socket (socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt (socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind (("", port))
+        self.listener.listen()
+        pass
+    def serve (self):
+        while True:
+            (conn, addr) = self.listener.accept()
+            print ("Printer: connection from %s" % addr[0], file = sys.stderr)
+            chars = 0
+            # A character can be split between two recv's, so the decoder keeps the
+            # first part of it until the rest arrives
+            decoder = codecs.getincrementaldecoder ("utf-8") ("replace")
+            with conn:
+                while True:
+                    data = conn.recv (4096)
+                    text = decoder.decode (data, final = len (data) == 0)
+                    self.out.write (text)
+                    self.out.flush()
+                    chars += len (text)
+                    if len (data) == 0:
+                        break
+            print ("Printer: %s finished, %d characters" % (addr[0], chars), file = sys.stderr)
+    def close (self):
+        self.listener.close()
+        if self.out is not sys.stdout:
+            self.out.close()
+        pass
+
+def main ():
+    parser = argparse.ArgumentParser (description = "Print Whirlwind Flexowriter or Teletype output sent by wwsim.")
+    parser.add_argument ("--Port", help="Port to listen on (default %d)" % wwinfra.PRINTER_SERVER_PORT,
+                         type=int, default=wwinfra.PRINTER_SERVER_PORT)
+    parser.add_argument ("--Output", help="Append the printed output to this file instead of stdout", type=str)
+    args = parser.parse_args()
+
+    out = open (args.Output, "a") if args.Output is not None else sys.stdout
+    server = PrinterServer (args.Port, out)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    server.close()
+
+main()
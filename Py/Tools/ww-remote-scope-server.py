@@ -1,7 +1,27 @@
 import socket
+import argparse
+import asyncio
+import collections
+import time
+import zlib
 import wwinfra
 from graphics import GraphicsError
 
+# The scope server is a hub. Any number of simulators (wwsim --RemoteScope) can
+# connect at once; each one is given the lowest free channel number. Any number
+# of viewers can connect too, each subscribing to one channel, and every frame a
+# simulator sends is fanned out to that channel's viewers. The hub itself renders
+# one channel on its own screen, which is what the old one-client server did.
+#
+# A viewer is another copy of this program started with --Viewer <hub>; it opens
+# a window and shows the chosen channel. So several displays can mirror the same
+# demo, and a monitor wall can show a different channel on each display.
+#
+# Viewers that can't keep up don't slow anyone else down: each one has a short
+# queue of frames, and when it's full the oldest whole frame is thrown away. As
+# in wwinfra.RemoteScope, a frame with a reset in it, or a piece of a frame the
+# simulator sent in several because it was too big, is never thrown away.
+
 class Tokenizer:
     # handleTokenFcn (token: str) -> None
     def __init__ (self, handleTokenFcn):
@@ -43,18 +63,118 @@ class Tokenizer:
             print ("Unexpected state %d in Tokenizer" % self.state)
             exit (-1)
 
-class Server (wwinfra.RemoteUtility):
+# Draws scope operations on this machine's screen
+class Renderer:
     def __init__ (self):
-        super().__init__()
         self.cb = wwinfra.ConstWWbitClass (get_screen_size = True)
         self.cb.this_is_remote_scope = True
         self.cb.use_x_win = True
         self.cb.log = wwinfra.LogFactory().getLog (quiet=True, no_warn=True)
         self.crt = wwinfra.XwinCrt (self.cb)
         self.cm = wwinfra.CorememClass (self.cb)
+        pass
+    def doScopeOp (self, op: str, args: tuple):
+        if op == "L":
+            (x0, y0, xd, yd) = args
+            self.crt.ww_draw_line (x0, y0, xd, yd)
+        elif op == "D":
+            (x, y, r, g, b) = args
+            self.crt.ww_draw_point (x, y, color = (r, g, b))
+        elif op == "C":
+            (x, y, mask, expand) = args
+            self.crt.ww_draw_char (x, y, mask, expand)
+        elif op == "H":
+            self.crt.ww_highlight_point()
+        elif op == "U":
+            self.crt.ww_scope_update (self.cm, self.cb)
+        elif op == "R":
+            self.crt.ww_scope_reset()
+        pass
+
+class ClientStats:
+    def __init__ (self, name: str):
+        self.name = name
+        self.startTime = time.time()
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.framesIn = 0
+        self.framesOut = 0
+        self.framesDropped = 0
+        pass
+    def __str__ (self):
+        elapsed = max (time.time() - self.startTime, 1e-6)
+        return ("%-28s up %7.1fs  in %9d bytes %7d frames (%5.1f/s)  out %9d bytes %7d frames  dropped %d" %
+                (self.name, elapsed, self.bytesIn, self.framesIn, self.framesIn / elapsed,
+                 self.bytesOut, self.framesOut, self.framesDropped))
+
+# One simulator's stream, plus whoever is watching it
+class Channel:
+    def __init__ (self, number: int):
+        self.number = number
+        self.simulator = None
+        self.viewers = set()
+        self.proto = wwinfra.RemoteScopeProtocol()
+        self.partial = False            # the last frame published didn't end in an update
+        pass
+    # private
+    # A viewer may miss a frame only if it's whole by itself, ending in an
+    # update, and has no reset in it. Only the opcodes are looked at.
+    def droppable (self, flags: int, payload: bytes) -> bool:
+        if flags & self.proto.FRAME_ZLIB:
+            payload = zlib.decompress (payload)
+        reset = ord ('R')
+        hasReset = False
+        opcode = None
+        offset = 0
+        n = len (payload)
+        while offset < n:
+            opcode = payload[offset]
+            s = self.proto.RECORDS.get (opcode)
+            if s is None:
+                raise ValueError ("unknown remote scope record 0o%o at offset %d" % (opcode, offset))
+            hasReset |= opcode == reset
+            offset += 1 + s.size
+        complete = opcode == ord ('U')
+        droppable = complete and not hasReset and not self.partial
+        self.partial = not complete
+        return droppable
+    # public
+    def publish (self, flags: int, payload: bytes):
+        if len (self.viewers) == 0:
+            return
+        droppable = self.droppable (flags, payload)
+        frame = self.proto.FRAME_HEADER.pack (flags, len (payload)) + payload
+        plain = None
+        for v in self.viewers:
+            if (flags & self.proto.FRAME_ZLIB) and not v.zlib:
+                if plain is None:
+                    plain = self.proto.packFrame (zlib.decompress (payload), False)
+                v.push (plain, droppable)
+            else:
+                v.push (frame, droppable)
+        pass
+
+# A connection from wwsim. It starts out speaking text, and may negotiate the
+# binary protocol. Text commands are re-encoded as binary records so that
+# viewers only ever see frames.
+class SimulatorClient:
+    def __init__ (self, hub, writer, name: str, firstCmd: []):
+        self.hub = hub
+        self.writer = writer
+        self.stats = ClientStats ("sim " + name)
+        self.proto = wwinfra.RemoteScopeProtocol()
         self.tz = Tokenizer (self.handleToken)
         self.cmd: [int|str] = []
+        self.binary = False
+        self.decoder = wwinfra.RemoteScopeFrameDecoder()
+        self.frame = bytearray()        # records re-encoded from the text protocol
+        self.channel = hub.attachSimulator (self)
+        self.stats.name += " ch%d" % self.channel.number
+        if firstCmd:
+            self.doScopeCmd (firstCmd)
         pass
+    def local (self) -> bool:
+        return self.hub.renderer is not None and self.channel.number == self.hub.localChannel
     def handleToken (self, token: str):
         if token == "E":
             self.doScopeCmd (self.cmd)
@@ -62,65 +182,299 @@ class Server (wwinfra.RemoteUtility):
         else:
             self.cmd.append (token)
         pass
+    # Convert a text command into the same (op, args) form the binary records use
     def doScopeCmd (self, cmd: []):
         op = cmd[0]
         if op == "L":
-            x0 = int (cmd[1])
-            y0 = int (cmd[2])
-            xd = int (cmd[3])
-            yd = int (cmd[4])
-            self.crt.ww_draw_line (x0, y0, xd, yd)
+            self.doScopeOp (op, (int (cmd[1]), int (cmd[2]), int (cmd[3]), int (cmd[4])))
         elif op == "D":         # "D" for "Dot" -- the convention used in XwinCrtObject
-            x =   int (cmd[1])
-            y =   int (cmd[2])
-            r = float (cmd[3])
-            g = float (cmd[4])
-            b = float (cmd[5])
-            self.crt.ww_draw_point (x, y, color = (r, g, b))
+            self.doScopeOp (op, (int (cmd[1]), int (cmd[2]), float (cmd[3]), float (cmd[4]), float (cmd[5])))
         elif op == "C":
-            x       = int (cmd[1])
-            y       = int (cmd[2])
-            mask    = int (cmd[3])
-            expand  = float (cmd[4])
-            self.crt.ww_draw_char (x, y, mask, expand)
-        elif op == "H":
-            self.crt.ww_highlight_point()
-        elif op == "U":
-            self.crt.ww_scope_update (self.cm, self.cb)
-        elif op == "R":
-            self.crt.ww_scope_reset()
+            self.doScopeOp (op, (int (cmd[1]), int (cmd[2]), int (cmd[3]), float (cmd[4])))
+        elif op == "P":
+            self.negotiate (int (cmd[1]), int (cmd[2]))
+        elif op in ("H", "U", "R"):
+            self.doScopeOp (op, ())
+        pass
+    def doScopeOp (self, op: str, args: tuple):
+        if self.local():
+            self.hub.renderer.doScopeOp (op, args)
+        if len (self.channel.viewers) != 0:
+            self.frame += self.proto.packRecord (op, *args)
+        if op == "U":
+            self.stats.framesIn += 1
+            if len (self.frame) != 0:
+                self.channel.publish (0, bytes (self.frame))
+                self.frame = bytearray()
+        pass
+    # The client has offered the binary protocol. Accept it unless we've been
+    # told not to, in which case say nothing and the client falls back to text.
+    def negotiate (self, version: int, flags: int):
+        if not self.hub.allowBinary:
+            return
+        version = min (version, self.proto.VERSION)
+        if not self.hub.allowZlib:
+            flags &= ~self.proto.FLAG_ZLIB
+        hello = self.proto.HELLO.pack (self.proto.HELLO_MAGIC, version, flags)
+        self.writer.write (hello)
+        self.stats.bytesOut += len (hello)
+        self.binary = True
+        print ("%s switched to binary protocol version %d, flags 0o%o" % (self.stats.name, version, flags))
         pass
     def recv (self, msg: bytes):
-        for c in msg:
-            self.tz.handleChar (c)
+        self.stats.bytesIn += len (msg)
+        if not self.binary:
+            for i in range (len (msg)):
+                self.tz.handleChar (msg[i])
+                if self.binary:
+                    msg = msg[i + 1:]
+                    break
+            else:
+                return
+        for (flags, payload) in self.decoder.feed (msg):
+            self.stats.framesIn += 1
+            if self.local():
+                for (op, args) in self.proto.unpackRecords (flags, payload):
+                    self.hub.renderer.doScopeOp (op, args)
+            self.channel.publish (flags, payload)
         pass
-    def run (self):
+    def close (self):
+        self.hub.detachSimulator (self)
+        pass
+
+# A connection from another copy of this program running with --Viewer
+class ViewerClient:
+    def __init__ (self, hub, writer, name: str, queueLen: int):
+        self.hub = hub
+        self.writer = writer
+        self.stats = ClientStats ("viewer " + name)
+        self.zlib = False
+        self.channel = None
+        self.queue = collections.deque()        # (frame, droppable)
+        self.queueLen = queueLen
+        self.writeBufferLim = 1 << 18
+        writer.transport.set_write_buffer_limits (high = self.writeBufferLim)
+        self.ready = asyncio.Event()
+        self.closed = False
+        pass
+    # Answer the viewer's "V <channel> <flags> E" greeting
+    def subscribe (self, channelNumber: int, flags: int):
+        proto = wwinfra.RemoteScopeProtocol()
+        self.zlib = (flags & proto.FLAG_ZLIB) != 0
+        hello = proto.HELLO.pack (proto.HELLO_MAGIC, proto.VERSION, flags & proto.FLAG_ZLIB)
+        self.writer.write (hello)
+        self.stats.bytesOut += len (hello)
+        self.channel = self.hub.attachViewer (self, channelNumber)
+        self.stats.name += " ch%d" % channelNumber
+        pass
+    def send (self, frame: bytes):
+        self.writer.write (frame)
+        self.stats.bytesOut += len (frame)
+        self.stats.framesOut += 1
+        pass
+    # Frames go straight to the socket while it keeps up. Once the socket
+    # buffer backs up they wait in the queue, and if the queue is full the
+    # stalest droppable frame is thrown away; if none can be, the queue runs
+    # over queueLen.
+    def push (self, frame: bytes, droppable: bool):
+        if self.writer.is_closing():
+            return
+        if len (self.queue) == 0 and self.writer.transport.get_write_buffer_size() < self.writeBufferLim:
+            self.send (frame)
+            return
+        if len (self.queue) >= self.queueLen:
+            for i in range (len (self.queue)):
+                if self.queue[i][1]:
+                    del self.queue[i]
+                    self.stats.framesDropped += 1
+                    break
+        self.queue.append ((frame, droppable))
+        self.ready.set()
+        pass
+    async def sendFrames (self):
+        while not self.closed:
+            await self.ready.wait()
+            self.ready.clear()
+            while len (self.queue) != 0 and not self.closed:
+                await self.writer.drain()
+                if len (self.queue) != 0:
+                    (frame, droppable) = self.queue.popleft()
+                    self.send (frame)
+        pass
+    def close (self):
+        self.closed = True
+        self.ready.set()
+        if self.channel is not None:
+            self.channel.viewers.discard (self)
+        pass
+
+class Hub (wwinfra.RemoteUtility):
+    def __init__ (self, allowBinary: bool = True, allowZlib: bool = True, localDisplay: bool = True,
+                  localChannel: int = 0, viewerQueue: int = 4, statsInterval: int = 30):
+        super().__init__()
+        self.allowBinary = allowBinary
+        self.allowZlib = allowZlib
+        self.renderer = Renderer() if localDisplay else None
+        self.localChannel = localChannel
+        self.viewerQueue = viewerQueue
+        self.statsInterval = statsInterval
+        self.recvLim: int = 1 << 16     # binary frames are much bigger than the text buffer
+        self.channels = {}              # channel number -> Channel
+        self.clients = set()
+        pass
+    def getChannel (self, number: int) -> Channel:
+        if number not in self.channels:
+            self.channels[number] = Channel (number)
+        return self.channels[number]
+    def attachSimulator (self, sim: SimulatorClient) -> Channel:
+        number = 0
+        while number in self.channels and self.channels[number].simulator is not None:
+            number += 1
+        channel = self.getChannel (number)
+        channel.simulator = sim
+        return channel
+    def detachSimulator (self, sim: SimulatorClient):
+        sim.channel.simulator = None
+        pass
+    def attachViewer (self, viewer: ViewerClient, number: int) -> Channel:
+        channel = self.getChannel (number)
+        channel.viewers.add (viewer)
+        return channel
+    # Read the first command to find out what kind of client this is. Simulators
+    # start with "P" (binary offer) or "R" (text reset); viewers start with "V".
+    async def handleClient (self, reader, writer):
+        peer = writer.get_extra_info ("peername")
+        name = "%s:%d" % (peer[0], peer[1]) if peer else "?"
+        print ("%s has connected to the scope server" % name)
+        first: [str] = []
+        tz = Tokenizer (first.append)
+        data = b""
+        client = None
+        try:
+            while client is None:
+                data = await reader.read (self.recvLim)
+                if not data:
+                    break
+                for i in range (len (data)):
+                    tz.handleChar (data[i])
+                    if len (first) != 0 and first[-1] == "E":
+                        data = data[i + 1:]
+                        break
+                else:
+                    continue
+                if first[0] == "V":
+                    client = ViewerClient (self, writer, name, self.viewerQueue)
+                    client.subscribe (int (first[1]), int (first[2]))
+                else:
+                    client = SimulatorClient (self, writer, name, first[:-1])
+            if client is not None:
+                self.clients.add (client)
+                if isinstance (client, ViewerClient):
+                    sender = asyncio.ensure_future (client.sendFrames())
+                    while await reader.read (self.recvLim):
+                        pass
+                    client.close()
+                    await sender
+                else:
+                    if len (data) != 0:
+                        client.recv (data)
+                    while True:
+                        data = await reader.read (self.recvLim)
+                        if not data:
+                            break
+                        client.recv (data)
+                        await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        except (ValueError, zlib.error) as e:
+            print ("Bad data from %s: %s" % (name, e))
+        except GraphicsError:
+            self.quit.set()             # the local scope window was closed
+        finally:
+            if client is not None:
+                client.close()
+                self.clients.discard (client)
+                print ("Closed: %s" % client.stats)
+            else:
+                print ("Scope server connection closed")
+            writer.close()
+        pass
+    async def reportStats (self):
         while True:
+            await asyncio.sleep (self.statsInterval)
+            for c in sorted (self.clients, key = lambda c: c.stats.name):
+                print (c.stats)
+    async def serve (self):
+        host: str = socket.gethostname()
+        self.quit = asyncio.Event()
+        server = await asyncio.start_server (self.handleClient, host, self.port)
+        print ("Scope server running on %s, port %d" % (host, self.port))
+        if self.statsInterval > 0:
+            asyncio.ensure_future (self.reportStats())
+        async with server:
+            await self.quit.wait()
+    def run (self):
+        try:
+            asyncio.run (self.serve())
+        except (GraphicsError, KeyboardInterrupt):
+            pass
+        pass
+
+# Shows one channel from a hub on this machine's screen
+class Viewer (wwinfra.RemoteUtility):
+    def __init__ (self, host: str, channel: int):
+        super().__init__()
+        self.host = host
+        self.channel = channel
+        self.proto = wwinfra.RemoteScopeProtocol()
+        self.renderer = Renderer()
+        pass
+    def run (self):
+        with socket.create_connection ((self.host, self.port)) as s:
+            s.sendall (bytes ("V %d %d E " % (self.channel, self.proto.FLAG_ZLIB), "utf-8"))
+            reply = b""
+            while len (reply) < self.proto.HELLO.size:
+                data = s.recv (self.proto.HELLO.size - len (reply))
+                if not data:
+                    print ("Scope hub closed the connection")
+                    return
+                reply += data
+            (magic, version, flags) = self.proto.HELLO.unpack (reply)
+            if magic != self.proto.HELLO_MAGIC:
+                print ("%s isn't a scope hub" % self.host)
+                return
+            print ("Viewing channel %d on %s" % (self.channel, self.host))
+            decoder = wwinfra.RemoteScopeFrameDecoder()
             try:
-                with socket.socket (socket.AF_INET, socket.SOCK_STREAM) as s:
-                    host: str = socket.gethostname()
-                    port = self.port
-                    print ("Scope server running on %s, port %d" % (host, port))
-                    s.bind ((host, port))
-                    while True:
-                        s.listen()
-                        conn, addr = s.accept()
-                        with conn:
-                            print ("%s has connected to the scope server" % addr[0])
-                            while True:
-                                data = conn.recv (self.bufferLim)
-                                if not data:
-                                    print ("Scope server connection closed")
-                                    break
-                                self.recv (data)
+                while True:
+                    data = s.recv (1 << 16)
+                    if not data:
+                        print ("Scope hub connection closed")
+                        break
+                    for (flags, payload) in decoder.feed (data):
+                        for (op, args) in self.proto.unpackRecords (flags, payload):
+                            self.renderer.doScopeOp (op, args)
             except GraphicsError:
-                break
-            except ConnectionResetError:
-                self.cmd = []
                 pass
         pass
 
 def main ():
-    Server().run()
+    parser = argparse.ArgumentParser (description = "Display graphical output from remote Whirlwind simulations.")
+    parser.add_argument ("--TextOnly", help="Refuse the binary protocol; talk text to every simulator", action="store_true")
+    parser.add_argument ("--NoZlib", help="Don't accept zlib-compressed frames", action="store_true")
+    parser.add_argument ("--NoDisplay", help="Run as a hub only; don't open a scope window here", action="store_true")
+    parser.add_argument ("--Channel", help="Channel to display (default 0, the first simulator)", type=int, default=0)
+    parser.add_argument ("--Viewer", help="Connect to the scope hub on this host and display --Channel", type=str)
+    parser.add_argument ("--ViewerQueue", help="Frames queued per viewer before stale ones are dropped (default 4)",
+                         type=int, default=4)
+    parser.add_argument ("--StatsInterval", help="Seconds between per-client statistics reports; 0 for none (default 30)",
+                         type=int, default=30)
+    args = parser.parse_args()
+    if args.Viewer is not None:
+        Viewer (args.Viewer, args.Channel).run()
+    else:
+        Hub (allowBinary = not args.TextOnly, allowZlib = not args.NoZlib, localDisplay = not args.NoDisplay,
+             localChannel = args.Channel, viewerQueue = max (args.ViewerQueue, 1),
+             statsInterval = args.StatsInterval).run()
 
 main()
@@ -0,0 +1,131 @@
+import argparse
+import time
+import wwinfra
+from graphics import GraphicsError
+
+# Play back a display recording made with wwsim --RecordScope, either into a
+# scope window on this machine or into the remote scope server. Frames are
+# paced by the simulated time stamped on each one, scaled by --Speed, so an
+# expensive demo can be shown in a loop without running the simulator at all.
+
+# Draws on an XwinCrt window here
+class CrtTarget:
+    def __init__ (self, corefile: str):
+        self.cb = wwinfra.ConstWWbitClass (corefile = corefile, get_screen_size = True)
+        wwinfra.theConstWWbitClass = self.cb
+        self.cb.log = wwinfra.LogFactory().getLog (quiet=True, no_warn=True)
+        self.crt = wwinfra.XwinCrt (self.cb)
+        self.cm = wwinfra.CorememClass (self.cb)
+        pass
+    # returns False if the viewer asked to quit
+    def doScopeOp (self, op: str, args: tuple) -> bool:
+        if op == "L":
+            (x0, y0, xd, yd) = args
+            self.crt.ww_draw_line (x0, y0, xd, yd)
+        elif op == "D":
+            (x, y, r, g, b) = args
+            self.crt.ww_draw_point (x, y, color = (r, g, b))
+        elif op == "C":
+            (x, y, mask, expand) = args
+            self.crt.ww_draw_char (x, y, mask, expand)
+        elif op == "H":
+            self.crt.ww_highlight_point()
+        elif op == "U":
+            return self.crt.ww_scope_update (self.cm, self.cb) == self.cb.NO_ALARM
+        elif op == "R":
+            self.crt.ww_scope_reset()
+        return True
+    def close (self):
+        self.crt.close_display()
+        pass
+
+# Sends to the remote scope server, just as wwsim --RemoteScopeOnly would
+class RemoteTarget:
+    def __init__ (self, host: str):
+        self.rs = wwinfra.RemoteScope (host)
+        self.ops = {
+            "L": self.rs.line,
+            "D": self.rs.point,
+            "C": self.rs.char,
+            "H": self.rs.highlight,
+            "U": self.rs.update,
+            "R": self.rs.reset,
+        }
+        pass
+    def doScopeOp (self, op: str, args: tuple) -> bool:
+        self.ops[op] (*args)
+        return True
+    def close (self):
+        self.rs.close()
+        print (self.rs.stats())
+        pass
+
+class Player:
+    def __init__ (self, recording: wwinfra.ScopeRecording, target, speed: float):
+        self.rec = recording
+        self.target = target
+        self.speed = speed
+        # The phosphor takes this many updates to fade out, so playing this
+        # many frames ahead of a seek point rebuilds what would be on screen
+        self.warmupFrames = 21
+        pass
+    # Play from the first frame at or after startUsec. Returns False if told to quit.
+    def play (self, startUsec: int) -> bool:
+        start = self.rec.find (startUsec)
+        if start >= len (self.rec):
+            print ("Nothing recorded after %.3f sec" % (startUsec / 1e6))
+            return False
+        wallStart = None
+        simStart = self.rec.times[start]
+        for n in range (max (0, start - self.warmupFrames), len (self.rec)):
+            (usec, records) = self.rec.frame (n)
+            if n >= start and self.speed > 0:
+                if wallStart is None:
+                    wallStart = time.time()
+                ahead = (usec - simStart) / 1e6 / self.speed - (time.time() - wallStart)
+                if ahead > 0:
+                    time.sleep (ahead)
+            for (op, args) in records:
+                if not self.target.doScopeOp (op, args):
+                    return False
+        return True
+
+def main ():
+    parser = argparse.ArgumentParser (description = "Play back a Whirlwind scope recording made with wwsim --RecordScope.")
+    parser.add_argument ("recording", help="Scope recording file")
+    parser.add_argument ("--Speed", help="Playback speed relative to simulated time; 0 for as fast as possible (default 1.0)",
+                         type=float, default=1.0)
+    parser.add_argument ("--Seek", help="Start playing at this simulated time, in seconds", type=float, default=0.0)
+    parser.add_argument ("--Loop", help="Play the recording over and over", action="store_true")
+    parser.add_argument ("--RemoteScope", help="Play into the remote scope server (default localhost)", action="store_true")
+    parser.add_argument ("--RemoteScopeServer", help="Remote scope server machine name or IP addr", type=str)
+    parser.add_argument ("--Info", help="Describe the recording and exit", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        rec = wwinfra.ScopeRecording (args.recording)
+    except (OSError, ValueError) as e:
+        print ("Can't read scope recording: %s" % e)
+        exit (1)
+
+    if args.Info or len (rec) == 0:
+        duration = (rec.times[-1] - rec.times[0]) / 1e6 if len (rec) != 0 else 0.0
+        print ("%s: recorded from %s; %d frames, %.3f sec simulated time" %
+               (args.recording, rec.corefile, len (rec), duration))
+        return
+
+    if args.RemoteScope or args.RemoteScopeServer is not None:
+        target = RemoteTarget (args.RemoteScopeServer)
+    else:
+        target = CrtTarget (rec.corefile)
+    player = Player (rec, target, args.Speed)
+    startUsec = rec.times[0] + int (args.Seek * 1e6)
+    try:
+        while player.play (startUsec) and args.Loop:
+            startUsec = rec.times[0]
+    except (GraphicsError, KeyboardInterrupt):
+        pass
+    target.close()
+    rec.close()
+
+main()
@@ -211,13 +211,13 @@ def main():
     # ugh, this network of semi-global data structures is getting out of hand...
     # I hadn't anticipated more than one CoreMem when writing the code...
     cb.cpu.cm = coremem_a
-    coremem_a.read_core(args.inputfiles[0], cpu, cb)
+    coremem_a.read_core(args.inputfiles[0], cpu, cb, tables=False)
 
     passnum = 1  # count from One (not zero)
     while passnum < len(args.inputfiles):
         cb.log.info("input file pair: %s = <,   %s = >" % (args.inputfiles[0], args.inputfiles[passnum]))
         cb.cpu.cm = coremem_b
-        coremem_b.read_core(args.inputfiles[passnum], cpu, cb)
+        coremem_b.read_core(args.inputfiles[passnum], cpu, cb, tables=False)
 
         if args.Merge:
             merge_core(coremem_a, coremem_b, cb)  # "ww_tapeid", "hash", "strings", "stats", "filename_from_core"
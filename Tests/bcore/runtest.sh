@@ -0,0 +1,53 @@
+#!/bin/bash
+# Binary core image test: round-trip.ww is assembled to a text .acore, converted
+# to a .bcore with ww-core-convert, and converted back to text.  The simulator runs
+# the original, the binary and the converted-back files, and all three must print
+# the same.  The conversion is data-lossless, not byte-for-byte: the text that
+# comes back has the same memory, symbols, comments and exec statements, but not
+# the original layout.  Converting it to binary again must give the same .bcore.
+
+# cd to the dir with this file, to facilitate external control
+thisfile=$0
+cd ${thisfile%/*}/
+
+realdiff=`which diff`
+diff () {
+	echo diff $*
+	$realdiff $*
+}
+
+echo "Binary Core Image Test:"
+if [ "$1" == "--Accept" ];
+then
+	echo "Accepting..."
+	rm -rf TestRefs/
+	mkdir TestRefs
+	cp wwsim.log TestRefs/
+else
+	asm="$PYTHONPATH/../../Py/Assembler/wwasm.py"
+	sim="$PYTHONPATH/../../Py/Sim/wwsim.py"
+	conv="$PYTHONPATH/../../Py/Tools/ww-core-convert.py"
+	rm -f round-trip.acore round-trip.lst round-trip.bcore back.acore back.bcore wwasm.log convert.log wwsim.log wwsim-bin.log wwsim-back.log
+	python $asm round-trip.ww >&wwasm.log
+	python $conv round-trip.acore round-trip.bcore >&convert.log
+	python $conv round-trip.bcore back.acore >>convert.log 2>&1
+	python $conv back.acore back.bcore >>convert.log 2>&1
+	python $sim --CycleLimit 7700 round-trip.acore >&wwsim.log
+	python $sim --CycleLimit 7700 round-trip.bcore >&wwsim-bin.log
+	python $sim --CycleLimit 7700 back.acore >&wwsim-back.log
+	status=0
+	diff -s TestRefs/wwsim.log wwsim.log
+	status=$(($status + $?))
+	diff -s wwsim.log wwsim-bin.log
+	status=$(($status + $?))
+	diff -s wwsim.log wwsim-back.log
+	status=$(($status + $?))
+	cmp round-trip.bcore back.bcore && echo "Files round-trip.bcore and back.bcore are identical"
+	status=$(($status + $?))
+	if [ "$status" == "0" ];
+	then
+		echo "Test PASSED"
+	else
+		echo "Test FAILED"
+	fi
+fi
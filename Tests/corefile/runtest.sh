@@ -0,0 +1,47 @@
+#!/bin/bash
+# Core file parser test: the disassembler reads each core file with read_core_file()
+# and writes out everything it found, memory, symbols and comments.  The reference
+# output was made with the line-at-a-time parser from before read_core_file() took
+# stretches of rows at once, so this checks that the two give the same results.
+#   tape.ocore  a recovered tape, loaded over the toggle switches at address zero
+#   pgm.acore   four-digit addresses, Nones, symbols, comments and exec lines
+#   odd.acore   odd spacing, a None in mid-row, bad lines, gaps, and no newline at the end
+# The old parser logged each toggle switch it overwrote; the new one logs them all
+# on one line, so those lines are left out of the comparison.
+
+# cd to the dir with this file, to facilitate external control
+thisfile=$0
+cd ${thisfile%/*}/
+
+realdiff=`which diff`
+diff () {
+	echo diff $*
+	$realdiff $*
+}
+
+echo "Core File Parser Test:"
+if [ "$1" == "--Accept" ];
+then
+	echo "Accepting..."
+	rm -rf TestRefs/
+	mkdir TestRefs
+	cp tape.ww tape.log pgm.ww pgm.log odd.ww odd.log TestRefs/
+else
+	disasm="$PYTHONPATH/../../Py/Disassembler/wwdisasm.py"
+	rm -f tape.ww tape.log pgm.ww pgm.log odd.ww odd.log
+	python $disasm --use_default_tsr tape.ocore |& grep -v "Overwriting" >tape.log
+	python $disasm pgm.acore >&pgm.log
+	python $disasm odd.acore >&odd.log
+	status=0
+	for f in tape.ww tape.log pgm.ww pgm.log odd.ww odd.log
+	do
+		diff -s TestRefs/$f $f
+		status=$(($status + $?))
+	done
+	if [ "$status" == "0" ];
+	then
+		echo "Test PASSED"
+	else
+		echo "Test FAILED"
+	fi
+fi
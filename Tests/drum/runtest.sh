@@ -0,0 +1,53 @@
+#!/bin/bash
+# Drum state test: the program moves words to and from the drum, starting from
+# drum-in.tcore.  It's run once with the text drum state and once with the same
+# state converted to a binary drum image, and both must print the same and leave
+# the same drum behind.  The conversions both ways must come back unchanged.
+
+# cd to the dir with this file, to facilitate external control
+thisfile=$0
+cd ${thisfile%/*}/
+
+realdiff=`which diff`
+diff () {
+	echo diff $*
+	$realdiff $*
+}
+
+echo "Drum State Test:"
+if [ "$1" == "--Accept" ];
+then
+	echo "Accepting..."
+	rm -rf TestRefs/
+	mkdir TestRefs
+	cp wwsim.log drum-out.tcore TestRefs/
+else
+	asm="$PYTHONPATH/../../Py/Assembler/wwasm.py"		# Use quotes since can't resolve backslash yet -- it's needed for file name translation
+	sim="$PYTHONPATH/../../Py/Sim/wwsim.py"
+	conv="$PYTHONPATH/../../Py/Tools/ww-drum-convert.py"
+	rm -f drum.acore drum.lst drum-out.tcore drum-out.wwdrum drum-back.tcore drum-back.wwdrum wwasm.log wwsim.log wwsim-bin.log convert.log
+	python $asm drum.ww >&wwasm.log
+	cp drum-in.tcore drum-out.tcore
+	python $conv drum-in.tcore drum-out.wwdrum >&convert.log
+	python $sim --DrumStateFile drum-out.tcore drum.acore |& grep -v "output to file" >wwsim.log
+	python $sim --DrumStateFile drum-out.wwdrum drum.acore |& grep -v "output to file" >wwsim-bin.log
+	python $conv --Text drum-out.wwdrum drum-back.tcore >>convert.log 2>&1
+	python $conv drum-out.tcore drum-back.wwdrum >>convert.log 2>&1
+	diff -s TestRefs/wwsim.log wwsim.log
+	status1=$?
+	diff -s wwsim.log wwsim-bin.log
+	status2=$?
+	diff -s TestRefs/drum-out.tcore drum-out.tcore
+	status3=$?
+	diff -s drum-out.tcore drum-back.tcore
+	status4=$?
+	cmp drum-out.wwdrum drum-back.wwdrum && echo "Files drum-out.wwdrum and drum-back.wwdrum are identical"
+	status5=$?
+	status=$(($status1 + $status2 + $status3 + $status4 + $status5))
+	if [ "$status" == "0" ];
+	then
+		echo "Test PASSED"
+	else
+		echo "Test FAILED"
+	fi
+fi
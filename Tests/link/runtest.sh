@@ -0,0 +1,57 @@
+#!/bin/bash
+# Linker test: main.ww and the three float library files are assembled one at a time
+# with wwasm --Object and linked with wwlink, and test-float-lib.ww, which .includes
+# the same three files after the same main program, is assembled whole.  The linked
+# core image must be the same as the whole-program one, apart from the %File line.
+# The offset-* files do the same for a relocatable word with a negative offset.
+
+# cd to the dir with this file, to facilitate external control
+thisfile=$0
+cd ${thisfile%/*}/
+
+realdiff=`which diff`
+diff () {
+	echo diff $*
+	$realdiff $*
+}
+
+echo "Linker Test:"
+if [ "$1" == "--Accept" ];
+then
+	echo "Accepting..."
+	rm -rf TestRefs/
+	mkdir TestRefs
+	cp linked.acore offset-linked.acore TestRefs/
+else
+	asm="$PYTHONPATH/../../Py/Assembler/wwasm.py"
+	link="$PYTHONPATH/../../Py/Assembler/wwlink.py"
+	rm -f *.wwo *.acore *.lst *.nofile wwasm.log wwlink.log
+	for f in main float-lib modern-frac-30-0-0-print float-30-15-0-print offset-main offset-lib
+	do
+		python $asm --Object $f.ww >>wwasm.log 2>&1
+	done
+	python $asm test-float-lib.ww >>wwasm.log 2>&1
+	python $asm offset-whole.ww >>wwasm.log 2>&1
+	python $link -o linked main.wwo float-lib.wwo modern-frac-30-0-0-print.wwo float-30-15-0-print.wwo >>wwlink.log 2>&1
+	python $link -o offset-linked offset-main.wwo offset-lib.wwo >>wwlink.log 2>&1
+	status=0
+	for f in test-float-lib linked offset-whole offset-linked
+	do
+		grep -v "^%File" $f.acore >$f.nofile
+	done
+	diff -s test-float-lib.nofile linked.nofile
+	status=$(($status + $?))
+	diff -s offset-whole.nofile offset-linked.nofile
+	status=$(($status + $?))
+	for f in linked.acore offset-linked.acore
+	do
+		diff -s TestRefs/$f $f
+		status=$(($status + $?))
+	done
+	if [ "$status" == "0" ];
+	then
+		echo "Test PASSED"
+	else
+		echo "Test FAILED"
+	fi
+fi